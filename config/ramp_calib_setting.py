@@ -37,6 +37,9 @@ class Simulation:
         noise_degree = 10,
         noisy = False,
         noisy_name = 'weekahead',
+        malicious_attack = None,  # attack model of the malicious forecaster, e.g. {'noise_degree': 10, 'bias': 50.0, 'replay_test': 'train'} (None for the default, see attack_forecasts)
+        noisy_attack = None,  # attack model of the noisy forecaster (None for the default)
+        additional_sellers = None,  # sellers submitting other forecasts of the dataset, seller name: column prefix, e.g. {'s7': 'seller001'} (columns in list_columns)
         scenario = 'malicious',
         save_scenario_contributions = False,
         display_metrics=True,
@@ -46,13 +46,33 @@ class Simulation:
         # csv for the testing period
         csv_filename = 'dataset_elia/ELIA_dataset.csv',
 
+        # source of the dataset: 'csv' (csv_filename) or 'json' (the monthly files file_1, file_2, ... loaded in loader_workers processes)
+        data_source = 'csv',
+        loader_workers = None,
+
+        # columnar cache of the csv file, e.g. './cache_dataset/' (None to parse the csv at every run)
+        cache_dir = None,
+        # daily csv files appended to the columnar cache, e.g. './new_days/' (needs cache_dir)
+        new_days_dir = None,
+
+        # memory mapped float32 panel of the processed dataset (None to slice the dataframe)
+        panel_dir = None,
+
         # # set buyer resource name
         buyer_resource_name = 'b1r1',
 
         replace_nan = True,
-        imputation_nan = 'mean', # 'median', 'zero', 'mean'
+        imputation_nan = 'mean', # 'median', 'zero', 'mean' ('last' with imputation_window = 'train')
+        imputation_window = 'dataset',  # 'train' (statistics of each training window) or 'dataset' (statistics of the whole dataset)
+        ineligible_days = None,  # 'skip' or 'repair' the days with missing slots or unusable forecasters (None to run every day)
+        backtest_workers = 1,  # worker processes of the backtest (blocks of gbr_update_every_days days run in parallel if > 1)
+        checkpoint_dir = None,  # checkpoint of the backtest to resume with main.py --resume, e.g. './checkpoints/' (None to disable)
+        checkpoint_every_days = 1,
+        persist_state = False,  # write the state of each day to the previous day pickle file in the background (the state is handed in memory)
         random_seed = 42,
         window_size = 30,
+        window = 'sliding',  # 'sliding' (window_size days), 'expanding' (from start_training) or 'capped' (expanding up to max_window_size days)
+        max_window_size = 90,
         start_training = '2021-01-01',
         num_test_days = 3,
         forecasts_col = ['forecast', 'confidence10', 'confidence90'],
@@ -63,8 +83,13 @@ class Simulation:
         noise_degree = 10,
         noisy = False,
         noisy_name = 'weekahead',
+        malicious_attack = None,  # attack model of the malicious forecaster, e.g. {'noise_degree': 10, 'bias': 50.0, 'replay_test': 'train'} (None for the default, see attack_forecasts)
+        noisy_attack = None,  # attack model of the noisy forecaster (None for the default)
+        additional_sellers = None,  # sellers submitting other forecasts of the dataset, seller name: column prefix, e.g. {'s7': 'seller001'} (columns in list_columns)
         scenario = 'malicious',
         save_scenario_contributions = False,
+        scenarios = None,  # scenarios run side by side, e.g. [{'name': 'noisy', 'sim_params': {'noisy': True}}] (None for a single run)
+        scenario_results_file = './scenario_predictions.csv',
         display_metrics=True,
         baselines_comparison = True,  # compare the model with the baselines
         contribution_assessment = True,  # compare the model with the contributions
@@ -93,6 +118,12 @@ class Stack:
         add_quantile_predictions = False,
         augment_q50 = False,
 
+        # floating point precision of the feature matrices ('float64' or 'float32')
+        precision = 'float64',
+
+        # imputation of the forecasters NaN values with training window statistics
+        imputation_strategy = 'mean',  # 'zero', 'mean', 'median' or 'last'
+
         # prediction pipeline
         nr_cv_splits = 3,
         quantiles = [0.1, 0.9, 0.5],
@@ -120,6 +151,10 @@ class Stack:
         solver = solver,
 
         gbr_update_every_days = 15,
+        # update the models of the previous day with the new day between two hyperparameters updates (for expanding windows)
+        incremental_update = False,
+        incremental_new_trees = 10,  # trees added to the GBR models each day
+        incremental_refit_days = None,  # days of the refit of the LR quantile 0.1 and 0.9 models (no incremental form, None for the whole training window)
 
         # calibration
         conformalized_qr = False,
@@ -1,107 +1,57 @@
+import argparse
 import numpy as np
-from tqdm import tqdm
 from loguru import logger
 from sklearn.utils.fixes import parse_version, sp_version
 solver = "highs" if sp_version >= parse_version("1.6.0") else "interior-point"
 
-from source.utils.file_read import read_csv_file, filter_data, replace_nan_values
-from source.utils.generate_timestamp import generate_timestamps
-from source.simulation.submission_module import submission_forecasters
-from source.simulation.buyer_module import prepare_buyer_data
-from source.ml_engine import create_ensemble_forecasts
-from source.ensemble.stack_generalization.wind_ramp.detector import wind_ramp_detector
-from source.assessment_contributions import compute_forecasters_contributions
-from source.utils.session_ml_info import delete_previous_day_pickle
+from source.simulation.backtest import iter_backtest
+from source.simulation.checkpoint import iter_checkpoint_results
+from source.simulation.backtest_runner import run_parallel_backtest
+from source.simulation.scenario_sweep import run_scenario_sweep
 
 # Configuration settings
 from config.simulation_setting_with_ramps import Simulation, Stack
 
-def main(sim_params, ens_params):
-    # Set random seed
-    np.random.seed(sim_params['random_seed'])
-
-    # Read CSV file
-    df_processed = read_csv_file(sim_params['csv_filename'], sim_params['list_columns'], sim_params['starting_period'], sim_params['ending_period'])
-
-    # Replace NaN values if specified
-    if sim_params['replace_nan']:
-        df_processed = replace_nan_values(sim_params, df_processed)
-
-    # Remove previous day pickle file
-    logger.info(' ')
-    delete_previous_day_pickle()
-
-
-    # Loop over test days
-    for i in tqdm(range(sim_params['num_test_days']), desc='Testing Days'):
-
-        # Generate timestamps for training and prediction
-        start_training_timestamp, end_training_timestamp, start_prediction_timestamp, end_prediction_timestamp = generate_timestamps(
-            sim_params['start_training'], i, sim_params['window_size'])
-
-        # Trim data for training and testing
-        df_train = filter_data(df_processed, start_training_timestamp, end_training_timestamp, string='training')
-        df_test = filter_data(df_processed, start_prediction_timestamp, end_prediction_timestamp, string='testing')
-
-        # ----------------------------> FORECASTERS SUBMISSION <----------------------------
+def main(sim_params, ens_params, resume=False):
+    if resume and not sim_params.get('checkpoint_dir'):
+        raise ValueError('Set checkpoint_dir to resume the backtest from its last checkpoint')
 
-        logger.debug("Forecasters submission ...")
-        df_market, df_train, df_test = submission_forecasters(sim_params, df_train, df_test)
+    # Run the test days in a process pool if several workers are set
+    if sim_params.get('backtest_workers', 1) > 1:
+        if sim_params.get('scenarios'):
+            raise ValueError('The scenarios of a sweep run in a single process, set backtest_workers to 1 or remove the scenarios')
+        return run_parallel_backtest(sim_params, ens_params, max_workers=sim_params['backtest_workers'], resume=resume)
 
-        # ----------------------------> MARKET OPERATOR DATA <----------------------------
+    # Run several scenarios side by side, the work common to the scenarios is done once per day
+    if sim_params.get('scenarios'):
+        return run_scenario_sweep(sim_params, ens_params, sim_params['scenarios'], output_file=sim_params.get('scenario_results_file'))
 
-        logger.debug("Market operator data ...")
-        df_buyer, forecast_range = prepare_buyer_data(df_train, df_test, start_prediction_timestamp, end_prediction_timestamp)
-
-        # ----------------------------> PREDICO PLATFORM ML ENGINE <----------------------------
-
-        # ----------------------------> ENSEMBLE FORECASTS <----------------------------
-
-        logger.debug("Wind ensemble forecasts ...")
-        results_ensemble_forecasts = create_ensemble_forecasts(
-            ens_params=ens_params,
-            df_buyer=df_buyer,
-            df_market=df_market,
-            end_training_timestamp=end_training_timestamp,
-            forecast_range=forecast_range,
-            challenge_usecase='simulation',
-            simulation=True
-        )
-
-        # ----------------------------> WIND RAMP DETECTION <----------------------------
-
-        logger.debug("Wind ramp detection ...")
-        pred_variability_insample = results_ensemble_forecasts['wind_power_ramp']['predictions_insample']
-        pred_variability_outsample = results_ensemble_forecasts['wind_power_ramp']['predictions_outsample']
-        
-        # Wind ramp detection logic
-        alarm_status, df_ramp_clusters = wind_ramp_detector(
-            ens_params=Stack.params,
-            df_pred_variability_insample=pred_variability_insample,
-            df_pred_variability_outsample=pred_variability_outsample
-        )
-
-        logger.info(f"Alarm status: {alarm_status}")
-        if df_ramp_clusters is not None:
-            logger.info(f"Ramp clusters: {df_ramp_clusters.cluster_id.unique()}")
-            logger.info(f"Ramp clusters datetime: {df_ramp_clusters.index}")
+    # Set random seed
+    np.random.seed(sim_params['random_seed'])
 
-        # ----------------------------> ASSESSMENT CONTRIBUTIONS <----------------------------
+    # Loop over test days, the ineligible days are skipped or repaired before any model work
+    # iter_backtest yields the results day by day, to stream them or stop early
+    logger.info(' ')
+    backtest = iter_backtest(sim_params, ens_params, resume=resume)
+    if not sim_params.get('checkpoint_dir'):
+        return list(backtest)
 
-        logger.debug("Forecasters contributions ...")
-        y_test = df_test['measured'].values
-        forecasters_contributions = compute_forecasters_contributions(
-            sim_params['buyer_resource_name'], ens_params, y_test, forecast_range
-        )
-        logger.info(f"Forecasters contributions: {forecasters_contributions}")
+    # The results of each day are saved in the checkpoint directory, only the day being run is held in memory
+    n_days = sum(1 for _ in backtest)
+    logger.info(f"Results of {n_days} test days saved in {sim_params['checkpoint_dir']}")
+    return iter_checkpoint_results(sim_params['checkpoint_dir'], n_days)
 
 
 
 # Example of how the main function might be called:
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description='Backtest of the ensemble forecasts')
+    parser.add_argument('--resume', action='store_true', help='resume from the last checkpoint of the backtest (needs checkpoint_dir)')
+    args = parser.parse_args()
+
     sim_params = Simulation.testing_period  # Simulation parameters
     ens_params = Stack.params  # QRA Ensemble parameters
 
     # Call the main function
-    main(sim_params, ens_params)
+    main(sim_params, ens_params, resume=args.resume)
@@ -3,13 +3,14 @@ import numpy as np
 import pandas as pd
 from source.ensemble.stack_generalization.test_importance.forecasters_contributions import load_model_info, calculate_contributions
 
-def compute_forecasters_contributions(buyer_resource_name, ens_params, y_test, forecast_range):
+def compute_forecasters_contributions(buyer_resource_name, ens_params, y_test, forecast_range, session_state=None):
     """Compute the contributions of the forecasters for the buyer resource.
     Args:
         buyer_resource_name: Name of the buyer resource
         ens_params: Dictionary with ensemble parameters
         y_test: Series with the true values
         forecast_range: DatetimeIndex with the forecast range
+        session_state: In-process state with the model info (None to load it from the previous day pickle file)
     Returns:
         results_contributions: Dictionary with the contributions of the forecasters
     """
@@ -18,11 +19,14 @@ def compute_forecasters_contributions(buyer_resource_name, ens_params, y_test, f
     assert isinstance(y_test, np.ndarray), 'The y_test must be a numpy array'
     assert isinstance(forecast_range, pd.DatetimeIndex), 'The forecast_range must be a pandas DatetimeIndex'
     try:
-        # Retrieve path of the previous day result
-        path_previous_day_result = f"{ens_params['save_info']}{buyer_resource_name}_{ens_params['save_file']}"
-        # Load model info from file
-        logger.info(f"Load model info from file: {path_previous_day_result}")
-        results_challenge_dict = load_model_info(path_previous_day_result)
+        if session_state is not None:
+            results_challenge_dict = session_state.results
+        else:
+            # Retrieve path of the previous day result
+            path_previous_day_result = f"{ens_params['save_info']}{buyer_resource_name}_{ens_params['save_file']}"
+            # Load model info from file
+            logger.info(f"Load model info from file: {path_previous_day_result}")
+            results_challenge_dict = load_model_info(path_previous_day_result)
         # Calculate the contribution for each forecaster
         logger.info(f"Get the contributions for the buyer resource: {buyer_resource_name}")
         results_contributions = calculate_contributions(results_challenge_dict, ens_params, y_test, forecast_range)
@@ -108,11 +108,12 @@ def concatenate_feat_targ_dataframes(buyer_resource_name, df_train_ensemble, df_
     df_test_ensemble.loc[:, 'norm_targ'] = df_test[col_name_buyer].values
     return df_train_ensemble, df_test_ensemble
 
-def get_numpy_Xy_train_test(df_train_ensemble, df_test_ensemble):
+def get_numpy_Xy_train_test(df_train_ensemble, df_test_ensemble, dtype=None):
     """Get numpy arrays for X_train, y_train, X_test, y_test
     Args:
         df_train_ensemble: pd.DataFrame, ensemble training data
         df_test_ensemble: pd.DataFrame, ensemble testing data
+        dtype: np.dtype, dtype of the features (dtype of the dataframes if None)
     Returns:
         X_train: np.array, training features
         y_train: np.array, training target
@@ -123,4 +124,6 @@ def get_numpy_Xy_train_test(df_train_ensemble, df_test_ensemble):
     assert isinstance(df_test_ensemble, pd.DataFrame), "df_test_ensemble should be a DataFrame"
     X_train, y_train = df_train_ensemble.iloc[:, :-1].values, df_train_ensemble.iloc[:, -1].values
     X_test, y_test = df_test_ensemble.iloc[:, :-1].values, df_test_ensemble.iloc[:, -1].values
+    if dtype is not None:
+        X_train, X_test = X_train.astype(dtype, copy=False), X_test.astype(dtype, copy=False)
     return X_train, y_train, X_test, y_test
@@ -1,5 +1,6 @@
 from source.ensemble.stack_generalization.feature_engineering.data_augmentation import augment_with_quantiles
 from source.ensemble.stack_generalization.hyperparam_optimization.optimization import optimize_model, initialize_train_and_predict, permutation_quantile_regression
+from source.ensemble.stack_generalization.hyperparam_optimization.incremental import incremental_fit
 from loguru import logger
 import pandas as pd
 import numpy as np
@@ -9,7 +10,8 @@ def predico_ensemble_predictions_per_quantile(ens_params,
                                                 predictions, quantile,
                                                 best_results, iteration, 
                                                 X_train_quantile10=np.array([]), X_test_quantile10=np.array([]), df_train_ensemble_quantile10=pd.DataFrame(), 
-                                                X_train_quantile90=np.array([]), X_test_quantile90=np.array([]), df_train_ensemble_quantile90=pd.DataFrame()):
+                                                X_train_quantile90=np.array([]), X_test_quantile90=np.array([]), df_train_ensemble_quantile90=pd.DataFrame(),
+                                                previous_day_results=None):
     """ Run ensemble predictions for a specific quantile.
     args:
         ens_params: dict, ensemble parameters
@@ -27,6 +29,7 @@ def predico_ensemble_predictions_per_quantile(ens_params,
         X_train_quantile90: np.array, training data for quantile 90
         X_test_quantile90: np.array, testing data for quantile 90
         df_train_ensemble_quantile90: pd.DataFrame, training data for quantile 90
+        previous_day_results: dict, results of the quantile on the previous day (model updated incrementally if ens_params['incremental_update'])
     returns:
             results: dict, results
     """
@@ -67,7 +70,8 @@ def predico_ensemble_predictions_per_quantile(ens_params,
     #     df_train_ensemble_augmented = df_train_ensemble_augmented.iloc[ens_params['day_calibration']*96:]
 
     # Optimize model hyperparameters
-    if iteration % gbr_update_every_days == 0:  # Optimize hyperparameters every gbr_update_every_days
+    refresh = iteration % gbr_update_every_days == 0
+    if refresh:  # Optimize hyperparameters every gbr_update_every_days
         logger.opt(colors=True).info(f'<fg 250,128,114> Optimizing model hyperparameters - updating every {gbr_update_every_days} days</fg 250,128,114>')
         best_score, best_params = optimize_model(X_train_augmented, y_train, quantile,
                                                     nr_cv_splits, model_type, solver, gbr_config_params,
@@ -77,18 +81,35 @@ def predico_ensemble_predictions_per_quantile(ens_params,
         logger.opt(colors=True).info(f'<fg 250,128,114> Using best hyperparameters from first iteration </fg 250,128,114>')
         best_params = best_results[quantile][1][1]
 
+    # Update the model of the previous day with the new training rows, the model is refit with the hyperparameters
+    incremental_update = ens_params.get('incremental_update', False)
+    previous = previous_day_results if incremental_update and not refresh and previous_day_results is not None else {}
+    fitted_model = None
+    if incremental_update:
+        logger.opt(colors=True).info(f'<fg 250,128,114> {"Updating" if previous else "Fitting"} model incrementally </fg 250,128,114>')
+        fitted_model, incremental_state = incremental_fit(model_type, quantile, best_params, solver, X_train_augmented, y_train, df_train_ensemble_augmented.index,
+                                                            previous_model=previous.get('fitted_model'), previous_state=previous.get('incremental'),
+                                                            n_new_trees=ens_params.get('incremental_new_trees', 10), refit_days=ens_params.get('incremental_refit_days'))
+
     # Initialize, fit and predict
-    fitted_model, predictions = initialize_train_and_predict(predictions, model_type, quantile, best_params, solver, X_train_augmented, y_train, X_test_augmented) 
+    fitted_model, predictions = initialize_train_and_predict(predictions, model_type, quantile, best_params, solver, X_train_augmented, y_train, X_test_augmented,
+                                                                fitted_model=fitted_model) 
 
     # Store results
     results = {'predictions': predictions, 'best_results': best_results, 'fitted_model': fitted_model, 
                 'X_train_augmented': X_train_augmented, 'X_test_augmented': X_test_augmented,
                 'df_train_ensemble_augmented': df_train_ensemble_augmented}
+    if incremental_update:
+        results['incremental'] = incremental_state
     
     # Compute p-values for the coefficients
     if ens_params['model_type'] == 'LR':
-        # Compute p-values for the coefficients
-        coefs, p_values_permutation = permutation_quantile_regression(best_params, solver, X_train_augmented, y_train, quantile, n_permutations=ens_params['nr_pvalues_permutations'])
+        if 'p_values' in previous:
+            # the permutation test refits the model on the whole window, it is run again when the hyperparameters are updated
+            coefs, p_values_permutation = fitted_model.coef_, previous['p_values']
+        else:
+            # Compute p-values for the coefficients
+            coefs, p_values_permutation = permutation_quantile_regression(best_params, solver, X_train_augmented, y_train, quantile, n_permutations=ens_params['nr_pvalues_permutations'])
         # Bonferroni correction
         is_significant = p_values_permutation < ens_params['alpha']/len(coefs)
         model_summary = pd.DataFrame({
@@ -123,7 +144,9 @@ def predico_ensemble_variability_predictions(ens_params,
                                             iteration, 
                                             best_results_var, 
                                             variability_predictions_insample,
-                                            variability_predictions_outsample):
+                                            variability_predictions_outsample,
+                                            train_index=None,
+                                            previous_day_results=None):
     """ Run ensemble variability predictions 
     args:
         ens_params: dict, ensemble parameters
@@ -136,6 +159,8 @@ def predico_ensemble_variability_predictions(ens_params,
         best_results_var: dict, best results
         variability_predictions_insample: dict, insample predictions
         variability_predictions_outsample: dict, outsample predictions
+        train_index: pd.DatetimeIndex, datetime of the training rows (required if ens_params['incremental_update'])
+        previous_day_results: dict, results of the quantile on the previous day (model updated incrementally if ens_params['incremental_update'])
     returns:
         results: dict, results
     """
@@ -151,7 +176,8 @@ def predico_ensemble_variability_predictions(ens_params,
     assert var_model_type in ['GBR', 'LR'], 'Invalid model type'
 
     # Optimize model hyperparameters
-    if iteration % gbr_update_every_days == 0:  # Optimize hyperparameters every gbr_update_every_days
+    refresh = iteration % gbr_update_every_days == 0
+    if refresh:  # Optimize hyperparameters every gbr_update_every_days
         logger.opt(colors=True).info(f'<fg 72,201,176> Optimizing model hyperparameters - updating every {gbr_update_every_days} days</fg 72,201,176>')
         best_score, best_params_var = optimize_model(X_train_2stage, y_train_2stage, quantile, nr_cv_splits, var_model_type, solver, var_gbr_config_params, var_lr_config_params)
         best_results_var[quantile] = [('best_score', best_score), ('params', best_params_var)]
@@ -159,10 +185,21 @@ def predico_ensemble_variability_predictions(ens_params,
         logger.opt(colors=True).info(f'<fg 72,201,176> Using best hyperparameters from first iteration </fg 72,201,176>')
         best_params_var = best_results_var[quantile][1][1]
 
+    # Update the model of the previous day with the new training rows, the model is refit with the hyperparameters
+    incremental_update = ens_params.get('incremental_update', False)
+    previous = previous_day_results if incremental_update and not refresh and previous_day_results is not None else {}
+    var_fitted_model = None
+    if incremental_update:
+        assert train_index is not None, 'train_index must be provided for incremental updates'
+        var_fitted_model, incremental_state = incremental_fit(var_model_type, quantile, best_params_var, solver, X_train_2stage, y_train_2stage, train_index,
+                                                                previous_model=previous.get('var_fitted_model'), previous_state=previous.get('var_incremental'),
+                                                                n_new_trees=ens_params.get('incremental_new_trees', 10), refit_days=ens_params.get('incremental_refit_days'))
+
     # Initialize, fit and predict
     var_fitted_model, variability_predictions, variability_predictions_insample, variability_predictions_outsample = initialize_train_and_predict(variability_predictions, var_model_type, quantile, best_params_var, solver, X_train_2stage, y_train_2stage, X_test_2stage, insample=True, 
                                                                                                                                                     predictions_insample = variability_predictions_insample,
-                                                                                                                                                    predictions_outsample = variability_predictions_outsample)  
+                                                                                                                                                    predictions_outsample = variability_predictions_outsample,
+                                                                                                                                                    fitted_model = var_fitted_model)  
 
     # Store results
     results = {'variability_predictions': variability_predictions, 
@@ -170,5 +207,7 @@ def predico_ensemble_variability_predictions(ens_params,
                 'var_fitted_model': var_fitted_model,
                 'variability_predictions_insample': variability_predictions_insample,
                 'variability_predictions_outsample': variability_predictions_outsample}
+    if incremental_update:
+        results['var_incremental'] = incremental_state
 
     return results
\ No newline at end of file
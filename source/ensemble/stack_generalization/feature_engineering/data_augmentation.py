@@ -1,6 +1,41 @@
 import pandas as pd
 import numpy as np
 
+DIVERSITY_FEATURES = ('forecasters_std', 'forecasters_var', 'forecasters_mean', 'forecasters_prod')
+
+def forecasters_diversity_features(df):
+    " Standard deviation, variance, mean and product among the forecasters columns"
+    forecast_cols = [name for name in df.columns if any(q in name for q in ['q50', 'q10', 'q90'])] # forecasters columns
+    return pd.DataFrame({'forecasters_std': df[forecast_cols].std(axis=1),  # standard deviation among forecasters
+                         'forecasters_var': df[forecast_cols].var(axis=1),  # variance among forecasters
+                         'forecasters_mean': df[forecast_cols].mean(axis=1),  # mean among forecasters
+                         'forecasters_prod': df[forecast_cols].prod(axis=1)})  # product among forecasters
+
+def augmented_suffixes(max_lags, add_lags=False, augment_with_poly=False, augment_with_roll_stats=False, differenciate=False):
+    """ Suffixes of the features created from a column, block by block in the order of create_augmented_dataframe
+    returns:
+        blocks: list, suffixes of each block of features (lags, polynomial, rolling statistics and differences)"""
+    blocks = []
+    if add_lags:
+        blocks.append([f'_t-{lag}' for lag in range(1, max_lags + 1)])
+    if augment_with_poly:
+        blocks.append(['_sqr', '_cub'])
+    if augment_with_roll_stats and add_lags:
+        blocks.append(['_avg'] + (['_std', '_var'] if max_lags > 1 else []) + (['_lag-1_avg', '_lag-1_std', '_lag-1_var'] if max_lags > 2 else []))
+    if differenciate and add_lags:
+        blocks.append(['_diff', '_lag-1_diff'])
+    return blocks
+
+def augmented_columns(columns, max_lags, forecasters_diversity=False, add_lags=False, augment_with_poly=False, augment_with_roll_stats=False, differenciate=False):
+    """ Column names of the dataframe of create_augmented_dataframe, in its order
+    args:
+        columns: list, columns of the dataframe to augment
+    returns:
+        columns: list, columns of the augmented dataframe"""
+    blocks = augmented_suffixes(max_lags, add_lags, augment_with_poly, augment_with_roll_stats, differenciate)
+    diversity = list(DIVERSITY_FEATURES) if forecasters_diversity else []
+    return list(columns) + diversity + [col + suffix for block in blocks for col in columns for suffix in block]
+
 def create_augmented_dataframe(df, max_lags, forecasters_diversity=False, add_lags=False, 
                                 augment_with_poly=False, augment_with_roll_stats=False, differenciate=False,
                                 end_train=None, start_prediction=None):
@@ -24,11 +59,7 @@ def create_augmented_dataframe(df, max_lags, forecasters_diversity=False, add_la
     shifted_df_ensemble = pd.DataFrame()
     if forecasters_diversity:
         " Create forecasters diversity features"
-        forecast_cols = [name for name in df.columns if any(q in name for q in ['q50', 'q10', 'q90'])] # forecasters columns
-        shifted_df_ensemble["forecasters_std"] = df[forecast_cols].std(axis=1)  # standard deviation among forecasters
-        shifted_df_ensemble["forecasters_var"] = df[forecast_cols].var(axis=1)  # variance among forecasters
-        shifted_df_ensemble["forecasters_mean"] = df[forecast_cols].mean(axis=1)  # mean among forecasters
-        shifted_df_ensemble["forecasters_prod"] = df[forecast_cols].prod(axis=1)  # product among forecasters
+        shifted_df_ensemble = forecasters_diversity_features(df)
     if add_lags:
         " Create lagged features"
         for col in df.columns:
@@ -0,0 +1,120 @@
+import copy
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Lasso
+from source.ensemble.stack_generalization.hyperparam_optimization.optimization import initialize_model
+
+def day_blocks_statistics(X, y, index, blocks=None):
+    """ Add the sufficient statistics of the least squares (n, sum x, sum y, X'X, X'y) of the rows to their day block
+    args:
+        X: np.array, features
+        y: np.array, targets
+        index: pd.DatetimeIndex, datetime of the rows
+        blocks: dict, statistics by day (not modified)
+    returns:
+        blocks: dict, updated statistics by day"""
+    blocks = dict(blocks) if blocks is not None else {}
+    X, y = np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    days = index.floor('D')
+    for day in days.unique():
+        rows = days == day
+        X_day, y_day = X[rows], y[rows]
+        statistics = (len(y_day), X_day.sum(axis=0), y_day.sum(), X_day.T @ X_day, X_day.T @ y_day)
+        if day in blocks:
+            statistics = tuple(previous + new for previous, new in zip(blocks[day], statistics))
+        blocks[day] = statistics
+    return blocks
+
+def fit_lasso_statistics(blocks, best_params, coef_init=None):
+    """ Fit a Lasso on the sufficient statistics of its training rows, the cost does not depend on the number of rows
+    The centered Gram matrix is factorized into an equivalent dataset with one row per feature, on which the Lasso objective has the same minimizer.
+    args:
+        blocks: dict, statistics by day (see day_blocks_statistics)
+        best_params: dict, Lasso parameters (alpha and fit_intercept)
+        coef_init: np.array, coefficients to start the coordinate descent from (warm start)
+    returns:
+        model: Lasso, fitted model"""
+    n, sum_x, sum_y, xtx, xty = (sum(statistics) for statistics in zip(*blocks.values()))
+    fit_intercept = best_params.get('fit_intercept', True)
+    mean_x, mean_y = (sum_x / n, sum_y / n) if fit_intercept else (np.zeros_like(sum_x), 0.0)
+    gram = xtx - n * np.outer(mean_x, mean_x)
+    xy = xty - n * mean_x * mean_y
+    eigenvalues, eigenvectors = np.linalg.eigh(gram)
+    keep = eigenvalues > max(eigenvalues.max(), 0) * 1e-12
+    assert keep.any(), 'The Gram matrix of the training rows is null'
+    X_equivalent = np.sqrt(eigenvalues[keep])[:, None] * eigenvectors[:, keep].T
+    y_equivalent = (eigenvectors[:, keep].T @ xy) / np.sqrt(eigenvalues[keep])
+    # the Lasso objective is normalized by the number of rows
+    alpha = best_params.get('alpha', 1.0) * n / len(y_equivalent)
+    model = Lasso(**dict(best_params, alpha=alpha, fit_intercept=False, warm_start=coef_init is not None))
+    if coef_init is not None:
+        model.coef_ = np.array(coef_init, dtype=np.float64)
+    model.fit(X_equivalent, y_equivalent)
+    model.intercept_ = mean_y - mean_x @ model.coef_
+    return model.set_params(alpha=best_params.get('alpha', 1.0), fit_intercept=fit_intercept, warm_start=False)
+
+def same_scaling(X_train, y_train, train_index, previous_state):
+    """ Check that the last training row of the previous day has the same features and target in the training window of the day
+    The scaler statistics are kept between the hyperparameter refreshes (see day_scaler_statistics), the row changes if they are not
+    (e.g. the second stage features are the predictions of the first stage model of the day): the rows kept in the previous model
+    are then on another scale than the new rows.
+    returns:
+        same: bool, True if the row of the previous day is unchanged"""
+    if 'last_row' not in previous_state or previous_state['last_index'] not in train_index:
+        return False
+    position = train_index.get_loc(previous_state['last_index'])
+    X_last, y_last = previous_state['last_row']
+    return np.array_equal(np.asarray(X_train[position], dtype=np.float64), X_last) and float(y_train[position]) == y_last
+
+def incremental_fit(model_type, quantile, best_params, solver, X_train, y_train, train_index, previous_model=None, previous_state=None, n_new_trees=10, refit_days=None):
+    """ Fit a model from scratch, or update the model of the previous day with the rows added to the training window
+    The rows already in the model are kept as they were when they were added, the model is refit from scratch without a previous model
+    or if the scaling of the rows has changed since the previous day (see same_scaling), e.g. with the statistics of a sliding window.
+        - GBR: n_new_trees trees fitted on the new rows are added to the previous model
+        - LR quantile 0.5: Lasso warm started from the previous coefficients on the sufficient statistics of the training window,
+          the statistics are kept by day, the new days are added and the days out of the window are removed
+        - LR quantiles 0.1 and 0.9: the quantile regression has no incremental form, it is refit on the training window
+          (on the last refit_days days if set, a shorter window changes the model)
+    args:
+        model_type: str, model type
+        quantile: float, quantile
+        best_params: dict, best parameters
+        solver: str, solver
+        X_train: np.array, training data
+        y_train: np.array, target data
+        train_index: pd.DatetimeIndex, datetime of the training rows
+        previous_model: model object, fitted model of the previous day (None to fit from scratch)
+        previous_state: dict, incremental state of the previous day
+        n_new_trees: int, number of trees added to a GBR model
+        refit_days: int, number of days of the refit of the quantile regression (the whole training window if None)
+    returns:
+        fitted_model: model object, fitted model
+        state: dict, incremental state of the model (last training row and sufficient statistics by day)"""
+    assert len(train_index) == len(X_train), 'train_index must have one datetime per training row'
+    state = {'last_index': train_index[-1], 'last_row': (np.array(X_train[-1], dtype=np.float64), float(y_train[-1]))}
+    lasso = model_type == 'LR' and quantile == 0.5
+    stateful = model_type == 'GBR' or lasso
+    if previous_model is None or previous_state is None or (stateful and not same_scaling(X_train, y_train, train_index, previous_state)):
+        fitted_model = initialize_model(model_type, quantile, best_params, solver).fit(X_train, y_train)
+        if lasso:
+            state['blocks'] = day_blocks_statistics(X_train, y_train, train_index)
+        return fitted_model, state
+    new_rows = train_index > previous_state['last_index']
+    if model_type == 'GBR':
+        # the model of the previous day is left as it is in the state of the previous day
+        fitted_model = copy.deepcopy(previous_model)
+        if new_rows.any():
+            fitted_model.set_params(warm_start=True, max_iter=fitted_model.n_iter_ + n_new_trees).fit(X_train[new_rows], y_train[new_rows])
+    elif lasso:
+        first_day = train_index[0].floor('D')
+        blocks = {day: statistics for day, statistics in previous_state['blocks'].items() if day >= first_day}
+        if new_rows.any():
+            blocks = day_blocks_statistics(X_train[new_rows], y_train[new_rows], train_index[new_rows], blocks)
+        fitted_model = fit_lasso_statistics(blocks, best_params, coef_init=previous_model.coef_)
+        state['blocks'] = blocks
+    elif refit_days is None:
+        fitted_model = initialize_model(model_type, quantile, best_params, solver).fit(X_train, y_train)
+    else:
+        recent_rows = train_index > train_index[-1] - pd.Timedelta(days=refit_days)
+        fitted_model = initialize_model(model_type, quantile, best_params, solver).fit(X_train[recent_rows], y_train[recent_rows])
+    return fitted_model, state
@@ -67,7 +67,8 @@ def initialize_train_and_predict(predictions,
                                 X_test, 
                                 insample=False, 
                                 predictions_insample=None, 
-                                predictions_outsample=None):
+                                predictions_outsample=None,
+                                fitted_model=None):
     """
     Initializes, fits a model, and makes predictions.
     args:
@@ -82,24 +83,26 @@ def initialize_train_and_predict(predictions,
         insample: bool, insample predictions
         predictions_insample: dict, insample predictions
         predictions_outsample: dict, outsample predictions
+        fitted_model: model object, model already fitted (e.g. updated incrementally), it is not refit
     returns:
         fitted_model: model object, fitted model
         predictions: dict, predictions
         predictions_insample: dict, insample predictions
         predictions_outsample: dict, outsample predictions
     """
-    # Initialize model with best params
-    model = initialize_model(model_type, quantile, best_params, solver)
-    # Fit model
-    fitted_model = model.fit(X_train, y_train)
-    # Make predictions
-    predictions[quantile] = fitted_model.predict(X_test)
+    if fitted_model is None:
+        # Initialize model with best params
+        model = initialize_model(model_type, quantile, best_params, solver)
+        # Fit model
+        fitted_model = model.fit(X_train, y_train)
+    # Make predictions (float64 whatever the precision of the features)
+    predictions[quantile] = fitted_model.predict(X_test).astype(np.float64, copy=False)
     # Return fitted model and predictions
     if not insample:
         return fitted_model, predictions
     elif insample:
-        predictions_insample[quantile] = fitted_model.predict(X_train)
-        predictions_outsample[quantile] = fitted_model.predict(X_test) 
+        predictions_insample[quantile] = fitted_model.predict(X_train).astype(np.float64, copy=False)
+        predictions_outsample[quantile] = fitted_model.predict(X_test).astype(np.float64, copy=False)
         return fitted_model, predictions, predictions_insample, predictions_outsample
 
 def permutation_quantile_regression(best_params, solver, X, y, quantile, n_permutations=100):
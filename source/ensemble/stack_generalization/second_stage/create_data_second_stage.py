@@ -90,11 +90,14 @@ def create_var_ensemble_dataframe(buyer_resource_name, quantiles, quantile_predi
     return df_pred_ensemble
 
 
-def get_numpy_Xy_train_test_2stage(df_2stage_train, df_2stage_test):
+def get_numpy_Xy_train_test_2stage(df_2stage_train, df_2stage_test, dtype=None):
     """
     Prepares training and testing data for a two-stage model by separating features and targets.
+    The features are cast to dtype if it is given.
     """
     X_train_2stage = df_2stage_train.drop(columns=['targets']).values
     y_train_2stage = df_2stage_train['targets'].values
     X_test_2stage = df_2stage_test.drop(columns=['targets']).values
+    if dtype is not None:
+        X_train_2stage, X_test_2stage = X_train_2stage.astype(dtype, copy=False), X_test_2stage.astype(dtype, copy=False)
     return X_train_2stage, y_train_2stage, X_test_2stage
\ No newline at end of file
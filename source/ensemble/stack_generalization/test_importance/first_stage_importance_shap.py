@@ -3,8 +3,6 @@ import numpy as np
 import pandas as pd
 from loguru import logger
 from source.ensemble.stack_generalization.hyperparam_optimization.models.utils.cross_validation import score_func_10, score_func_50, score_func_90
-import matplotlib.pyplot as plt
-import seaborn as sns
 
 ############################################################################################################ Utils
 
@@ -319,6 +317,9 @@ def plot_importance(df_contributions, quantile, contribution_method , top_n=10,
     """
     Plot the top N permutation feature importances using a seaborn bar plot.
     """
+    # plotting libraries are imported on use, they are slow to import
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     # Select top N contributions
     df_top_contributions = df_contributions.head(top_n)
     # Create the plot
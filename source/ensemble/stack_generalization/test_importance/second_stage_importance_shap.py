@@ -4,8 +4,6 @@ import pandas as pd
 from loguru import logger
 from source.ensemble.stack_generalization.hyperparam_optimization.models.utils.cross_validation import score_func_10, score_func_50, score_func_90
 from source.ensemble.stack_generalization.second_stage.create_data_second_stage import create_2stage_dataframe, create_augmented_dataframe_2stage
-import matplotlib.pyplot as plt
-import seaborn as sns
 
 ############################################################################################################ Utils
 def extract_data(info, quantile):
@@ -373,6 +371,9 @@ def plot_importance(df_contributions, quantile, top_n=10, figsize=(10, 5), palet
     """
     Plot the top N permutation feature importances using a seaborn bar plot.
     """
+    # plotting libraries are imported on use, they are slow to import
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     # Select top N contributions
     df_top_contributions = df_contributions.head(top_n)
     # Create the plot
@@ -0,0 +1,44 @@
+import numpy as np
+
+# attack models of the generated forecasters, they reproduce the historical malicious and noisy forecasters
+MALICIOUS_ATTACK = {'noise_degree': 10.0, 'bias': 0.0, 'replay_train': None, 'replay_test': 'train'}
+NOISY_ATTACK = {'noise_degree': 0.0, 'bias': 0.0, 'replay_train': 'window', 'replay_test': 'window'}
+
+def generate_attack_values(values, rng, noise_degree=0.0, bias=0.0, replay_values=None):
+    """ Forecasts of an attacker for a window, all the samples are drawn at once
+    args:
+        values: np.array, forecasts of the window (rows are time steps, one column per quantile)
+        rng: np.random.Generator, random generator
+        noise_degree: float, standard deviation of the gaussian noise added to the forecasts
+        bias: float, bias added to the forecasts
+        replay_values: np.array, forecasts replayed instead of values, whole rows drawn with replacement (None to keep values)
+    returns:
+        attack_values: np.array, forecasts of the attacker (same shape as values)"""
+    attack_values = np.asarray(values, dtype=np.float64)
+    if replay_values is not None:
+        replay_values = np.asarray(replay_values, dtype=np.float64)
+        assert len(replay_values) > 0, 'No forecasts to replay'
+        attack_values = replay_values[rng.integers(len(replay_values), size=len(attack_values))]
+    if noise_degree:
+        attack_values = attack_values + noise_degree * rng.standard_normal(attack_values.shape)
+    return attack_values + bias
+
+def attack_forecasts(df_train, df_test, columns, rng, noise_degree=0.0, bias=0.0, replay_train=None, replay_test=None):
+    """ Forecasts of an attacker for the train and test windows, drawn from the columns of a forecaster
+    args:
+        df_train: pd.DataFrame, train data
+        df_test: pd.DataFrame, test data
+        columns: list, columns of the forecaster (e.g. its forecast, confidence10 and confidence90 columns)
+        rng: np.random.Generator, random generator
+        noise_degree: float, standard deviation of the gaussian noise
+        bias: float, bias added to the forecasts
+        replay_train: str, forecasts replayed in the train window: None (its own forecasts), 'window' (drawn from the window) or 'train' (drawn from the train window)
+        replay_test: str, forecasts replayed in the test window, as replay_train
+    returns:
+        train_values: np.array, forecasts of the attacker in the train window
+        test_values: np.array, forecasts of the attacker in the test window"""
+    train_values, test_values = df_train[columns].values, df_test[columns].values
+    sources = {None: None, 'train': train_values}
+    assert replay_train in ('window', *sources) and replay_test in ('window', *sources), "replay must be None, 'window' or 'train'"
+    return (generate_attack_values(train_values, rng, noise_degree, bias, train_values if replay_train == 'window' else sources[replay_train]),
+            generate_attack_values(test_values, rng, noise_degree, bias, test_values if replay_test == 'window' else sources[replay_test]))
@@ -1,14 +1,21 @@
 from loguru import logger
+import numpy as np
 import pandas as pd
 import gc
-import pickle
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from joblib import parallel_config
 from tqdm import tqdm
 
-from source.utils.session_ml_info import load_or_initialize_results
-from source.utils.data_preprocess import scale_forecasters_dataframe, scale_buyer_dataframe, buyer_scaler_statistics, impute_mean_for_nan
+from source.utils.market_data import MarketData
+from source.utils.session_ml_info import load_previous_day_results, initialize_results, atomic_pickle_dump, SessionState
+from source.utils.data_preprocess import scale_forecasters_dataframe, scale_buyer_dataframe, buyer_scaler_statistics, forecasters_scaler_statistics, compute_dtype, cast_dataframes
+from source.utils.imputation import impute_train_window
 from source.utils.data_preprocess import rescale_predictions, rescale_targets, set_non_negative_predictions
 from source.utils.quantile_preprocess import extract_quantile_columns, split_quantile_train_test_data, get_numpy_Xy_train_test_quantile
-from source.ensemble.stack_generalization.feature_engineering.data_augmentation import create_augmented_dataframe
+from source.ensemble.stack_generalization.feature_engineering.data_augmentation import create_augmented_dataframe, augmented_suffixes, augmented_columns, forecasters_diversity_features, DIVERSITY_FEATURES
 from source.ensemble.stack_generalization.data_preparation.data_train_test import split_train_test_data, concatenate_feat_targ_dataframes, get_numpy_Xy_train_test
 from source.ensemble.stack_generalization.data_preparation.data_train_test import prepare_pre_test_data
 from source.ensemble.stack_generalization.ensemble_model import predico_ensemble_predictions_per_quantile, predico_ensemble_variability_predictions
@@ -16,78 +23,52 @@ from source.ensemble.stack_generalization.second_stage.create_data_second_stage
 from source.ensemble.stack_generalization.utils.results import collect_quantile_ensemble_predictions, create_ensemble_dataframe, melt_dataframe
 
 
-def create_ensemble_forecasts(ens_params,
-                                df_buyer,
-                                df_market,
-                                end_training_timestamp,
-                                forecast_range,
-                                challenge_usecase = None,
-                                simulation = False):
-    """Create ensemble forecasts for wind power and wind power variability using forecasters predictions
+# ensemble parameters of the forecasters features, the markets of the same sellers with the same values of these parameters have the same features
+MARKET_FEATURE_PARAMS = ('imputation_strategy', 'scale_features', 'normalize', 'standardize', 'axis', 'precision', 'add_quantile_predictions',
+                         'max_lags', 'forecasters_diversity', 'add_lags', 'augment_with_poly', 'augment_with_roll_stats', 'differenciate')
+
+def impute_market_quantiles(ens_params, df_market, end_training_timestamp):
+    """Forecasters predictions of the quantiles 50, 10 and 90 of the market, the NaN values are imputed with statistics of the training window only
     args:
         ens_params: dict, ensemble parameters
-        df_buyer: pd.DataFrame, buyer data
-        df_market: pd.DataFrame, market data
+        df_market: pd.DataFrame or MarketData, market data
         end_training_timestamp: pd.Timestamp, end of training timestamp
-        forecast_range: pd.DatetimeIndex, forecast range
-        challenge_usecase: str, challenge usecase
-        simulation: bool, simulation
     returns:
-        results_challenge_dict: dict, results for the challenge
-        results_challenge_dict_simulation: dict, results for the challenge simulation"""
-
-    start_prediction_timestamp = forecast_range[0]  # get the start prediction timestamp
-    end_prediction_timestamp = forecast_range[-1]  # get the end prediction timestamp
+        df_ensemble_quantile50, df_ensemble_quantile10, df_ensemble_quantile90: pd.DataFrame, predictions of the quantiles (empty if not submitted)"""
+    strategy = ens_params.get('imputation_strategy', 'mean')
+    return tuple(impute_train_window(extract_quantile_columns(df_market, quantile), end_training_timestamp, strategy) for quantile in ['q50', 'q10', 'q90'])
 
-    # Extract quantile columns with checks
-    df_ensemble_quantile50 = extract_quantile_columns(df_market, 'q50')  # get the quantile 50 predictions
-    # impute mean for NaN values by looping over columns
-    if not df_ensemble_quantile50.empty:
-        df_ensemble_quantile50 = impute_mean_for_nan(df_ensemble_quantile50) 
-
-    df_ensemble_quantile10 = extract_quantile_columns(df_market, 'q10')  # get the quantile 10 predictions
-    if not df_ensemble_quantile10.empty:
-        df_ensemble_quantile10 = impute_mean_for_nan(df_ensemble_quantile10)
+def prepare_market_features(ens_params, df_market, buyer_scaler_stats, end_training_timestamp, start_prediction_timestamp, forecasters_scaler_stats=None):
+    """Impute, scale and augment the forecasters predictions of the market, this work does not depend on the buyer targets
+    args:
+        ens_params: dict, ensemble parameters
+        df_market: pd.DataFrame or MarketData, market data
+        buyer_scaler_stats: dict, statistics of the buyer scaler (only used to scale the forecasters if ens_params['axis'] == 1)
+        end_training_timestamp: pd.Timestamp, end of training timestamp
+        start_prediction_timestamp: pd.Timestamp, start of prediction timestamp
+        forecasters_scaler_stats: pd.DataFrame, statistics of the forecasters scaler by column (computed on the training window if None)
+    returns:
+        market_features: dict, augmented forecasters dataframes of the quantiles 50, 10 and 90 (empty if not used)"""
 
-    df_ensemble_quantile90 = extract_quantile_columns(df_market, 'q90')  # get the quantile 90 predictions
-    if not df_ensemble_quantile90.empty:
-        df_ensemble_quantile90 = impute_mean_for_nan(df_ensemble_quantile90)
+    # Extract quantile columns with checks, the NaN values are imputed with statistics of the training window only
+    df_ensemble_quantile50, df_ensemble_quantile10, df_ensemble_quantile90 = impute_market_quantiles(ens_params, df_market, end_training_timestamp)
 
     # Ensure at least one quantile DataFrame is not empty
     if df_ensemble_quantile50.empty:
         raise ValueError("Quantile columns 'q50' were not found in the DataFrame.")
     
-    buyer_resource_name = df_buyer.columns[0]  # get the name of the buyer resource
-    
-    # if the model type is LR, normalization must be True
-    if ens_params['model_type'] == 'LR':
-        assert ens_params['normalize'] == True or ens_params['standardize'] == True, "Normalize or Standardize must be True for model_type 'LR'"
-
-    # ML ENGINE PREDICO PLATFORM
-    logger.info('  ')
-    logger.opt(colors=True).info(f'<fg 250,128,114> PREDICO Machine Learning Engine </fg 250,128,114> ')
-    logger.info('  ')
-    logger.opt(colors=True).info(f'<fg 250,128,114> Launch Time from {str(end_training_timestamp)} </fg 250,128,114> ')
-    logger.opt(colors=True).info(f'<fg 250,128,114> Predictions from {str(start_prediction_timestamp)} to {str(end_prediction_timestamp)} </fg 250,128,114> ')
-    logger.info('  ')
-    logger.opt(colors=True).info(f'<fg 250,128,114> Buyer Resource Name: {buyer_resource_name} </fg 250,128,114>')
-
-    # check rescale_features is true if Normalize is True or Standardize is True
-    assert not (ens_params['normalize'] or ens_params['standardize'] and not ens_params['scale_features']), 'scale_features must be True if normalize or standardize is True'
-
-    # check if normalize and standardize are not both True
-    assert not (ens_params['normalize'] and ens_params['standardize']), 'normalize and standardize cannot both be True'
-
-    # scale features
-    buyer_scaler_stats = buyer_scaler_statistics(ens_params, df_buyer, end_training_timestamp, buyer_resource_name)
-
     # Logging
     logger.opt(colors=True).info(f'<fg 250,128,114> Collecting forecasters prediction for ensemble learning - model: {ens_params["model_type"]} </fg 250,128,114>')
     logger.info('  ')
     logger.opt(colors=True).info(f'<fg 250,128,114> Forecasters Ensemble DataFrame </fg 250,128,114>')
 
     # Scale dataframes
-    df_ensemble_normalized, df_ensemble_normalized_quantile10, df_ensemble_normalized_quantile90 = scale_forecasters_dataframe(ens_params, buyer_scaler_stats, df_ensemble_quantile50, df_ensemble_quantile10, df_ensemble_quantile90, end_training_timestamp)
+    df_ensemble_normalized, df_ensemble_normalized_quantile10, df_ensemble_normalized_quantile90 = scale_forecasters_dataframe(ens_params, buyer_scaler_stats, df_ensemble_quantile50, df_ensemble_quantile10, df_ensemble_quantile90, end_training_timestamp,
+                                                                                                                                forecasters_stats=forecasters_scaler_stats)
+
+    # Cast the scaled features to the compute precision, the augmentations keep it
+    dtype = compute_dtype(ens_params)
+    df_ensemble_normalized, df_ensemble_normalized_quantile10, df_ensemble_normalized_quantile90 = cast_dataframes(dtype, df_ensemble_normalized, df_ensemble_normalized_quantile10, df_ensemble_normalized_quantile90)
     
     # Augment dataframes
     logger.info('   ')
@@ -138,6 +119,133 @@ def create_ensemble_forecasts(ens_params,
             df_ensemble_normalized_lag_quantile90 = pd.DataFrame()
     else:
         df_ensemble_normalized_lag_quantile10, df_ensemble_normalized_lag_quantile90 = pd.DataFrame(), pd.DataFrame()
+
+    return {'df_ensemble_normalized_lag': df_ensemble_normalized_lag,
+            'df_ensemble_normalized_lag_quantile10': df_ensemble_normalized_lag_quantile10,
+            'df_ensemble_normalized_lag_quantile90': df_ensemble_normalized_lag_quantile90}
+
+
+def merge_market_features(ens_params, market_features, seller_features):
+    """Forecasters features of a market from the features of its first sellers and of the sellers added after them
+    The features are computed column by column except the forecasters diversity: the features of the sellers shared by several
+    markets (e.g. the base forecasters of the scenarios of a sweep) are computed once, the diversity is computed again on all the sellers.
+    args:
+        ens_params: dict, ensemble parameters
+        market_features: dict, forecasters features of the first sellers of the market (see prepare_market_features)
+        seller_features: dict, forecasters features of the sellers added after them, with the same ensemble parameters
+    returns:
+        market_features: dict, forecasters features of the market, as prepare_market_features on the whole market"""
+    augmentation = dict(max_lags=ens_params['max_lags'], forecasters_diversity=ens_params['forecasters_diversity'], add_lags=ens_params['add_lags'],
+                        augment_with_poly=ens_params['augment_with_poly'], augment_with_roll_stats=ens_params['augment_with_roll_stats'],
+                        differenciate=ens_params['differenciate'])
+    n_diversity = len(DIVERSITY_FEATURES) if ens_params['forecasters_diversity'] else 0
+    n_features = 1 + sum(len(block) for block in augmented_suffixes(ens_params['max_lags'], ens_params['add_lags'], ens_params['augment_with_poly'],
+                                                                    ens_params['augment_with_roll_stats'], ens_params['differenciate']))
+    merged = {}
+    for name, df_features in market_features.items():
+        df_seller_features = seller_features[name]
+        if df_features.empty or df_seller_features.empty:
+            merged[name] = df_seller_features if df_features.empty else df_features
+            continue
+        # the forecasters columns come first in the augmented dataframes
+        columns = [*df_features.columns[:(df_features.shape[1] - n_diversity) // n_features],
+                   *df_seller_features.columns[:(df_seller_features.shape[1] - n_diversity) // n_features]]
+        df_merged = pd.concat([df_features.drop(columns=list(DIVERSITY_FEATURES[:n_diversity])),
+                               df_seller_features.drop(columns=list(DIVERSITY_FEATURES[:n_diversity]))], axis=1)
+        if n_diversity:
+            df_merged = pd.concat([df_merged, forecasters_diversity_features(df_merged[columns])], axis=1)
+        merged[name] = df_merged[augmented_columns(columns, **augmentation)]
+    return merged
+
+
+def day_scaler_statistics(ens_params, df_buyer, df_market, end_training_timestamp, previous_day_results=None):
+    """Statistics of the buyer and forecasters scalers of the day, computed on the training window
+    With ens_params['incremental_update'] the statistics of the last hyperparameter refresh are kept until the next one:
+    the training rows kept in the models of the previous day stay on the scale of the new rows, so the models are updated and not refit.
+    args:
+        ens_params: dict, ensemble parameters
+        df_buyer: pd.DataFrame, buyer data
+        df_market: pd.DataFrame or MarketData, market data
+        end_training_timestamp: pd.Timestamp, end of training timestamp
+        previous_day_results: dict, results of the previous day (None on the first day)
+    returns:
+        scaler_stats: dict, scaler statistics
+            buyer: dict, statistics of the buyer scaler (see buyer_scaler_statistics)
+            forecasters: pd.DataFrame, statistics of the forecasters scaler by column (None to compute them with the features)"""
+    incremental_update = ens_params.get('incremental_update', False)
+    if incremental_update and previous_day_results is not None and 'scaler_stats' in previous_day_results:
+        iteration, _, _ = initialize_results(ens_params, previous_day_results)
+        if iteration % ens_params['gbr_update_every_days'] != 0:
+            return previous_day_results['scaler_stats']
+    scaler_stats = {'buyer': buyer_scaler_statistics(ens_params, df_buyer, end_training_timestamp, df_buyer.columns[0]), 'forecasters': None}
+    if incremental_update:
+        scaler_stats['forecasters'] = forecasters_scaler_statistics(ens_params, end_training_timestamp, *impute_market_quantiles(ens_params, df_market, end_training_timestamp))
+    return scaler_stats
+
+
+def create_ensemble_forecasts(ens_params,
+                                df_buyer,
+                                df_market,
+                                end_training_timestamp,
+                                forecast_range,
+                                challenge_usecase = None,
+                                simulation = False,
+                                session_state = None,
+                                market_features = None):
+    """Create ensemble forecasts for wind power and wind power variability using forecasters predictions
+    args:
+        ens_params: dict, ensemble parameters
+        df_buyer: pd.DataFrame, buyer data
+        df_market: pd.DataFrame or MarketData, market data
+        end_training_timestamp: pd.Timestamp, end of training timestamp
+        forecast_range: pd.DatetimeIndex, forecast range
+        challenge_usecase: str, challenge usecase
+        simulation: bool, simulation
+        session_state: SessionState, in-process state of the previous day (None to read and write the previous day pickle file)
+        market_features: dict, forecasters features from prepare_market_features (computed from df_market if None)
+    returns:
+        results_challenge_dict: dict, results for the challenge
+        results_challenge_dict_simulation: dict, results for the challenge simulation"""
+
+    start_prediction_timestamp = forecast_range[0]  # get the start prediction timestamp
+    end_prediction_timestamp = forecast_range[-1]  # get the end prediction timestamp
+
+    buyer_resource_name = df_buyer.columns[0]  # get the name of the buyer resource
+    
+    # if the model type is LR, normalization must be True
+    if ens_params['model_type'] == 'LR':
+        assert ens_params['normalize'] == True or ens_params['standardize'] == True, "Normalize or Standardize must be True for model_type 'LR'"
+
+    # ML ENGINE PREDICO PLATFORM
+    logger.info('  ')
+    logger.opt(colors=True).info(f'<fg 250,128,114> PREDICO Machine Learning Engine </fg 250,128,114> ')
+    logger.info('  ')
+    logger.opt(colors=True).info(f'<fg 250,128,114> Launch Time from {str(end_training_timestamp)} </fg 250,128,114> ')
+    logger.opt(colors=True).info(f'<fg 250,128,114> Predictions from {str(start_prediction_timestamp)} to {str(end_prediction_timestamp)} </fg 250,128,114> ')
+    logger.info('  ')
+    logger.opt(colors=True).info(f'<fg 250,128,114> Buyer Resource Name: {buyer_resource_name} </fg 250,128,114>')
+
+    # check rescale_features is true if Normalize is True or Standardize is True
+    assert not (ens_params['normalize'] or ens_params['standardize'] and not ens_params['scale_features']), 'scale_features must be True if normalize or standardize is True'
+
+    # check if normalize and standardize are not both True
+    assert not (ens_params['normalize'] and ens_params['standardize']), 'normalize and standardize cannot both be True'
+
+    # Results of the previous day
+    file_info, previous_day_results = load_previous_day_results(ens_params, buyer_resource_name, session_state)
+    iteration, best_results, best_results_var = initialize_results(ens_params, previous_day_results)
+
+    # scale features, with the statistics of the last hyperparameter refresh for the incremental updates
+    scaler_stats = day_scaler_statistics(ens_params, df_buyer, df_market, end_training_timestamp, previous_day_results)
+    buyer_scaler_stats = scaler_stats['buyer']
+    dtype = compute_dtype(ens_params)
+
+    # Forecasters features, shared by the buyers with the same market data (see create_ensemble_forecasts_batch)
+    if market_features is None:
+        market_features = prepare_market_features(ens_params, df_market, buyer_scaler_stats, end_training_timestamp, start_prediction_timestamp, scaler_stats['forecasters'])
+    df_ensemble_normalized_lag = market_features['df_ensemble_normalized_lag']
+    df_ensemble_normalized_lag_quantile10 = market_features['df_ensemble_normalized_lag_quantile10']
+    df_ensemble_normalized_lag_quantile90 = market_features['df_ensemble_normalized_lag_quantile90']
     
     # Scale buyer dataframe
     df_buyer_norm = scale_buyer_dataframe(ens_params, buyer_scaler_stats, df_buyer)
@@ -164,13 +272,13 @@ def create_ensemble_forecasts(ens_params,
 
     # # Split train and test dataframes quantile predictions
     if ens_params['add_quantile_predictions']:
-        if not df_ensemble_normalized_quantile10.empty:
+        if not df_ensemble_normalized_lag_quantile10.empty:
             # Quantile 10
             df_train_ensemble_quantile10, df_test_ensemble_quantile10 = split_quantile_train_test_data(
                 df_ensemble_normalized_lag_quantile10, end_training_timestamp, start_prediction_timestamp)
         else:
             df_train_ensemble_quantile10 = df_test_ensemble_quantile10 = pd.DataFrame()
-        if not df_ensemble_normalized_quantile90.empty:
+        if not df_ensemble_normalized_lag_quantile90.empty:
             # Quantile 90
             df_train_ensemble_quantile90, df_test_ensemble_quantile90 = split_quantile_train_test_data(
                 df_ensemble_normalized_lag_quantile90, end_training_timestamp, start_prediction_timestamp)
@@ -184,7 +292,7 @@ def create_ensemble_forecasts(ens_params,
     assert (df_test_targ.index == df_test_ensemble.index).all(),'Datetime index are not equal'
 
     # Make X-y train and test sets
-    X_train, y_train, X_test, _ = get_numpy_Xy_train_test(df_train_ensemble, df_test_ensemble)
+    X_train, y_train, X_test, _ = get_numpy_Xy_train_test(df_train_ensemble, df_test_ensemble, dtype=dtype)
 
     # Make X-y train and test sets quantile
     X_train_quantile10, X_test_quantile10, X_train_quantile90, X_test_quantile90 = get_numpy_Xy_train_test_quantile(ens_params,
@@ -202,7 +310,9 @@ def create_ensemble_forecasts(ens_params,
     logger.info(f'Number of NaNs in the train ensemble: {df_train_ensemble.isna().sum().sum()}')
     logger.info(f'Number of NaNs in the test ensemble: {df_test_ensemble.isna().sum().sum()}')
     
-    file_info, iteration, best_results, best_results_var = load_or_initialize_results(ens_params, buyer_resource_name)
+    # models of the previous day, updated with the new training rows if ens_params['incremental_update']
+    previous_models_first_stage = previous_day_results['wind_power']['info_contributions'] if previous_day_results is not None else {}
+    previous_models_second_stage = previous_day_results['wind_power_variability']['info_contributions'] if previous_day_results is not None else {}
 
     logger.info('   ')
     logger.opt(colors=True).info(f'<fg 250,128,114> Iteration {iteration} </fg 250,128,114>')
@@ -231,7 +341,8 @@ def create_ensemble_forecasts(ens_params,
                                                                             X_train_quantile10=X_train_quantile10, X_test_quantile10=X_test_quantile10, 
                                                                             df_train_ensemble_quantile10=df_train_ensemble_quantile10, 
                                                                             X_train_quantile90=X_train_quantile90, X_test_quantile90=X_test_quantile90, 
-                                                                            df_train_ensemble_quantile90=df_train_ensemble_quantile90)
+                                                                            df_train_ensemble_quantile90=df_train_ensemble_quantile90,
+                                                                            previous_day_results=previous_models_first_stage.get(quantile))
         
         # Extract results
         predictions = results_per_quantile_wp['predictions']
@@ -260,6 +371,8 @@ def create_ensemble_forecasts(ens_params,
                                                         }
         if ens_params['model_type'] == 'LR':
             previous_day_results_first_stage[quantile].update({"coefs": coefs, "p_values": p_values, "model-summary": model_summary})
+        if 'incremental' in results_per_quantile_wp:
+            previous_day_results_first_stage[quantile]['incremental'] = results_per_quantile_wp['incremental']
         
         # compute variability predictions with as input the predictions of the first stage
         if  quantile == 0.5:
@@ -302,7 +415,7 @@ def create_ensemble_forecasts(ens_params,
             assert len(df_2stage_test) == 96, 'Test dataframe must have 96 rows'
             
             # Make X-y train and test sets for 2-stage
-            X_train_2stage, y_train_2stage, X_test_2stage = get_numpy_Xy_train_test_2stage(df_2stage_train, df_2stage_test)
+            X_train_2stage, y_train_2stage, X_test_2stage = get_numpy_Xy_train_test_2stage(df_2stage_train, df_2stage_test, dtype=dtype)
 
             # dictioanry to store variability predictions
             variability_predictions = {}
@@ -324,7 +437,9 @@ def create_ensemble_forecasts(ens_params,
                                                                                     iteration=iteration, 
                                                                                     best_results_var=best_results_var,
                                                                                     variability_predictions_insample =  variability_predictions_insample,
-                                                                                    variability_predictions_outsample = variability_predictions_outsample,)
+                                                                                    variability_predictions_outsample = variability_predictions_outsample,
+                                                                                    train_index = df_2stage_train.index,
+                                                                                    previous_day_results = previous_models_second_stage.get(quantile))
                 
                 # Extract results
                 variability_predictions = results_per_quantile_wpv['variability_predictions']
@@ -344,6 +459,8 @@ def create_ensemble_forecasts(ens_params,
                                                                 "y_train": y_train,
                                                                 "buyer_scaler_stats": buyer_scaler_stats
                                                                 }
+                if 'var_incremental' in results_per_quantile_wpv:
+                    previous_day_results_second_stage[quantile]['var_incremental'] = results_per_quantile_wpv['var_incremental']
 
                 # Rescale predictions for variability
                 variability_predictions = rescale_predictions(variability_predictions, ens_params, buyer_scaler_stats, quantile, stage='2nd')
@@ -435,11 +552,14 @@ def create_ensemble_forecasts(ens_params,
                                                 'best_results': best_results_var},
                                         'wind_power_ramp': 
                                                 {'predictions_outsample': var_pred_outsample_df,
-                                                'predictions_insample': var_pred_insample_df}
+                                                'predictions_insample': var_pred_insample_df},
+                                        'scaler_stats': scaler_stats
                                             }
         # save results
-        with open(file_info, 'wb') as handle:
-            pickle.dump(results_challenge_dict_simulation, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        if session_state is not None:
+            session_state.update(results_challenge_dict_simulation)
+        else:
+            atomic_pickle_dump(results_challenge_dict_simulation, file_info)
         return results_challenge_dict_simulation
     
     else:
@@ -457,11 +577,118 @@ def create_ensemble_forecasts(ens_params,
                                     'wind_power_variability': 
                                         {'predictions': df_var_ensemble_melt, 
                                             'info_contributions': previous_day_results_second_stage,
-                                            'best_results': best_results_var}
+                                            'best_results': best_results_var},
+                                    'scaler_stats': scaler_stats
                                         }
         # save results
-        with open(file_info, 'wb') as handle:
-            pickle.dump(results_challenge_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        if session_state is not None:
+            session_state.update(results_challenge_dict)
+        else:
+            atomic_pickle_dump(results_challenge_dict, file_info)
         assert  challenge_usecase == 'wind_power' or challenge_usecase == 'wind_power_variability', 'challenge_usecase must be either "wind_power" or "wind_power_variability"'
         return results_challenge_dict[challenge_usecase]['predictions']
-    
\ No newline at end of file
+    
+
+
+# forecasters features of the markets of a batch, sent once to each worker process by the pool initializer
+_BATCH_MARKET_FEATURES = None
+
+def market_features_key(ens_params, df_market, scaler_stats):
+    " Key of the forecasters features of a market, equal for the buyers with the same market data and forecasters scaling (see day_scaler_statistics)"
+    sha1 = hashlib.sha1(json.dumps(list(map(str, df_market.columns))).encode())
+    if isinstance(df_market, MarketData):
+        sha1.update(df_market.index.asi8.tobytes())
+        sha1.update(np.ascontiguousarray(df_market.values).tobytes())
+    else:
+        sha1.update(pd.util.hash_pandas_object(df_market, index=True).values.tobytes())
+    if ens_params['axis'] == 1:
+        # the forecasters are scaled with the statistics of the buyer
+        sha1.update(json.dumps(scaler_stats['buyer'], sort_keys=True, default=float).encode())
+    if scaler_stats['forecasters'] is not None:
+        sha1.update(scaler_stats['forecasters'].to_json().encode())
+    return sha1.hexdigest()
+
+def _init_batch_worker(market_features):
+    " Keep the forecasters features of the batch in the worker process"
+    global _BATCH_MARKET_FEATURES
+    _BATCH_MARKET_FEATURES = market_features
+
+def _run_buyer_forecasts(ens_params, df_buyer, df_market, end_training_timestamp, forecast_range, challenge_usecase, simulation,
+                            features_key, file_info=None, previous_results=None):
+    """ Ensemble forecasts of a buyer in a worker process
+    The state of the previous day is handed in and returned if file_info is given, otherwise it is read from and written to the pickle file.
+    The cross-validations run sequentially, the buyers are the parallel tasks (nested worker pools would oversubscribe the cores
+    and keep the worker process alive until their idle timeout).
+    returns:
+        results: results of create_ensemble_forecasts
+        state_results: dict, results dictionary of the day for the session state of the buyer (None without state)"""
+    session_state = SessionState(file_info, results=previous_results) if file_info is not None else None
+    with parallel_config(backend='sequential'):
+        results = create_ensemble_forecasts(ens_params, df_buyer, df_market, end_training_timestamp, forecast_range,
+                                            challenge_usecase=challenge_usecase, simulation=simulation,
+                                            session_state=session_state, market_features=_BATCH_MARKET_FEATURES[features_key])
+    return results, session_state.results if session_state is not None else None
+
+def create_ensemble_forecasts_batch(ens_params,
+                                    buyers,
+                                    end_training_timestamp,
+                                    forecast_range,
+                                    challenge_usecase = None,
+                                    simulation = False,
+                                    session_states = None,
+                                    max_workers = None):
+    """Create the ensemble forecasts of several buyers resources in one call, see create_ensemble_forecasts
+    The forecasters features (imputation, scaling and augmentation) are computed once for the buyers with the same market data,
+    then the models of the buyers are fitted in a process pool.
+    args:
+        ens_params: dict, ensemble parameters
+        buyers: dict, buyer resource name: (df_buyer, df_market)
+        end_training_timestamp: pd.Timestamp, end of training timestamp
+        forecast_range: pd.DatetimeIndex, forecast range
+        challenge_usecase: str, challenge usecase
+        simulation: bool, simulation
+        session_states: dict, buyer resource name: SessionState (None to read and write the previous day pickle files)
+        max_workers: int, number of worker processes (the buyers run one after the other in this process if 1)
+    returns:
+        batch_results: dict, buyer resource name: results of create_ensemble_forecasts"""
+    assert len(buyers) > 0, 'No buyers to forecast'
+    for buyer_resource_name, (df_buyer, _) in buyers.items():
+        assert df_buyer.columns[0] == buyer_resource_name, f'The first column of the buyer data must be {buyer_resource_name}'
+    assert session_states is None or set(session_states) == set(buyers), 'One session state per buyer must be provided'
+    start_prediction_timestamp = forecast_range[0]
+
+    # Forecasters features, once per distinct market
+    market_features, buyer_keys = {}, {}
+    for buyer_resource_name, (df_buyer, df_market) in buyers.items():
+        session_state = session_states[buyer_resource_name] if session_states is not None else None
+        _, previous_day_results = load_previous_day_results(ens_params, buyer_resource_name, session_state)
+        scaler_stats = day_scaler_statistics(ens_params, df_buyer, df_market, end_training_timestamp, previous_day_results)
+        key = market_features_key(ens_params, df_market, scaler_stats)
+        if key not in market_features:
+            market_features[key] = prepare_market_features(ens_params, df_market, scaler_stats['buyer'], end_training_timestamp, start_prediction_timestamp, scaler_stats['forecasters'])
+        buyer_keys[buyer_resource_name] = key
+    logger.opt(colors=True).info(f'<fg 250,128,114> Batch of {len(buyers)} buyers sharing {len(market_features)} forecasters features </fg 250,128,114>')
+
+    if max_workers == 1:
+        return {buyer_resource_name: create_ensemble_forecasts(ens_params, df_buyer, df_market, end_training_timestamp, forecast_range,
+                                                                challenge_usecase=challenge_usecase, simulation=simulation,
+                                                                session_state=session_states[buyer_resource_name] if session_states is not None else None,
+                                                                market_features=market_features[buyer_keys[buyer_resource_name]])
+                for buyer_resource_name, (df_buyer, df_market) in buyers.items()}
+
+    # spawned workers do not inherit the joblib worker pools of the parent process
+    batch_results = {}
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_batch_worker, initargs=(market_features,)) as executor:
+        futures = {}
+        for buyer_resource_name, (df_buyer, df_market) in buyers.items():
+            session_state = session_states[buyer_resource_name] if session_states is not None else None
+            futures[buyer_resource_name] = executor.submit(_run_buyer_forecasts, ens_params, df_buyer, df_market, end_training_timestamp, forecast_range,
+                                                           challenge_usecase, simulation, buyer_keys[buyer_resource_name],
+                                                           session_state.file_info if session_state is not None else None,
+                                                           session_state.results if session_state is not None else None)
+        for buyer_resource_name, future in futures.items():
+            batch_results[buyer_resource_name], state_results = future.result()
+            if session_states is not None:
+                session_states[buyer_resource_name].update(state_results)
+    return batch_results
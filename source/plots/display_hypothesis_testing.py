@@ -1,5 +1,3 @@
-from matplotlib import pyplot as plt
-import scikit_posthocs as sp
 import pandas as pd
 
 def transform_loss_lists_to_df(model_type, 
@@ -50,6 +48,9 @@ def transform_loss_lists_to_df(model_type,
 
 def plot_statistical_comparison(pc, avg_rank, title1, title2):
     " Plot the statistical comparison"
+    # plotting and post-hoc test libraries are imported on use, they are slow to import
+    from matplotlib import pyplot as plt
+    import scikit_posthocs as sp
     # Define the colormap and heatmap arguments
     cmap = ['1', '#fb6a4a',  '#08306b',  '#4292c6', '#c6dbef']
     heatmap_args = {
@@ -88,6 +89,7 @@ def run_statistical_comparison_analysis(model_type,
     Function to transform loss lists into a DataFrame, calculate average ranks, perform statistical tests,
     and plot the results.
     """
+    import scikit_posthocs as sp
     # Transform loss lists into a DataFrame
     data = transform_loss_lists_to_df(model_type, 
                                             lst_ensemble,
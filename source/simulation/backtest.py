@@ -0,0 +1,333 @@
+import time
+import glob
+import os
+import numpy as np
+from tqdm import tqdm
+from loguru import logger
+from source.utils.file_read import read_csv_file, filter_data, replace_nan_values
+from source.utils.data_cache import read_csv_file_cached, open_append_store, append_day_files, read_bundle, replace_nan_values_from_bundle
+from source.utils.json_loader import month_files, read_month_files
+from source.utils.generate_timestamp import generate_timestamps
+from source.utils.time_grid import build_time_grid, grid_rows_between
+from source.utils.quality_index import build_quality_index, day_eligibility, repair_window, REPAIRABLE_CHECKS
+from source.utils.imputation import build_imputation_sums, window_statistics, impute_nan_values
+from source.utils.panel_store import create_panel_store, open_panel_store, panel_window
+from source.simulation.submission_module import submission_base_forecasters, submission_market, submission_rng
+from source.simulation.buyer_module import prepare_buyer_data
+from source.ml_engine import create_ensemble_forecasts
+from source.ensemble.stack_generalization.wind_ramp.detector import wind_ramp_detector
+from source.assessment_contributions import compute_forecasters_contributions
+from source.utils.session_ml_info import previous_day_pickle_file, SessionState
+from source.simulation.checkpoint import save_checkpoint, save_day_results, iter_checkpoint_results, load_checkpoint, restore_checkpoint, delete_checkpoint
+
+def prepare_backtest_data(sim_params, create_panel=True):
+    """ Load the dataset and build the structures shared by all the test days
+    args:
+        sim_params: dict, simulation parameters
+        create_panel: bool, write the panel store (False to open a store written by another process)
+    returns:
+        data: dict, backtest data
+            df_processed: pd.DataFrame, processed dataset
+            grid: dict, time grid of the dataset
+            quality_index: pd.DataFrame, per-day quality index (None if ineligible days are not checked)
+            imputation_sums: dict, running sums for the training window imputation (None if not used)
+            panel_store: dict, memory mapped panel store (None if not used)"""
+    # Read the monthly json files or the CSV file (through the columnar cache if a cache directory is set)
+    append_store = None
+    if sim_params.get('data_source', 'csv') == 'json':
+        df_processed = read_month_files(month_files(sim_params), sim_params['list_columns'], sim_params['starting_period'], sim_params['ending_period'], max_workers=sim_params.get('loader_workers'))
+    elif sim_params.get('cache_dir') and sim_params.get('new_days_dir'):
+        # the store is seeded from the CSV once, then only the new daily files are appended to it
+        append_store = open_append_store(sim_params['csv_filename'], sim_params['list_columns'], cache_dir=sim_params['cache_dir'])
+        append_day_files(append_store, glob.glob(os.path.join(sim_params['new_days_dir'], '*.csv')), measured_col=sim_params['measured_col'])
+        df_processed = read_bundle(append_store, sim_params['list_columns'], sim_params['starting_period'], sim_params['ending_period'])
+    elif sim_params.get('cache_dir'):
+        df_processed = read_csv_file_cached(sim_params['csv_filename'], sim_params['list_columns'], sim_params['starting_period'], sim_params['ending_period'], cache_dir=sim_params['cache_dir'])
+    else:
+        df_processed = read_csv_file(sim_params['csv_filename'], sim_params['list_columns'], sim_params['starting_period'], sim_params['ending_period'])
+
+    # Per-day data quality index to skip or repair the ineligible days before any model work
+    quality_index = build_quality_index(df_processed, measured_col=sim_params['measured_col']) if sim_params.get('ineligible_days') else None
+
+    # Replace NaN values if specified, with statistics of the whole dataset or of each training window
+    impute_from_train_window = sim_params['replace_nan'] and sim_params.get('imputation_window', 'dataset') == 'train'
+    if sim_params['replace_nan'] and not impute_from_train_window:
+        if append_store is not None:
+            df_processed = replace_nan_values_from_bundle(sim_params, df_processed, append_store)
+        else:
+            df_processed = replace_nan_values(sim_params, df_processed)
+
+    # Time grid of the dataset to locate the daily windows by arithmetic
+    grid = build_time_grid(df_processed.index)
+
+    # Running sums of the dataset to get the training window statistics of each day in O(1)
+    imputation_sums = build_imputation_sums(df_processed) if impute_from_train_window else None
+
+    # Memory mapped float32 panel shared by the processes reading the same store
+    panel_store = None
+    if sim_params.get('panel_dir'):
+        if create_panel:
+            create_panel_store(df_processed, sim_params['panel_dir'])
+        panel_store = open_panel_store(sim_params['panel_dir'])
+
+    return {'df_processed': df_processed, 'grid': grid, 'quality_index': quality_index,
+            'imputation_sums': imputation_sums, 'panel_store': panel_store}
+
+def plan_test_days(sim_params, data):
+    """ Test days to run, with the ineligible days skipped or flagged for repair
+    args:
+        sim_params: dict, simulation parameters
+        data: dict, backtest data
+    returns:
+        test_days: list, (day, repair_test_day) for each day to run"""
+    test_days = []
+    for i in range(sim_params['num_test_days']):
+        repair_test_day = False
+        if data['quality_index'] is not None:
+            start_training_timestamp, end_training_timestamp, start_prediction_timestamp, end_prediction_timestamp = generate_timestamps(
+                sim_params['start_training'], i, sim_params['window_size'], sim_params.get('window', 'sliding'), sim_params.get('max_window_size'))
+            eligible, reasons = day_eligibility(data['quality_index'], start_training_timestamp, end_training_timestamp, start_prediction_timestamp, end_prediction_timestamp,
+                                                measured_col=sim_params['measured_col'], check_measured_nans=not sim_params['replace_nan'])
+            if not eligible:
+                if sim_params['ineligible_days'] == 'repair' and set(reasons) <= set(REPAIRABLE_CHECKS):
+                    repair_test_day = True
+                else:
+                    logger.warning(f'Skipping test day {start_prediction_timestamp.date()}: {", ".join(reasons.values())}')
+                    continue
+        test_days.append((i, repair_test_day))
+    return test_days
+
+def load_backtest_day(sim_params, data, i, repair_test_day=False):
+    """ Training and test data of a test day, repaired and imputed
+    args:
+        sim_params: dict, simulation parameters
+        data: dict, backtest data (see prepare_backtest_data)
+        i: int, test day
+        repair_test_day: bool, repair the missing slots of the test day
+    returns:
+        day: dict, test day, its timestamps and its df_train and df_test"""
+    # Generate timestamps for training and prediction
+    start_training_timestamp, end_training_timestamp, start_prediction_timestamp, end_prediction_timestamp = generate_timestamps(
+        sim_params['start_training'], i, sim_params['window_size'], sim_params.get('window', 'sliding'), sim_params.get('max_window_size'))
+
+    # Trim data for training and testing
+    if data['panel_store'] is not None:
+        df_train = panel_window(data['panel_store'], start_training_timestamp, end_training_timestamp)
+        df_test = panel_window(data['panel_store'], start_prediction_timestamp, end_prediction_timestamp)
+    else:
+        df_train = filter_data(data['df_processed'], start_training_timestamp, end_training_timestamp, string='training', grid=data['grid'])
+        df_test = filter_data(data['df_processed'], start_prediction_timestamp, end_prediction_timestamp, string='testing', grid=data['grid'])
+
+    # Repair the test day flagged by the quality index
+    if repair_test_day:
+        df_test = repair_window(df_test, start_prediction_timestamp, end_prediction_timestamp)
+
+    # Impute NaN values with what is known at the end of the training window
+    if data['imputation_sums'] is not None:
+        row_start, row_end = grid_rows_between(data['grid'], start_training_timestamp, end_training_timestamp)
+        fill_values = window_statistics(data['imputation_sums'], row_start, max(row_start, row_end - 1), sim_params['imputation_nan'])
+        df_train, df_test = impute_nan_values(df_train, fill_values), impute_nan_values(df_test, fill_values)
+
+    return {'day': i, 'start_training': start_training_timestamp, 'end_training': end_training_timestamp,
+            'start_prediction': start_prediction_timestamp, 'end_prediction': end_prediction_timestamp,
+            'df_train': df_train, 'df_test': df_test}
+
+def run_ensemble_day(sim_params, ens_params, day, df_market, df_test, df_buyer, forecast_range, session_state=None, market_features=None):
+    """ Ensemble forecasts, wind ramp detection and contributions of a test day from the submission of the forecasters
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        day: dict, test day (see load_backtest_day)
+        df_market: MarketData, submission of the forecasters (or its market dataframe)
+        df_test: pd.DataFrame, test data
+        df_buyer: pd.DataFrame, buyer data
+        forecast_range: pd.DatetimeIndex, forecast range
+        session_state: SessionState, in-process state of the previous day
+        market_features: dict, forecasters features of the market (computed from df_market if None, see prepare_market_features)
+    returns:
+        day_results: dict, results of the day (see run_backtest_day)"""
+
+    # ----------------------------> PREDICO PLATFORM ML ENGINE <----------------------------
+
+    # ----------------------------> ENSEMBLE FORECASTS <----------------------------
+
+    logger.debug("Wind ensemble forecasts ...")
+    start = time.perf_counter()
+    # the global random generator (still used by the permutation tests) is seeded by day as the submission:
+    # a day gets the same draws in a sequential run, in a block of a parallel run or in a scenario of a sweep
+    np.random.seed([sim_params['random_seed'], day['day']])
+    results_ensemble_forecasts = create_ensemble_forecasts(
+        ens_params=ens_params,
+        df_buyer=df_buyer,
+        df_market=df_market,
+        end_training_timestamp=day['end_training'],
+        forecast_range=forecast_range,
+        challenge_usecase='simulation',
+        simulation=True,
+        session_state=session_state,
+        market_features=market_features
+    )
+
+    # ----------------------------> WIND RAMP DETECTION <----------------------------
+
+    timings = {'ensemble': time.perf_counter() - start}
+    logger.debug("Wind ramp detection ...")
+    start = time.perf_counter()
+    pred_variability_insample = results_ensemble_forecasts['wind_power_ramp']['predictions_insample']
+    pred_variability_outsample = results_ensemble_forecasts['wind_power_ramp']['predictions_outsample']
+
+    # Wind ramp detection logic
+    alarm_status, df_ramp_clusters = wind_ramp_detector(
+        ens_params=ens_params,
+        df_pred_variability_insample=pred_variability_insample,
+        df_pred_variability_outsample=pred_variability_outsample
+    )
+
+    logger.info(f"Alarm status: {alarm_status}")
+    if df_ramp_clusters is not None:
+        logger.info(f"Ramp clusters: {df_ramp_clusters.cluster_id.unique()}")
+        logger.info(f"Ramp clusters datetime: {df_ramp_clusters.index}")
+
+    # ----------------------------> ASSESSMENT CONTRIBUTIONS <----------------------------
+
+    timings['ramp_detection'] = time.perf_counter() - start
+    logger.debug("Forecasters contributions ...")
+    start = time.perf_counter()
+    y_test = df_test['measured'].values
+    forecasters_contributions = compute_forecasters_contributions(
+        sim_params['buyer_resource_name'], ens_params, y_test, forecast_range, session_state=session_state
+    )
+    logger.info(f"Forecasters contributions: {forecasters_contributions}")
+    timings['contributions'] = time.perf_counter() - start
+
+    return {'day': day['day'], 'start_prediction': day['start_prediction'],
+            'wind_power': results_ensemble_forecasts['wind_power']['predictions'],
+            'wind_power_variability': results_ensemble_forecasts['wind_power_variability']['predictions'],
+            'alarm_status': alarm_status, 'ramp_clusters': df_ramp_clusters,
+            'contributions': forecasters_contributions, 'timings': timings}
+
+def build_base_submissions(sim_params, data, test_days):
+    """ Submission of the base forecasters of every test day, it does not depend on the seed and can be shared by several backtests
+    args:
+        sim_params: dict, simulation parameters
+        data: dict, backtest data (see prepare_backtest_data)
+        test_days: list, (day, repair_test_day) of the days to run, see plan_test_days
+    returns:
+        base_submissions: dict, (day, repair_test_day): MarketData of the sellers s1, s2 and s3 (see submission_base_forecasters)"""
+    base_submissions = {}
+    for i, repair_test_day in test_days:
+        day = load_backtest_day(sim_params, data, i, repair_test_day)
+        base_submissions[(i, repair_test_day)] = submission_base_forecasters(day['df_train'], day['df_test'])
+    return base_submissions
+
+def shared_base_submission(data, day, repair_test_day):
+    " Base submission of a test day in data['base_submissions'] (None if there is none or if it was built for other windows)"
+    base_submission = (data.get('base_submissions') or {}).get((day['day'], repair_test_day))
+    if base_submission is not None and not base_submission.index.equals(day['df_train'].index.append(day['df_test'].index)):
+        return None
+    return base_submission
+
+def run_backtest_day(sim_params, ens_params, data, i, repair_test_day=False, session_state=None):
+    """ Run one test day: submission, ensemble forecasts, wind ramp detection and contributions
+    The state shared with the previous day is carried by session_state (by the pickle of ens_params['save_info'] if None).
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        data: dict, backtest data (see prepare_backtest_data)
+        i: int, test day
+        repair_test_day: bool, repair the missing slots of the test day
+        session_state: SessionState, in-process state of the previous day
+    returns:
+        day_results: dict, results of the day
+            day: int, test day
+            start_prediction: pd.Timestamp, start of the test day
+            wind_power: pd.DataFrame, quantile predictions and targets
+            wind_power_variability: pd.DataFrame, variability quantile predictions and targets
+            alarm_status: int, wind ramp alarm status
+            ramp_clusters: pd.DataFrame, wind ramp events (None if there is none)
+            contributions: dict, forecasters contributions
+            timings: dict, seconds spent loading the data and in the ensemble, ramp detection and contributions stages, and in total"""
+    start = time.perf_counter()
+    day = load_backtest_day(sim_params, data, i, repair_test_day)
+
+    # ----------------------------> FORECASTERS SUBMISSION <----------------------------
+
+    logger.debug("Forecasters submission ...")
+    market, df_train, df_test = submission_market(sim_params, day['df_train'], day['df_test'], base_submission=shared_base_submission(data, day, repair_test_day),
+                                                  rng=submission_rng(sim_params, i))
+
+    # ----------------------------> MARKET OPERATOR DATA <----------------------------
+
+    logger.debug("Market operator data ...")
+    df_buyer, forecast_range = prepare_buyer_data(df_train, df_test, day['start_prediction'], day['end_prediction'], sim_params['buyer_resource_name'])
+    data_time = time.perf_counter() - start
+
+    day_results = run_ensemble_day(sim_params, ens_params, day, market, df_test, df_buyer, forecast_range, session_state=session_state)
+    day_results['timings'] = dict({'data': data_time}, **day_results.get('timings', {}), total=time.perf_counter() - start)
+    return day_results
+
+def iter_test_days(sim_params, ens_params, data, test_days, checkpoint_dir=None, checkpoint_every_days=1, resume=False):
+    """ Run the test days one after the other and yield the results of each day as soon as it is computed
+    The consumer may stop early, the state of the backtest is closed with the generator. Only the day being run is held
+    in memory, with a checkpoint the results of each day are saved in their own file and read back one by one on resume.
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        data: dict, backtest data (see prepare_backtest_data)
+        test_days: list, (day, repair_test_day) of the days to run, see plan_test_days
+        checkpoint_dir: str, directory of the checkpoint (None to run without checkpoint)
+        checkpoint_every_days: int, number of days between two checkpoints
+        resume: bool, resume from the last checkpoint instead of starting over (the days of the checkpoint are yielded first)
+    yields:
+        day_results: dict, results of a test day (see run_backtest_day)"""
+    assert checkpoint_every_days > 0, 'checkpoint_every_days must be positive'
+    # state handed in memory from day to day, the previous day pickle is only written if persist_state is set
+    session_state = SessionState(previous_day_pickle_file(ens_params, sim_params['buyer_resource_name']), persist=sim_params.get('persist_state', False))
+    checkpoint = load_checkpoint(checkpoint_dir) if checkpoint_dir and resume else None
+    if checkpoint is not None:
+        assert checkpoint['test_days'] == test_days, 'The checkpoint was saved for other test days'
+        restore_checkpoint(checkpoint, session_state)
+        n_completed = checkpoint['completed_days']
+        logger.info(f'Resuming after {n_completed} of {len(test_days)} test days')
+    else:
+        # Remove previous day pickle file and checkpoint
+        session_state.reset()
+        if checkpoint_dir:
+            delete_checkpoint(checkpoint_dir)
+        n_completed = 0
+    try:
+        if checkpoint is not None:
+            yield from iter_checkpoint_results(checkpoint_dir, n_completed)
+        for position in tqdm(range(n_completed, len(test_days)), desc='Testing Days', initial=n_completed, total=len(test_days)):
+            i, repair_test_day = test_days[position]
+            day_results = run_backtest_day(sim_params, ens_params, data, i, repair_test_day, session_state=session_state)
+            n_completed += 1
+            if checkpoint_dir:
+                save_day_results(checkpoint_dir, position, day_results)
+                if n_completed % checkpoint_every_days == 0 or n_completed == len(test_days):
+                    save_checkpoint(checkpoint_dir, test_days, session_state.results, n_completed)
+            yield day_results
+    finally:
+        session_state.close()
+
+def run_test_days(sim_params, ens_params, data, test_days, checkpoint_dir=None, checkpoint_every_days=1, resume=False):
+    """ Run the test days one after the other, with a checkpoint every checkpoint_every_days days, see iter_test_days
+    returns:
+        backtest_results: list, results of the test days (see run_backtest_day)"""
+    return list(iter_test_days(sim_params, ens_params, data, test_days, checkpoint_dir=checkpoint_dir,
+                               checkpoint_every_days=checkpoint_every_days, resume=resume))
+
+def iter_backtest(sim_params, ens_params, resume=False):
+    """ Load the dataset, plan the test days and yield the results of each test day as soon as it is computed
+    e.g. to stream the results into metrics, storage or plots and stop early, see iter_test_days
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        resume: bool, resume from the last checkpoint of sim_params['checkpoint_dir']
+    yields:
+        day_results: dict, results of a test day (see run_backtest_day)"""
+    data = prepare_backtest_data(sim_params)
+    yield from iter_test_days(sim_params, ens_params, data, plan_test_days(sim_params, data),
+                              checkpoint_dir=sim_params.get('checkpoint_dir'),
+                              checkpoint_every_days=sim_params.get('checkpoint_every_days', 1),
+                              resume=resume)
@@ -0,0 +1,73 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+from source.utils.shared_arrays import release_arrays
+from source.utils.shared_backtest_data import share_backtest_data, init_worker, worker_data
+from source.simulation.backtest import prepare_backtest_data, plan_test_days, run_test_days
+
+def plan_backtest_blocks(test_days, block_size):
+    """ Split the test days into consecutive blocks, each block starts with a hyperparameter refresh
+    The hyperparameters are optimized when the iteration is a multiple of gbr_update_every_days, so blocks
+    of a multiple of gbr_update_every_days days only depend on the state built inside the block.
+    args:
+        test_days: list, (day, repair_test_day) of the days to run, see plan_test_days
+        block_size: int, number of days of a block
+    returns:
+        blocks: list, blocks with their id, the iteration of their first day and their test days"""
+    assert block_size > 0, 'block_size must be positive'
+    return [{'block_id': block_id, 'first_iteration': first_iteration, 'test_days': test_days[first_iteration:first_iteration + block_size]}
+            for block_id, first_iteration in enumerate(range(0, len(test_days), block_size))]
+
+def block_ens_params(ens_params, block):
+    " Ensemble parameters of a block: its own previous day pickle and its first iteration"
+    save_info = os.path.join(ens_params['save_info'], f"block_{block['block_id']:04d}", '')
+    return dict(ens_params, save_info=save_info, first_iteration=block['first_iteration'])
+
+def run_backtest_block(sim_params, ens_params, block, data=None, resume=False):
+    """ Run the test days of a block one after the other, the state is passed from day to day within the block
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        block: dict, block (see plan_backtest_blocks)
+        data: dict, backtest data (the data of the worker process if None)
+        resume: bool, resume the block from its last checkpoint
+    returns:
+        block_results: list, results of the days of the block"""
+    data = worker_data() if data is None else data
+    ens_params = block_ens_params(ens_params, block)
+    os.makedirs(ens_params['save_info'], exist_ok=True)
+    checkpoint_dir = sim_params.get('checkpoint_dir')
+    if checkpoint_dir:
+        checkpoint_dir = os.path.join(checkpoint_dir, f"block_{block['block_id']:04d}")
+    logger.info(f"Backtest block {block['block_id']}: days {[day for day, _ in block['test_days']]}")
+    return run_test_days(sim_params, ens_params, data, block['test_days'], checkpoint_dir=checkpoint_dir,
+                         checkpoint_every_days=sim_params.get('checkpoint_every_days', 1), resume=resume)
+
+def run_parallel_backtest(sim_params, ens_params, max_workers=None, block_size=None, resume=False):
+    """ Run the test days in a process pool, one block of days per task
+    The dataset is loaded and prepared once, the workers read it from shared memory.
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        max_workers: int, number of worker processes
+        block_size: int, number of days of a block (gbr_update_every_days if None)
+        resume: bool, resume each block from its last checkpoint
+    returns:
+        backtest_results: list, results of the days in day order (see run_backtest_day)"""
+    block_size = ens_params['gbr_update_every_days'] if block_size is None else block_size
+    assert block_size % ens_params['gbr_update_every_days'] == 0, 'block_size must be a multiple of gbr_update_every_days'
+    data = prepare_backtest_data(sim_params)
+    blocks = plan_backtest_blocks(plan_test_days(sim_params, data), block_size)
+    logger.info(f'Running {len(blocks)} backtest blocks of {block_size} days')
+    shared_blocks, spec = share_backtest_data(data)
+    try:
+        # spawned workers do not inherit the joblib worker pools of the parent process
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_worker, initargs=(spec, sim_params.get('panel_dir'))) as executor:
+            block_results = list(executor.map(run_backtest_block, [sim_params] * len(blocks), [ens_params] * len(blocks), blocks,
+                                              [None] * len(blocks), [resume] * len(blocks)))
+    finally:
+        release_arrays(shared_blocks, unlink=True)
+    # the blocks are returned in submission order, the days are merged in day order
+    return sorted((day_results for results in block_results for day_results in results), key=lambda day_results: day_results['day'])
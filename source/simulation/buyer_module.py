@@ -1,12 +1,13 @@
 import pandas as pd
 
-def prepare_buyer_data(df_train, df_test, start_prediction_timestamp, end_prediction_timestamp):
+def prepare_buyer_data(df_train, df_test, start_prediction_timestamp, end_prediction_timestamp, buyer_resource_name='b1r1'):
     """ Prepare data for the buyer module
     Args:
         df_train: DataFrame with training data
         df_test: DataFrame with test data
         start_prediction_timestamp: Start timestamp for the prediction
         end_prediction_timestamp: End timestamp for the prediction
+        buyer_resource_name: Name of the buyer resource column
     Returns:
         df_buyer: DataFrame with the buyer data
         forecast_range: Forecast range for the prediction"""
@@ -20,8 +21,8 @@ def prepare_buyer_data(df_train, df_test, start_prediction_timestamp, end_predic
     df_test_buyer['measured'] = [None for _ in range(len(df_test_buyer))]
     # Concatenate train and test data
     df_buyer = pd.concat([df_train_buyer, df_test_buyer], axis=0)
-    # Rename 'measured' to 'b1r1'
-    df_buyer['b1r1'] = df_buyer['measured']
+    # Rename 'measured' to the buyer resource name
+    df_buyer[buyer_resource_name] = df_buyer['measured']
     # Drop the original 'measured' column
     df_buyer.drop(columns=['measured'], inplace=True)
     return df_buyer, forecast_range
\ No newline at end of file
@@ -0,0 +1,67 @@
+import os
+import glob
+import pickle
+import numpy as np
+from loguru import logger
+from source.utils.session_ml_info import atomic_pickle_dump
+
+CHECKPOINT_FILE = 'checkpoint.pickle'
+DAY_RESULTS_FILE = 'day_{position:05d}.pickle'
+
+def save_day_results(checkpoint_dir, position, day_results):
+    """ Save the results of a completed day in its own file, the files of the previous days are left untouched
+    args:
+        checkpoint_dir: str, directory of the checkpoint
+        position: int, position of the day in the test days of the backtest
+        day_results: dict, results of the day"""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    atomic_pickle_dump(day_results, os.path.join(checkpoint_dir, DAY_RESULTS_FILE.format(position=position)))
+
+def load_day_results(checkpoint_dir, position):
+    " Load the results of a completed day saved by save_day_results"
+    with open(os.path.join(checkpoint_dir, DAY_RESULTS_FILE.format(position=position)), 'rb') as handle:
+        return pickle.load(handle)
+
+def iter_checkpoint_results(checkpoint_dir, completed_days):
+    " Load the results of the completed days of a checkpoint one after the other"
+    for position in range(completed_days):
+        yield load_day_results(checkpoint_dir, position)
+
+def save_checkpoint(checkpoint_dir, test_days, state, completed_days):
+    """ Save the state of a backtest after its last completed day, the results of the days are in their own files
+    args:
+        checkpoint_dir: str, directory of the checkpoint
+        test_days: list, (day, repair_test_day) of the days of the backtest
+        state: dict, results of the last completed day (iteration, hyperparameters and previous day models)
+        completed_days: int, number of completed days (their results are saved with save_day_results)"""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint = {'test_days': test_days,
+                    'completed_days': completed_days,
+                    'state': state,
+                    'random_state': np.random.get_state()}
+    atomic_pickle_dump(checkpoint, os.path.join(checkpoint_dir, CHECKPOINT_FILE))
+    logger.debug(f'Checkpoint saved after {completed_days} of {len(test_days)} test days')
+
+def load_checkpoint(checkpoint_dir):
+    " Load the checkpoint of a backtest (None if there is none)"
+    filename = os.path.join(checkpoint_dir, CHECKPOINT_FILE)
+    if not os.path.isfile(filename):
+        return None
+    with open(filename, 'rb') as handle:
+        return pickle.load(handle)
+
+def restore_checkpoint(checkpoint, session_state):
+    " Restore the state of the last completed day and the random state of a checkpoint"
+    if checkpoint['state'] is None:
+        session_state.reset()
+    else:
+        session_state.update(checkpoint['state'])
+    np.random.set_state(checkpoint['random_state'])
+
+def delete_checkpoint(checkpoint_dir):
+    " Delete the checkpoint of a backtest and the results of its days"
+    for filename in [os.path.join(checkpoint_dir, CHECKPOINT_FILE)] + glob.glob(os.path.join(checkpoint_dir, DAY_RESULTS_FILE.replace('{position:05d}', '*'))):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
@@ -1,7 +1,5 @@
 from collections import defaultdict
 import pandas as pd 
-import matplotlib.pyplot as plt
-import seaborn as sns
 
 def process_combination_scheme(df_train, df_test, end_training_timestamp, start_prediction_timestamp):
     " Process data for the combination scheme"
@@ -50,6 +48,9 @@ def normalize_coefficients(df_coefs):
 
 def plot_top_contributions(df_coefs, quantile, top_n=10, figsize=(10, 5)):
     """Plot the top N contributions of the predictors."""
+    # plotting libraries are imported on use, they are slow to import
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     df_top_contributions = df_coefs.head(top_n)
     plt.figure(figsize=figsize)
     sns.barplot(y='coef', x='predictor', data=df_top_contributions, palette='magma')
@@ -0,0 +1,182 @@
+import json
+import asyncio
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from source.ml_engine import create_ensemble_forecasts
+from source.utils.market_data import MarketData, MARKET_QUANTILES
+from source.simulation.submission_ingest import ingest_submissions, epoch_utc
+
+def extend_market(history, market):
+    """ Market of a session: the predictions of the sellers in the history followed by their submission for the session
+    The sellers of the history without submission are left out, the submissions of unknown sellers are ignored.
+    args:
+        history: MarketData, predictions of the registered sellers in the training window
+        market: MarketData, submissions of the session on its time grid
+    returns:
+        market: MarketData, predictions of the sellers in the training window and the forecast range"""
+    assert history.quantiles == market.quantiles and history.buyer_resource_name == market.buyer_resource_name, 'The markets must have the same quantiles and buyer resource'
+    assert history.index[-1] < market.index[0], 'The forecast range must follow the history'
+    sellers = [seller for seller in history.sellers if seller in market.registry]
+    if len(sellers) < len(history.sellers):
+        logger.warning(f'{len(history.sellers) - len(sellers)} registered sellers without submission left out of the session')
+    values = np.concatenate([history.values[:, [history.registry[seller] for seller in sellers]],
+                             market.values[:, [market.registry[seller] for seller in sellers]]], axis=0)
+    session = MarketData(history.index.append(market.index), history.buyer_resource_name, history.quantiles)
+    return session.add_sellers(sellers, values)
+
+def ensemble_engine(ens_params, session_state=None):
+    """ Engine of the live sessions, the ensemble forecasts of the market committed at gate closure
+    The buyer data, the end of training and the forecast range are the context of each session (see SubmissionIntake.open_session).
+    args:
+        ens_params: dict, ensemble parameters
+        session_state: SessionState, in-process state handed from one session to the next (the engines run one after the other)
+    returns:
+        engine: callable, engine(market, validity, context) -> results of create_ensemble_forecasts with the coverage of the submissions
+            input_coverage: pd.Series, fraction of the sellers of the market with a valid submission at each slot of the session,
+                the other slots are imputed with the statistics of the training window"""
+    def engine(market, validity, context):
+        results = create_ensemble_forecasts(ens_params=ens_params, df_buyer=context['df_buyer'], df_market=market,
+                                            end_training_timestamp=context['end_training_timestamp'], forecast_range=context['forecast_range'],
+                                            challenge_usecase='simulation', simulation=True, session_state=session_state)
+        results['input_coverage'] = pd.Series(validity.mean(axis=0), index=market.index[-validity.shape[1]:], name='input_coverage')
+        return results
+    return engine
+
+class SubmissionIntake:
+    """ Asyncio intake of the seller submissions of live market sessions
+    Sellers send newline delimited JSON messages {"seller": ..., "rows": [{"datetime": ..., "q50": ..., "q10": ..., "q90": ...}]}
+    on a local Unix socket and get a JSON reply per message, the timestamps carry their UTC offset. The submissions are checked when they arrive and buffered,
+    a later row of a seller replaces an earlier one for the same timestamp. At gate closure the buffer is swapped out in
+    one step of the event loop, aligned in bulk (see ingest_submissions) in the ingest executor and committed to the market store,
+    then the engine runs in the engine executor: the intake keeps serving while the models train, and the next session can open
+    and be committed right away while the engine of the previous one is still running."""
+    def __init__(self, engine, capacity, quantiles=MARKET_QUANTILES, min_coverage=1.0, ingest_executor=None, engine_executor=None):
+        """ args:
+            engine: callable, engine(market, validity, context) -> results, run on the market of each session, the validity of its slots
+                and the context given to open_session (see ensemble_engine)
+            capacity: float or dict, maximum value of the forecasts (of each seller if dict)
+            quantiles: tuple, quantiles of the submissions
+            min_coverage: float, minimum fraction of valid slots of a seller in the market
+            ingest_executor: concurrent.futures.Executor, aligns the submissions at gate closure (a single thread if None)
+            engine_executor: concurrent.futures.Executor, runs the engine (a single thread if None, the engines of the sessions run one after the other)"""
+        self.engine = engine
+        self.capacity = capacity
+        self.quantiles = tuple(quantiles)
+        self.min_coverage = min_coverage
+        self.ingest_executor = ingest_executor if ingest_executor is not None else ThreadPoolExecutor(max_workers=1)
+        self.engine_executor = engine_executor if engine_executor is not None else ThreadPoolExecutor(max_workers=1)
+        self.market_store = {}
+        self.session = None
+        self._buffer = {}
+
+    def open_session(self, history, index, context=None):
+        """ Open the gate of a session
+        args:
+            history: MarketData, predictions of the registered sellers in the training window
+            index: pd.DatetimeIndex, time grid of the submissions (e.g. the index of the test window)
+            context: dict, context of the session handed to the engine, e.g. df_buyer, end_training_timestamp and forecast_range for ensemble_engine"""
+        assert self.session is None, 'The gate of the previous session is still open'
+        self.session = {'history': history, 'index': index, 'epoch': pd.DatetimeIndex(index).tz_convert('UTC').asi8, 'context': context}
+        self._buffer = {}
+        logger.info(f'Gate open for {index[0]} with {len(history.sellers)} registered sellers')
+
+    def submit(self, message):
+        """ Check a submission and add it to the buffer of the open session
+        args:
+            message: dict, submission {"seller": str, "rows": list of {"datetime": str, quantile: float}}
+        returns:
+            reply: dict, {"status": "accepted", "rows": rows on the time grid} or {"status": "rejected", "reason": str}"""
+        if self.session is None:
+            return {'status': 'rejected', 'reason': 'gate closed'}
+        seller, rows = message.get('seller'), message.get('rows')
+        if seller not in self.session['history'].registry:
+            return {'status': 'rejected', 'reason': f'unknown seller {seller}'}
+        if not isinstance(rows, list) or not rows:
+            return {'status': 'rejected', 'reason': 'no rows'}
+        try:
+            epoch = epoch_utc([row['datetime'] for row in rows])
+            values = np.array([[row[quantile] for quantile in self.quantiles] for row in rows], dtype=np.float64)
+        except (KeyError, TypeError, ValueError) as e:
+            return {'status': 'rejected', 'reason': f'malformed rows: {e!r}'}
+        self._buffer.setdefault(seller, []).append((epoch, values))
+        return {'status': 'accepted', 'rows': int(np.isin(epoch, self.session['epoch']).sum())}
+
+    async def _handle_connection(self, reader, writer):
+        " Reply to the messages of a connection until the seller closes it"
+        try:
+            while line := await reader.readline():
+                try:
+                    reply = self.submit(json.loads(line))
+                except (json.JSONDecodeError, AttributeError) as e:
+                    reply = {'status': 'rejected', 'reason': f'malformed message: {e!r}'}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionResetError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, path):
+        """ Listen to the sellers on a Unix socket
+        args:
+            path: str, path of the socket
+        returns:
+            server: asyncio.Server, server of the intake (to be closed by the caller)"""
+        server = await asyncio.start_unix_server(self._handle_connection, path=path)
+        logger.info(f'Submission intake listening on {path}')
+        return server
+
+    def _submissions_frame(self, buffer):
+        " Dataframe of the buffered submissions in the order of arrival (see ingest_submissions)"
+        sellers, epochs, values = [], [], []
+        for seller, chunks in buffer.items():
+            for epoch, chunk_values in chunks:
+                sellers.append(np.full(len(epoch), seller, dtype=object))
+                epochs.append(epoch)
+                values.append(chunk_values)
+        if not sellers:
+            return pd.DataFrame(columns=['seller', 'datetime', *self.quantiles])
+        df_submissions = pd.DataFrame(np.concatenate(values), columns=list(self.quantiles))
+        df_submissions.insert(0, 'datetime', pd.to_datetime(np.concatenate(epochs), utc=True))
+        df_submissions.insert(0, 'seller', np.concatenate(sellers))
+        return df_submissions
+
+    def _commit(self, session, buffer):
+        " Align the submissions of a session on its forecast range and build its market"
+        history, index = session['history'], session['index']
+        ingest = ingest_submissions(self._submissions_frame(buffer), index, self.capacity, self.quantiles, self.min_coverage, history.buyer_resource_name)
+        ingest['market'] = extend_market(history, ingest['market'])
+        return ingest
+
+    async def close_gate(self):
+        """ Close the gate of the open session, commit its submissions to the market store and start the engine
+        returns:
+            task: asyncio.Task, results of the engine on the market of the session"""
+        assert self.session is not None, 'No open session'
+        # swap out the buffer and close the gate without yielding to the event loop: no submission is half committed
+        session, buffer = self.session, self._buffer
+        self.session, self._buffer = None, {}
+        loop = asyncio.get_running_loop()
+        ingest = await loop.run_in_executor(self.ingest_executor, self._commit, session, buffer)
+        self.market_store[session['index'][0]] = ingest
+        logger.info(f"Gate closed for {session['index'][0]}: {len(ingest['market'].sellers)} sellers in the market")
+        return asyncio.ensure_future(loop.run_in_executor(self.engine_executor, self.engine, ingest['market'], ingest['validity'], session['context']))
+
+async def send_submission(path, seller, rows):
+    """ Send a submission to the intake of a live session
+    args:
+        path: str, path of the socket of the intake
+        seller: str, name of the seller
+        rows: list, rows {"datetime": str, quantile: float} of the submission
+    returns:
+        reply: dict, reply of the intake"""
+    reader, writer = await asyncio.open_unix_connection(path)
+    try:
+        writer.write(json.dumps({'seller': seller, 'rows': rows}).encode() + b'\n')
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
+        await writer.wait_closed()
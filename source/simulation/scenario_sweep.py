@@ -0,0 +1,121 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from loguru import logger
+from source.ml_engine import prepare_market_features, merge_market_features, day_scaler_statistics, MARKET_FEATURE_PARAMS
+from source.utils.session_ml_info import previous_day_pickle_file, SessionState
+from source.simulation.submission_module import submission_base_forecasters, submission_market, submission_rng
+from source.simulation.buyer_module import prepare_buyer_data
+from source.simulation.backtest import prepare_backtest_data, plan_test_days, load_backtest_day, run_ensemble_day
+
+# simulation parameters that a scenario can change, the other ones define the data shared by the scenarios
+SCENARIO_KEYS = ('most_recent', 'malicious', 'malicious_name', 'noisy', 'noisy_name', 'noise_degree')
+
+def scenario_params(sim_params, ens_params, scenario):
+    """ Simulation and ensemble parameters of a scenario, each scenario has its own previous day state
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        scenario: dict, scenario with a name and the overrides of 'sim_params' (keys of SCENARIO_KEYS) and 'ens_params'
+    returns:
+        sim_params: dict, simulation parameters of the scenario
+        ens_params: dict, ensemble parameters of the scenario"""
+    sim_overrides = scenario.get('sim_params', {})
+    assert set(sim_overrides) <= set(SCENARIO_KEYS), f'A scenario can only change the simulation parameters {SCENARIO_KEYS}'
+    sim_params = dict(sim_params, **sim_overrides)
+    ens_params = dict(ens_params, **scenario.get('ens_params', {}))
+    ens_params['save_info'] = os.path.join(ens_params['save_info'], scenario['name'], '')
+    return sim_params, ens_params
+
+def scenario_market_features(ens_params, day, df_buyer, forecast_range, base_submission, market, base_features, previous_day_results=None):
+    """ Forecasters features of the market of a scenario, the features of the base forecasters are computed once per day
+    args:
+        ens_params: dict, ensemble parameters of the scenario
+        day: dict, test day (see load_backtest_day)
+        df_buyer: pd.DataFrame, buyer data
+        forecast_range: pd.DatetimeIndex, forecast range
+        base_submission: MarketData, submission of the base forecasters, the first sellers of the market
+        market: MarketData, market of the scenario
+        base_features: dict, features of the base forecasters of the day by feature parameters and scaling, filled on the first call
+        previous_day_results: dict, results of the previous day of the scenario (see day_scaler_statistics)
+    returns:
+        market_features: dict, forecasters features of the market (see prepare_market_features)"""
+    assert market.sellers[:len(base_submission.sellers)] == base_submission.sellers, 'The base forecasters must be the first sellers of the market'
+    scaler_stats = day_scaler_statistics(ens_params, df_buyer, market, day['end_training'], previous_day_results)
+    forecasters_stats = scaler_stats['forecasters']
+    # the scaling of the base forecasters is the same for the scenarios at the same hyperparameter refresh
+    base_stats = forecasters_stats[[col for col in base_submission.columns if col in forecasters_stats.columns]].to_json() if forecasters_stats is not None else None
+    key = json.dumps([ens_params.get(name) for name in MARKET_FEATURE_PARAMS] + [scaler_stats['buyer'], base_stats], default=float)
+    if key not in base_features:
+        base_features[key] = prepare_market_features(ens_params, base_submission, scaler_stats['buyer'], day['end_training'], forecast_range[0], forecasters_stats)
+    if len(market.sellers) == len(base_submission.sellers):
+        return base_features[key]
+    seller_market = market.copy().remove_sellers(base_submission.sellers)
+    seller_features = prepare_market_features(ens_params, seller_market, scaler_stats['buyer'], day['end_training'], forecast_range[0], forecasters_stats)
+    return merge_market_features(ens_params, base_features[key], seller_features)
+
+def scenario_predictions(sweep_results, stage='wind_power'):
+    """ Predictions of the scenarios side by side
+    args:
+        sweep_results: dict, results of the test days of each scenario (see run_scenario_sweep)
+        stage: str, 'wind_power' or 'wind_power_variability'
+    returns:
+        df_predictions: pd.DataFrame, predictions indexed by datetime with the scenario as first column level"""
+    return pd.concat({name: pd.concat([day_results[stage] for day_results in results]) for name, results in sweep_results.items() if results}, axis=1)
+
+def run_scenario_sweep(sim_params, ens_params, scenarios, data=None, output_file=None):
+    """ Run several scenarios over the same test days, the work common to the scenarios is done once per day
+    The data of the day, the submission of the base forecasters, their features and the buyer data are shared,
+    only the scenario forecasters, their features, the models and the contributions are computed per scenario.
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        scenarios: list, scenarios (see scenario_params)
+        data: dict, backtest data (loaded if None)
+        output_file: str, csv file of the wind power predictions of the scenarios side by side (not written if None)
+    returns:
+        sweep_results: dict, results of the test days of each scenario (see run_backtest_day)"""
+    names = [scenario['name'] for scenario in scenarios]
+    assert len(set(names)) == len(names), 'The scenario names must be unique'
+    params = {scenario['name']: scenario_params(sim_params, ens_params, scenario) for scenario in scenarios}
+    data = prepare_backtest_data(sim_params) if data is None else data
+    test_days = plan_test_days(sim_params, data)
+
+    # state handed in memory from day to day for each scenario
+    session_states = {}
+    for name, (scenario_sim_params, scenario_ens_params) in params.items():
+        os.makedirs(scenario_ens_params['save_info'], exist_ok=True)
+        session_states[name] = SessionState(previous_day_pickle_file(scenario_ens_params, sim_params['buyer_resource_name']),
+                                            persist=sim_params.get('persist_state', False))
+        session_states[name].reset()
+
+    np.random.seed(sim_params['random_seed'])
+    sweep_results = {name: [] for name in names}
+    try:
+        for i, repair_test_day in tqdm(test_days, desc='Testing Days'):
+            day = load_backtest_day(sim_params, data, i, repair_test_day)
+
+            # Shared by the scenarios: submission of the base forecasters, their features and buyer data
+            base_submission = submission_base_forecasters(day['df_train'], day['df_test'])
+            df_buyer, forecast_range = prepare_buyer_data(day['df_train'], day['df_test'], day['start_prediction'], day['end_prediction'], sim_params['buyer_resource_name'])
+            base_features = {}
+
+            for name, (scenario_sim_params, scenario_ens_params) in params.items():
+                logger.info(f'Scenario {name}')
+                # the scenarios draw the same samples, their generated forecasters differ only by their attack models
+                market, _, df_test = submission_market(scenario_sim_params, day['df_train'], day['df_test'], base_submission=base_submission,
+                                                       rng=submission_rng(sim_params, i))
+                market_features = scenario_market_features(scenario_ens_params, day, df_buyer, forecast_range, base_submission, market, base_features,
+                                                           previous_day_results=session_states[name].results)
+                sweep_results[name].append(run_ensemble_day(scenario_sim_params, scenario_ens_params, day, market, df_test, df_buyer, forecast_range,
+                                                            session_state=session_states[name], market_features=market_features))
+    finally:
+        for session_state in session_states.values():
+            session_state.close()
+
+    if output_file is not None and test_days:
+        scenario_predictions(sweep_results).to_csv(output_file)
+        logger.info(f'Scenario predictions saved to {output_file}')
+    return sweep_results
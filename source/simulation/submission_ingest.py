@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from loguru import logger
+from source.utils.market_data import MarketData, MARKET_QUANTILES
+
+# UTC offset at the end of an ISO 8601 timestamp
+UTC_OFFSET_PATTERN = r'(?:Z|[+-]\d{2}:?\d{2})$'
+
+def epoch_utc(timestamps):
+    """ Nanoseconds since the epoch of timezone aware timestamps, naive timestamps are rejected (their timezone is unknown)
+    The timestamps may have different UTC offsets (e.g. a local time across a daylight saving change), they are converted to UTC.
+    args:
+        timestamps: array-like, timestamps or ISO 8601 strings with their UTC offset
+    returns:
+        epoch: np.array, int64 nanoseconds since the epoch in UTC"""
+    timestamps = pd.Series(timestamps)
+    if pd.api.types.is_datetime64_any_dtype(timestamps):
+        naive = np.full(len(timestamps), timestamps.dt.tz is None)
+    elif pd.api.types.infer_dtype(timestamps, skipna=False) == 'string':
+        naive = ~timestamps.str.contains(UTC_OFFSET_PATTERN).values
+    else:
+        naive = np.array([getattr(timestamp, 'tzinfo', None) is None for timestamp in timestamps], dtype=bool)
+    if naive.any():
+        raise ValueError(f'{naive.sum()} of {len(timestamps)} timestamps without timezone, e.g. {timestamps[naive].iloc[0]}')
+    return pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True, format='ISO8601')).asi8
+
+def ingest_submissions(df_submissions, index, capacity, quantiles=MARKET_QUANTILES, min_coverage=1.0, buyer_resource_name='b1r1'):
+    """ Align the submissions of all the sellers on the time grid in bulk, before any model work
+    The timestamps must be timezone aware (see epoch_utc). The rows off the grid or outside the index are dropped, the last of duplicate (seller, timestamp) rows is kept,
+    the values are clipped to [0, capacity] and the non-finite values are missing. A slot of a seller is valid if all
+    its quantiles are present, the sellers covering less than min_coverage of the slots are left out of the market.
+    args:
+        df_submissions: pd.DataFrame, one row per seller and timestamp with the columns seller, datetime and the quantiles
+        index: pd.DatetimeIndex, regular time grid of the market (e.g. the forecast range)
+        capacity: float or dict, maximum value of the forecasts (of each seller if dict)
+        quantiles: tuple, quantile columns of the submissions
+        min_coverage: float, minimum fraction of valid slots of an eligible seller
+        buyer_resource_name: str, buyer resource of the submissions
+    returns:
+        ingest: dict, aligned submissions
+            market: MarketData, predictions of the eligible sellers on the grid (NaN for the invalid slots)
+            validity: np.array, (seller x slot) True for the valid slots of the sellers of the market, the invalid slots are imputed
+                by the engine with the statistics of the training window (see impute_train_window and ensemble_engine)
+            report: pd.DataFrame, one row per seller: rows, off_grid, duplicates, clipped, missing_slots, coverage and eligible"""
+    assert isinstance(index, pd.DatetimeIndex) and len(index) > 1, 'index must be a DatetimeIndex of the grid'
+    assert 0.0 <= min_coverage <= 1.0, 'min_coverage must be in [0, 1]'
+    assert index.tz is not None, 'index must be timezone aware'
+    epoch_index = index.tz_convert('UTC').asi8
+    start, step, n_slots = int(epoch_index[0]), int(epoch_index[1] - epoch_index[0]), len(index)
+    assert step > 0 and np.all(np.diff(epoch_index) == step), 'index must be a regular time grid'
+    assert df_submissions['seller'].notna().all(), 'Every submission must have a seller'
+    codes, sellers = pd.factorize(df_submissions['seller'], sort=False)
+    n_sellers = len(sellers)
+    epoch = epoch_utc(df_submissions['datetime'])
+    # slot of each row by arithmetic on its epoch, the rows off the grid are dropped
+    offsets = epoch - start
+    slots = offsets // step
+    on_grid = (offsets % step == 0) & (slots >= 0) & (slots < n_slots)
+    # the last submission of a (seller, slot) wins
+    keys = np.where(on_grid, codes * n_slots + slots, -1)
+    _, last_reversed = np.unique(keys[::-1], return_index=True)
+    kept = np.zeros(len(keys), dtype=bool)
+    kept[len(keys) - 1 - last_reversed] = True
+    kept &= on_grid
+    duplicates = on_grid & ~kept
+    values = df_submissions[list(quantiles)].to_numpy(dtype=np.float64)[kept]
+    values[~np.isfinite(values)] = np.nan
+    if isinstance(capacity, dict):
+        caps = np.array([capacity[seller] for seller in sellers], dtype=np.float64)[codes[kept]][:, None]
+    else:
+        caps = float(capacity)
+    clipped = (values < 0) | (values > caps)
+    values = np.clip(values, 0.0, caps)
+    # (quantile x seller x slot) array of the market, NaN for the slots without submission
+    aligned = np.full((len(quantiles), n_sellers, n_slots), np.nan)
+    aligned[:, codes[kept], slots[kept]] = values.T
+    validity = ~np.isnan(aligned).any(axis=0)
+    coverage = validity.mean(axis=1)
+    report = pd.DataFrame({'rows': np.bincount(codes, minlength=n_sellers),
+                           'off_grid': np.bincount(codes[~on_grid], minlength=n_sellers),
+                           'duplicates': np.bincount(codes[duplicates], minlength=n_sellers),
+                           'clipped': np.bincount(codes[kept], weights=clipped.sum(axis=1), minlength=n_sellers).astype(np.int64),
+                           'missing_slots': n_slots - validity.sum(axis=1),
+                           'coverage': coverage,
+                           'eligible': coverage >= min_coverage}, index=pd.Index(sellers, name='seller'))
+    if not report['eligible'].all():
+        left_out = list(report.index[~report['eligible']])
+        logger.warning(f"{len(left_out)} of {n_sellers} sellers below {min_coverage:.0%} coverage left out of the market: {left_out[:10]}{' ...' if len(left_out) > 10 else ''}")
+    eligible = report['eligible'].values
+    market = MarketData(index, buyer_resource_name, quantiles)
+    market.add_sellers(list(sellers[eligible]), aligned[:, eligible, :].transpose(2, 1, 0))
+    return {'market': market, 'validity': validity[eligible], 'report': report}
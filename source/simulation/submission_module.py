@@ -1,176 +1,102 @@
+import numpy as np
 import pandas as pd
 from loguru import logger
-from source.forecasters.deterministic import create_day_ahead_predictions, create_day_ahead_11_predictions, create_week_ahead_predictions, create_most_recent_predictions, create_malicious_predictions, create_noisy_predictions
-from source.forecasters.probabilistic import create_day_ahead_quantiles10, create_day_ahead_11_quantiles10, create_week_ahead_quantiles10, create_most_recent_quantiles10, create_malicious_quantiles10, create_noisy_quantiles10
-from source.forecasters.probabilistic import create_day_ahead_quantiles90, create_day_ahead_11_quantiles90, create_week_ahead_quantiles90, create_most_recent_quantiles90, create_malicious_quantiles90, create_noisy_quantiles90
-
-def submission_forecasters(sim_params, df_train, df_test):
-            " Concatenate forecasters predictions for the submission"
-
-            # forecaster - day ahead forecast
-            df_day_ahead_pred_train = create_day_ahead_predictions(df_train)
-            df_day_ahead_pred_test = create_day_ahead_predictions(df_test)
-
-            # forecaster - day ahead 11 forecast
-            df_day_ahead11_pred_train = create_day_ahead_11_predictions(df_train)
-            df_day_ahead11_pred_test = create_day_ahead_11_predictions(df_test)
-
-            # forecaster - week ahead forecast
-            df_week_ahead_pred_train = create_week_ahead_predictions(df_train)
-            df_week_ahead_pred_test = create_week_ahead_predictions(df_test)
-
-            # forecaster - day ahead quantile-10
-            df_day_ahead_q10_train = create_day_ahead_quantiles10(df_train)
-            df_day_ahead_q10_test = create_day_ahead_quantiles10(df_test)
-
-            # forecaster - day ahead 11 quantile-10
-            df_day_ahead11_q10_train = create_day_ahead_11_quantiles10(df_train)
-            df_day_ahead11_q10_test = create_day_ahead_11_quantiles10(df_test)
-
-            # forecaster - week ahead quantile-10
-            df_week_ahead_q10_train = create_week_ahead_quantiles10(df_train)
-            df_week_ahead_q10_test = create_week_ahead_quantiles10(df_test)
-
-            # forecaster - day ahead quantile-90
-            df_day_ahead_q90_train = create_day_ahead_quantiles90(df_train)
-            df_day_ahead_q90_test = create_day_ahead_quantiles90(df_test)
-
-            # forecaster - day ahead 11 quantile-90
-            df_day_ahead11_q90_train = create_day_ahead_11_quantiles90(df_train)
-            df_day_ahead11_q90_test = create_day_ahead_11_quantiles90(df_test)
-
-            # forecaster - week ahead quantile-90
-            df_week_ahead_q90_train = create_week_ahead_quantiles90(df_train)
-            df_week_ahead_q90_test = create_week_ahead_quantiles90(df_test)
-
-            # forecaster - most recent forecast (intra-day market)
-            if sim_params['most_recent']:
-                # mean forecasts
-                df_most_recent_pred_train = create_most_recent_predictions(df_train)
-                df_most_recent_pred_test = create_most_recent_predictions(df_test)
-                # q10 forecasts
-                df_most_recent_q10_train = create_most_recent_quantiles10(df_train)
-                df_most_recent_q10_test = create_most_recent_quantiles10(df_test)
-                # q90 forecasts
-                df_most_recent_q90_train = create_most_recent_quantiles90(df_train)
-                df_most_recent_q90_test = create_most_recent_quantiles90(df_test)
-            
-            # forecaster - malicious forecast
-            if sim_params['malicious']:
-                # mean forecasts
-                df_malicious_pred_train = create_malicious_predictions(df_train, column= sim_params['malicious_name'])
-                df_malicious_pred_test = create_malicious_predictions(df=df_test, column= sim_params['malicious_name'], cheat=True, df_train=df_train)
-                # q10 forecasts
-                df_malicious_q10_train = create_malicious_quantiles10(df_train, column= sim_params['malicious_name'])
-                df_malicious_q10_test = create_malicious_quantiles10(df=df_test, column= sim_params['malicious_name'], cheat=True, df_train=df_train)
-                # q90 forecasts
-                df_malicious_q90_train = create_malicious_quantiles90(df_train, column= sim_params['malicious_name'])
-                df_malicious_q90_test = create_malicious_quantiles90(df=df_test, column= sim_params['malicious_name'], cheat=True, df_train=df_train)
-
-            # forecaster - noisy forecast
-            if sim_params['noisy']:
-                # mean forecasts
-                df_noisy_pred_train = create_noisy_predictions(df_train, column= sim_params['noisy_name'])
-                df_noisy_pred_test = create_noisy_predictions(df_test, column= sim_params['noisy_name'])
-                # q10 forecasts
-                df_noisy_q10_train = create_noisy_quantiles10(df_train, column= sim_params['noisy_name'])
-                df_noisy_q10_test = create_noisy_quantiles10(df_test, column= sim_params['noisy_name'])
-                # q90 forecasts
-                df_noisy_q90_train = create_noisy_quantiles90(df_train, column= sim_params['noisy_name'])
-                df_noisy_q90_test = create_noisy_quantiles90(df_test, column= sim_params['noisy_name'])
-
-        # # ----------------------------> SELLERS DATA <----------------------------
-            # sellers data
-            # q50 forecasts
-            df_train_ensemble_quantile50 = pd.concat([df_day_ahead_pred_train, df_day_ahead11_pred_train, df_week_ahead_pred_train], axis=1)
-            df_test_ensemble_quantile50 = pd.concat([df_day_ahead_pred_test, df_day_ahead11_pred_test, df_week_ahead_pred_test], axis=1)
-            if sim_params['malicious']:
-                df_train_ensemble_quantile50 = pd.concat([df_train_ensemble_quantile50, df_malicious_pred_train], axis=1)
-                df_test_ensemble_quantile50 = pd.concat([df_test_ensemble_quantile50, df_malicious_pred_test], axis=1)
-            if sim_params['most_recent']:
-                df_train_ensemble_quantile50 = pd.concat([df_train_ensemble_quantile50, df_most_recent_pred_train], axis=1)
-                df_test_ensemble_quantile50 = pd.concat([df_test_ensemble_quantile50, df_most_recent_pred_test], axis=1)
-            if sim_params['noisy']:
-                df_train_ensemble_quantile50 = pd.concat([df_train_ensemble_quantile50, df_noisy_pred_train], axis=1)
-                df_test_ensemble_quantile50 = pd.concat([df_test_ensemble_quantile50, df_noisy_pred_test], axis=1)
-            df_ensemble_quantile50 = pd.concat([df_train_ensemble_quantile50, df_test_ensemble_quantile50], axis=0)
-
-            # q10 forecasts
-            df_train_ensemble_quantile10 = pd.concat([df_day_ahead_q10_train, df_day_ahead11_q10_train, df_week_ahead_q10_train], axis=1)
-            df_test_ensemble_quantile10 = pd.concat([df_day_ahead_q10_test, df_day_ahead11_q10_test, df_week_ahead_q10_test], axis=1)
-            if sim_params['malicious']:
-                df_train_ensemble_quantile10 = pd.concat([df_train_ensemble_quantile10, df_malicious_q10_train], axis=1)
-                df_test_ensemble_quantile10 = pd.concat([df_test_ensemble_quantile10, df_malicious_q10_test], axis=1)
-            if sim_params['most_recent']:
-                df_train_ensemble_quantile10 = pd.concat([df_train_ensemble_quantile10, df_most_recent_q10_train], axis=1)
-                df_test_ensemble_quantile10 = pd.concat([df_test_ensemble_quantile10, df_most_recent_q10_test], axis=1)
-            if sim_params['noisy']:
-                df_train_ensemble_quantile10 = pd.concat([df_train_ensemble_quantile10, df_noisy_q10_train], axis=1)
-                df_test_ensemble_quantile10 = pd.concat([df_test_ensemble_quantile10, df_noisy_q10_test], axis=1)
-            df_ensemble_quantile10 = pd.concat([df_train_ensemble_quantile10, df_test_ensemble_quantile10], axis=0)
-
-            # q90 forecasts
-            df_train_ensemble_quantile90 = pd.concat([df_day_ahead_q90_train, df_day_ahead11_q90_train, df_week_ahead_q90_train], axis=1)
-            df_test_ensemble_quantile90 = pd.concat([df_day_ahead_q90_test, df_day_ahead11_q90_test, df_week_ahead_q90_test], axis=1)
-            if sim_params['malicious']:
-                df_train_ensemble_quantile90 = pd.concat([df_train_ensemble_quantile90, df_malicious_q90_train], axis=1)
-                df_test_ensemble_quantile90 = pd.concat([df_test_ensemble_quantile90, df_malicious_q90_test], axis=1)
-            if sim_params['most_recent']:
-                df_train_ensemble_quantile90 = pd.concat([df_train_ensemble_quantile90, df_most_recent_q90_train], axis=1)
-                df_test_ensemble_quantile90 = pd.concat([df_test_ensemble_quantile90, df_most_recent_q90_test], axis=1)
-            if sim_params['noisy']:
-                df_train_ensemble_quantile90 = pd.concat([df_train_ensemble_quantile90, df_noisy_q90_train], axis=1)
-                df_test_ensemble_quantile90 = pd.concat([df_test_ensemble_quantile90, df_noisy_q90_test], axis=1)
-            df_ensemble_quantile90 = pd.concat([df_train_ensemble_quantile90, df_test_ensemble_quantile90], axis=0)
-
-            lst_cols_name_q50 = ['s1_q50_b1r1', 's2_q50_b1r1', 's3_q50_b1r1']
-            lst_cols_name_q10 = ['s1_q10_b1r1', 's2_q10_b1r1', 's3_q10_b1r1']
-            lst_cols_name_q90 = ['s1_q90_b1r1', 's2_q90_b1r1', 's3_q90_b1r1']
-            
-            if sim_params['malicious']:
-                lst_cols_name_q50.append('s5_q50_b1r1')
-                lst_cols_name_q10.append('s5_q10_b1r1')
-                lst_cols_name_q90.append('s5_q90_b1r1')
-
-            if sim_params['most_recent']:
-                lst_cols_name_q50.append('s4_q50_b1r1')
-                lst_cols_name_q10.append('s4_q10_b1r1')
-                lst_cols_name_q90.append('s4_q90_b1r1')
-
-            if sim_params['noisy']:
-                lst_cols_name_q50.append('s6_q50_b1r1')
-                lst_cols_name_q10.append('s6_q10_b1r1')
-                lst_cols_name_q90.append('s6_q90_b1r1')
-
-            df_ensemble_quantile50.columns = lst_cols_name_q50
-            df_ensemble_quantile10.columns = lst_cols_name_q10
-            df_ensemble_quantile90.columns = lst_cols_name_q90
-
-            df_market = pd.concat([df_ensemble_quantile50, df_ensemble_quantile10, df_ensemble_quantile90], axis=1)
-
-            if sim_params['malicious']:
-                # mean forecasts
-                df_train['maliciousforecast'] = df_malicious_pred_train.values
-                df_test['maliciousforecast'] = df_malicious_pred_test.values
-                # q10 forecasts
-                df_train['maliciousconfidence10'] = df_malicious_q10_train.values
-                df_test['maliciousconfidence10'] = df_malicious_q10_test.values
-                # q90 forecasts
-                df_train['maliciousconfidence90'] = df_malicious_q90_train.values
-                df_test['maliciousconfidence90'] = df_malicious_q90_test.values
-
-            if sim_params['noisy']:
-                # mean forecasts
-                df_train['noisyforecast'] = df_noisy_pred_train.values
-                df_test['noisyforecast'] = df_noisy_pred_test.values
-                # q10 forecasts
-                df_train['noisyconfidence10'] = df_noisy_q10_train.values
-                df_test['noisyconfidence10'] = df_noisy_q10_test.values
-                # q90 forecasts
-                df_train['noisyconfidence90'] = df_noisy_q90_train.values
-                df_test['noisyconfidence90'] = df_noisy_q90_test.values
+from source.utils.market_data import MarketData
+from source.forecasters.attacks import MALICIOUS_ATTACK, NOISY_ATTACK, attack_forecasts
+
+# column suffix of the forecasters in the dataset by quantile of the submission
+SUBMISSION_QUANTILES = {'q50': 'forecast', 'q10': 'confidence10', 'q90': 'confidence90'}
+# ELIA forecasters present in every scenario by seller: day ahead, day ahead 11 and week ahead
+BASE_SELLERS = {'s1': 'dayahead', 's2': 'dayahead11h', 's3': 'weekahead'}
+
+def create_seller_market(df_train, df_test, sellers, buyer_resource_name='b1r1'):
+            """ Market of the sellers submitting the forecasts of the dataset, the columns of the forecasters are read in one go
+            args:
+                df_train: pd.DataFrame, train data indexed by datetime
+                df_test: pd.DataFrame, test data indexed by datetime
+                sellers: dict, seller name: column prefix of its forecaster (e.g. {'s1': 'dayahead'})
+                buyer_resource_name: str, buyer resource of the submission
+            returns:
+                market: MarketData, train and test predictions of the sellers"""
+            columns = [f'{prefix}{suffix}' for prefix in sellers.values() for suffix in SUBMISSION_QUANTILES.values()]
+            values = np.concatenate([df_train[columns].values, df_test[columns].values], axis=0)
+            market = MarketData(df_train.index.append(df_test.index), buyer_resource_name, tuple(SUBMISSION_QUANTILES))
+            return market.add_sellers(sellers, values.reshape(len(values), len(sellers), len(SUBMISSION_QUANTILES)))
+
+def submission_base_forecasters(df_train, df_test):
+            """ Submission of the ELIA forecasters present in every scenario (day ahead, day ahead 11 and week ahead)
+            It depends only on the data of the day and can be shared by the scenarios of a sweep.
+            returns:
+                base_submission: MarketData, train and test predictions of the sellers s1, s2 and s3"""
+            return create_seller_market(df_train, df_test, BASE_SELLERS)
+
+def submission_rng(sim_params, day):
+            " Random generator of the generated forecasters of a test day, it does not depend on the order in which the days are run"
+            return np.random.default_rng([sim_params['random_seed'], day])
+
+def attack_model(sim_params, forecaster):
+            """ Attack model of the malicious or noisy forecaster: the default model updated by sim_params[f'{forecaster}_attack']
+            The noise of the default malicious model is sim_params['noise_degree'], see attack_forecasts for the keys."""
+            default = dict(MALICIOUS_ATTACK, noise_degree=sim_params.get('noise_degree', MALICIOUS_ATTACK['noise_degree'])) if forecaster == 'malicious' else NOISY_ATTACK
+            return dict(default, **(sim_params.get(f'{forecaster}_attack') or {}))
+
+def submission_market(sim_params, df_train, df_test, base_submission=None, rng=None):
+            """ Market of the forecasters predictions for the submission
+            The submission of the base forecasters can be passed to share it between scenarios (see submission_base_forecasters).
+            The malicious and noisy forecasters are drawn from rng (see submission_rng), seeded by sim_params['random_seed'] if None.
+            returns:
+                market: MarketData, predictions of the sellers
+                df_train: pd.DataFrame, train data with the forecasts of the malicious and noisy forecasters
+                df_test: pd.DataFrame, test data with the forecasts of the malicious and noisy forecasters"""
+
+            # forecasters - day ahead, day ahead 11 and week ahead
+            if base_submission is None:
+                base_submission = submission_base_forecasters(df_train, df_test)
+            market = base_submission.copy()
+
+            # forecasters - malicious (s5), most recent forecast of the intra-day market (s4), noisy (s6) and additional sellers
+            if (sim_params['malicious'] or sim_params['noisy']) and rng is None:
+                rng = np.random.default_rng(sim_params.get('random_seed'))
+            sellers, blocks, generated_values = [], [], {}
+            for name, seller in (('malicious', 's5'), ('most_recent', 's4'), ('noisy', 's6')):
+                if not sim_params[name]:
+                    continue
+                if name == 'most_recent':
+                    columns = [f'mostrecent{suffix}' for suffix in SUBMISSION_QUANTILES.values()]
+                    train_values, test_values = df_train[columns].values, df_test[columns].values
+                else:
+                    # q50, q10 and q90 forecasts of the window drawn at once
+                    columns = [f"{sim_params[f'{name}_name']}{suffix}" for suffix in SUBMISSION_QUANTILES.values()]
+                    train_values, test_values = generated_values[name] = attack_forecasts(df_train, df_test, columns, rng, **attack_model(sim_params, name))
+                sellers.append(seller)
+                blocks.append(np.concatenate([train_values, test_values], axis=0)[:, None, :])
+            if sim_params.get('additional_sellers'):
+                # sellers submitting other forecasts of the dataset, e.g. the sellers of a synthetic dataset
+                additional_market = create_seller_market(df_train, df_test, sim_params['additional_sellers'])
+                sellers.extend(additional_market.sellers)
+                blocks.append(additional_market.values)
+            if sellers:
+                market.add_sellers(sellers, np.concatenate(blocks, axis=1))
+
+            if generated_values:
+                # train and test data can be views of the processed dataset
+                df_train, df_test = df_train.copy(), df_test.copy()
+            # forecasts of the malicious and noisy forecasters in the data of the buyer
+            for name, (train_values, test_values) in generated_values.items():
+                columns = [f'{name}{suffix}' for suffix in SUBMISSION_QUANTILES.values()]
+                df_train[columns] = train_values
+                df_test[columns] = test_values
 
             logger.info(' ')
             logger.opt(colors = True).info('<blue> -----------------> Forecasters prediction submitted </blue>')
 
-            return df_market, df_train, df_test
\ No newline at end of file
+            return market, df_train, df_test
+
+def submission_forecasters(sim_params, df_train, df_test, base_submission=None, rng=None):
+            """ Concatenate forecasters predictions for the submission, the market dataframe of submission_market
+            returns:
+                df_market: pd.DataFrame, predictions of the sellers with columns '{seller}_{quantile}_b1r1', quantile by quantile
+                df_train: pd.DataFrame, train data with the forecasts of the malicious and noisy forecasters
+                df_test: pd.DataFrame, test data with the forecasts of the malicious and noisy forecasters"""
+            market, df_train, df_test = submission_market(sim_params, df_train, df_test, base_submission=base_submission, rng=rng)
+            return market.to_dataframe(), df_train, df_test
\ No newline at end of file
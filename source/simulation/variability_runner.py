@@ -0,0 +1,113 @@
+import os
+import time
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sklearn.metrics import mean_pinball_loss
+from source.ensemble.utils.metrics import rmse
+from source.utils.shared_arrays import release_arrays
+from source.utils.shared_backtest_data import share_backtest_data, init_worker, worker_data
+from source.simulation.backtest import prepare_backtest_data, plan_test_days, run_test_days, build_base_submissions
+
+# simulation parameters used to load and prepare the dataset, they cannot change from one run to another
+SHARED_DATA_KEYS = ('csv_filename', 'list_columns', 'starting_period', 'ending_period', 'cache_dir', 'new_days_dir', 'panel_dir',
+                    'measured_col', 'replace_nan', 'imputation_nan', 'imputation_window', 'ineligible_days')
+# quantile of the prediction columns of the results
+QUANTILE_PREFIXES = {'q10': 0.1, 'q50': 0.5, 'q90': 0.9}
+
+def plan_variability_runs(seeds, configs=None):
+    """ Runs of a variability study: every configuration with every seed
+    args:
+        seeds: list, random seeds
+        configs: list, configurations as dict with a name and the overrides of 'sim_params' and 'ens_params' (a single default configuration if None)
+    returns:
+        runs: list, runs with their id, configuration name, seed and parameter overrides"""
+    configs = configs if configs is not None else [{'name': 'default'}]
+    runs = []
+    for run_id, (config, seed) in enumerate(itertools.product(configs, seeds)):
+        sim_overrides = config.get('sim_params', {})
+        assert not set(sim_overrides) & set(SHARED_DATA_KEYS), f'The data parameters {SHARED_DATA_KEYS} are shared by all the runs'
+        runs.append({'run_id': run_id, 'config': config['name'], 'seed': int(seed),
+                     'sim_params': sim_overrides, 'ens_params': config.get('ens_params', {})})
+    return runs
+
+def backtest_metrics(backtest_results, measured):
+    """ Scores of the wind power predictions of a backtest over all its test days
+    The targets of the simulation results are unknown at prediction time, the predictions are scored against the measurements.
+    args:
+        backtest_results: list, results of the test days (see run_backtest_day)
+        measured: pd.Series, measured wind power indexed by datetime
+    returns:
+        metrics: dict, pinball losses of the quantiles 10 and 90, RMSE of the quantile 50, coverage of the 10-90 interval and number of ramp alarms"""
+    df = pd.concat([day_results['wind_power'] for day_results in backtest_results])
+    df = df.assign(targets=measured.reindex(df.index).values).dropna(subset=['targets'])
+    columns = {prefix: next((col for col in df.columns if col.startswith(prefix)), None) for prefix in QUANTILE_PREFIXES}
+    metrics = {}
+    if len(df):
+        for prefix in ['q10', 'q90']:
+            if columns[prefix] is not None:
+                metrics[f'pinball_{prefix}'] = mean_pinball_loss(df['targets'], df[columns[prefix]], alpha=QUANTILE_PREFIXES[prefix])
+        if columns['q50'] is not None:
+            metrics['rmse_q50'] = rmse(df[columns['q50']].values, df['targets'].values)
+        if columns['q10'] is not None and columns['q90'] is not None:
+            metrics['coverage'] = ((df['targets'] >= df[columns['q10']]) & (df['targets'] <= df[columns['q90']])).mean()
+    metrics['ramp_alarms'] = int(sum(day_results['alarm_status'] for day_results in backtest_results))
+    return metrics
+
+def run_variability(sim_params, ens_params, run, data=None):
+    """ Run one backtest of a variability study
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        run: dict, run (see plan_variability_runs)
+        data: dict, backtest data (the shared data of the worker process if None)
+    returns:
+        run_metrics: dict, run id, configuration, seed, number of days, scores and elapsed time"""
+    data = worker_data() if data is None else data
+    sim_params = dict(sim_params, random_seed=run['seed'], checkpoint_dir=None, **run['sim_params'])
+    ens_params = dict(ens_params, **run['ens_params'])
+    ens_params['save_info'] = os.path.join(ens_params['save_info'], f"run_{run['run_id']:04d}", '')
+    os.makedirs(ens_params['save_info'], exist_ok=True)
+    logger.info(f"Variability run {run['run_id']}: configuration {run['config']}, seed {run['seed']}")
+    start = time.time()
+    np.random.seed(run['seed'])
+    backtest_results = run_test_days(sim_params, ens_params, data, plan_test_days(sim_params, data))
+    run_metrics = {'run_id': run['run_id'], 'config': run['config'], 'seed': run['seed'], 'n_days': len(backtest_results)}
+    if backtest_results:
+        run_metrics.update(backtest_metrics(backtest_results, data['df_processed'][sim_params['measured_col']]))
+    run_metrics['elapsed'] = time.time() - start
+    return run_metrics
+
+def run_variability_study(sim_params, ens_params, seeds, configs=None, max_workers=None, output_file=None):
+    """ Repeat the backtest for several seeds and configurations, the dataset is loaded and prepared once
+    The workers read the prepared dataset and the submission of the base forecasters of each day from shared memory.
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        seeds: list, random seeds
+        configs: list, configurations (see plan_variability_runs)
+        max_workers: int, number of worker processes
+        output_file: str, csv file of the combined metrics table (not written if None)
+    returns:
+        df_metrics: pd.DataFrame, metrics of each run"""
+    runs = plan_variability_runs(seeds, configs)
+    data = prepare_backtest_data(sim_params)
+    # the submission of the base forecasters does not depend on the seed, it is built once per day for all the runs
+    data['base_submissions'] = build_base_submissions(sim_params, data, plan_test_days(sim_params, data))
+    blocks, spec = share_backtest_data(data)
+    logger.info(f'Running {len(runs)} variability runs')
+    try:
+        # spawned workers do not inherit the joblib worker pools of the parent process
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_worker, initargs=(spec, sim_params.get('panel_dir'))) as executor:
+            run_metrics = list(executor.map(run_variability, [sim_params] * len(runs), [ens_params] * len(runs), runs))
+    finally:
+        release_arrays(blocks, unlink=True)
+    df_metrics = pd.DataFrame(run_metrics).set_index('run_id')
+    if output_file is not None:
+        df_metrics.to_csv(output_file)
+        logger.info(f'Variability metrics saved to {output_file}')
+    return df_metrics
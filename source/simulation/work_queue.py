@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import socket
+import pickle
+import sqlite3
+import argparse
+import threading
+from loguru import logger
+from source.utils.session_ml_info import atomic_pickle_dump
+from source.simulation.backtest import prepare_backtest_data, plan_test_days
+from source.simulation.backtest_runner import plan_backtest_blocks, run_backtest_block
+from source.simulation.variability_runner import SHARED_DATA_KEYS
+
+RESULTS_DIR = 'results'
+TASK_STATUSES = ('pending', 'leased', 'done', 'failed')
+
+def _connect(db_path):
+    " Connection to the queue database in autocommit mode, the transactions are opened explicitly"
+    return sqlite3.connect(db_path, timeout=60, isolation_level=None)
+
+def create_work_queue(db_path):
+    """ Create the queue database of (configuration, day block) tasks
+    The database lives in a directory shared by the hosts (SQLite locking must be reliable on the shared file system).
+    args:
+        db_path: str, path of the SQLite database"""
+    os.makedirs(os.path.join(os.path.dirname(os.path.abspath(db_path)), RESULTS_DIR), exist_ok=True)
+    with _connect(db_path) as connection:
+        connection.execute('''CREATE TABLE IF NOT EXISTS tasks (
+                                task_id TEXT PRIMARY KEY,
+                                payload TEXT NOT NULL,
+                                status TEXT NOT NULL DEFAULT 'pending',
+                                worker TEXT,
+                                lease_expires REAL,
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                result_file TEXT,
+                                error TEXT,
+                                updated REAL)''')
+    connection.close()
+
+def enqueue_tasks(db_path, tasks):
+    """ Add tasks to the queue, a task already in the queue is left untouched
+    args:
+        db_path: str, path of the SQLite database
+        tasks: list, tasks as dict with a unique task_id and a json serializable payload
+    returns:
+        n_added: int, number of new tasks"""
+    connection = _connect(db_path)
+    try:
+        connection.execute('BEGIN IMMEDIATE')
+        n_added = 0
+        for task in tasks:
+            cursor = connection.execute('INSERT OR IGNORE INTO tasks (task_id, payload, updated) VALUES (?, ?, ?)',
+                                        (task['task_id'], json.dumps(task['payload']), time.time()))
+            n_added += cursor.rowcount
+        connection.execute('COMMIT')
+    finally:
+        connection.close()
+    return n_added
+
+def lease_task(db_path, worker_id, lease_seconds=600, max_attempts=3):
+    """ Lease the next pending task, or a leased task whose lease has expired (its worker is presumed dead)
+    args:
+        db_path: str, path of the SQLite database
+        worker_id: str, id of the worker
+        lease_seconds: float, duration of the lease, renewed by heartbeat
+        max_attempts: int, number of leases of a task before it is marked as failed
+    returns:
+        task: dict, leased task with its task_id, payload and attempts (None if there is no task to run)"""
+    connection = _connect(db_path)
+    try:
+        connection.execute('BEGIN IMMEDIATE')
+        now = time.time()
+        connection.execute("UPDATE tasks SET status = 'failed', updated = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                           (now, now, max_attempts))
+        row = connection.execute("SELECT task_id, payload, attempts FROM tasks WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                                 "ORDER BY task_id LIMIT 1", (now,)).fetchone()
+        if row is None:
+            connection.execute('COMMIT')
+            return None
+        task_id, payload, attempts = row
+        connection.execute("UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, attempts = ?, updated = ? WHERE task_id = ?",
+                           (worker_id, now + lease_seconds, attempts + 1, now, task_id))
+        connection.execute('COMMIT')
+    finally:
+        connection.close()
+    return {'task_id': task_id, 'payload': json.loads(payload), 'attempts': attempts + 1}
+
+def heartbeat(db_path, task_id, worker_id, lease_seconds=600):
+    """ Renew the lease of a task
+    returns:
+        leased: bool, False if the task is no longer leased by the worker"""
+    connection = _connect(db_path)
+    try:
+        cursor = connection.execute("UPDATE tasks SET lease_expires = ?, updated = ? WHERE task_id = ? AND worker = ? AND status = 'leased'",
+                                    (time.time() + lease_seconds, time.time(), task_id, worker_id))
+    finally:
+        connection.close()
+    return cursor.rowcount == 1
+
+def commit_result(db_path, task_id, worker_id, results):
+    """ Save the results of a task and mark it as done, only the first commit of a task is kept
+    The results are pickled to a file of the worker before the write lock is taken, under the lock the file is only
+    moved in place before the task is marked as done: a task done always has complete results, whichever worker committed them.
+    args:
+        db_path: str, path of the SQLite database
+        task_id: str, id of the task
+        worker_id: str, id of the worker
+        results: object, picklable results of the task
+    returns:
+        committed: bool, False if the task was already done"""
+    result_file = os.path.join(os.path.dirname(os.path.abspath(db_path)), RESULTS_DIR, f'{task_id}.pickle')
+    worker_file = f'{result_file}.{worker_id}'
+    atomic_pickle_dump(results, worker_file)
+    connection = _connect(db_path)
+    try:
+        connection.execute('BEGIN IMMEDIATE')
+        row = connection.execute("SELECT status FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None or row[0] == 'done':
+            connection.execute('COMMIT')
+            os.remove(worker_file)
+            if row is None:
+                raise KeyError(f'Unknown task {task_id} in the queue {db_path}')
+            return False
+        os.replace(worker_file, result_file)
+        connection.execute("UPDATE tasks SET status = 'done', worker = ?, result_file = ?, error = NULL, updated = ? WHERE task_id = ?",
+                           (worker_id, result_file, time.time(), task_id))
+        connection.execute('COMMIT')
+    finally:
+        connection.close()
+    return True
+
+def release_task(db_path, task_id, worker_id, error, max_attempts=3):
+    " Give a failed task back to the queue, it is leased again unless it has reached its maximum number of attempts"
+    connection = _connect(db_path)
+    try:
+        connection.execute("UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, worker = NULL, lease_expires = NULL, "
+                           "error = ?, updated = ? WHERE task_id = ? AND worker = ? AND status = 'leased'",
+                           (max_attempts, error, time.time(), task_id, worker_id))
+    finally:
+        connection.close()
+
+def queue_status(db_path):
+    " Number of tasks by status"
+    connection = _connect(db_path)
+    try:
+        counts = dict(connection.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status').fetchall())
+    finally:
+        connection.close()
+    return {status: counts.get(status, 0) for status in TASK_STATUSES}
+
+def collect_results(db_path):
+    """ Results of the tasks done, by task id
+    returns:
+        results: dict, results of each task done"""
+    connection = _connect(db_path)
+    try:
+        rows = connection.execute("SELECT task_id, result_file FROM tasks WHERE status = 'done' ORDER BY task_id").fetchall()
+    finally:
+        connection.close()
+    results = {}
+    for task_id, result_file in rows:
+        with open(result_file, 'rb') as handle:
+            results[task_id] = pickle.load(handle)
+    return results
+
+def enqueue_backtest(db_path, sim_params, ens_params, configs=None, block_size=None):
+    """ Plan the test days of each configuration and enqueue one task per (configuration, day block)
+    The data is prepared once, the test days and the blocks are planned with the parameters of each configuration.
+    args:
+        db_path: str, path of the SQLite database
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        configs: list, configurations as dict with a name and the overrides of 'sim_params' and 'ens_params' (a single default configuration if None)
+        block_size: int, number of days of a block (gbr_update_every_days of each configuration if None)
+    returns:
+        n_added: int, number of new tasks"""
+    configs = configs if configs is not None else [{'name': 'default'}]
+    # the panel store, if any, is written here once and opened read-only by the workers
+    data = prepare_backtest_data(sim_params)
+    tasks = []
+    for config in configs:
+        assert not set(config.get('sim_params', {})) & set(SHARED_DATA_KEYS), f'The data parameters {SHARED_DATA_KEYS} are shared by all the tasks'
+        config_sim_params = dict(sim_params, **config.get('sim_params', {}))
+        config_ens_params = dict(ens_params, **config.get('ens_params', {}))
+        config_block_size = config_ens_params['gbr_update_every_days'] if block_size is None else block_size
+        assert config_block_size % config_ens_params['gbr_update_every_days'] == 0, f"block_size must be a multiple of gbr_update_every_days in the configuration {config['name']}"
+        for block in plan_backtest_blocks(plan_test_days(config_sim_params, data), config_block_size):
+            tasks.append({'task_id': f"{config['name']}__block_{block['block_id']:04d}",
+                          'payload': {'config': config, 'block': block}})
+    create_work_queue(db_path)
+    n_added = enqueue_tasks(db_path, tasks)
+    logger.info(f'{n_added} tasks added to the queue {db_path}')
+    return n_added
+
+def run_queue_task(sim_params, ens_params, task, worker_cache):
+    """ Run the day loop of a leased (configuration, day block) task
+    A task leased again after a failure resumes from the checkpoint of its block, if checkpoints are set.
+    args:
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        task: dict, leased task
+        worker_cache: dict, objects kept by the worker from one task to the next (the backtest data)
+    returns:
+        block_results: list, results of the days of the block"""
+    if 'data' not in worker_cache:
+        worker_cache['data'] = prepare_backtest_data(sim_params, create_panel=False)
+    config, block = task['payload']['config'], task['payload']['block']
+    block['test_days'] = [tuple(test_day) for test_day in block['test_days']]
+    sim_params = dict(sim_params, **config.get('sim_params', {}))
+    ens_params = dict(ens_params, **config.get('ens_params', {}))
+    ens_params['save_info'] = os.path.join(ens_params['save_info'], config['name'], '')
+    if sim_params.get('checkpoint_dir'):
+        sim_params['checkpoint_dir'] = os.path.join(sim_params['checkpoint_dir'], config['name'])
+    return run_backtest_block(sim_params, ens_params, block, data=worker_cache['data'], resume=task['attempts'] > 1)
+
+def _heartbeat_loop(db_path, task_id, worker_id, lease_seconds, heartbeat_seconds, stop):
+    " Renew the lease of a task every heartbeat_seconds until stop is set"
+    while not stop.wait(heartbeat_seconds):
+        if not heartbeat(db_path, task_id, worker_id, lease_seconds):
+            logger.warning(f'Worker {worker_id} lost the lease of {task_id}')
+
+def run_worker(db_path, sim_params, ens_params, worker_id=None, lease_seconds=600, heartbeat_seconds=60, max_attempts=3,
+               max_tasks=None, run_task=run_queue_task):
+    """ Lease and run tasks until the queue is empty, the lease is renewed by a heartbeat thread while a task runs
+    args:
+        db_path: str, path of the SQLite database
+        sim_params: dict, simulation parameters
+        ens_params: dict, ensemble parameters
+        worker_id: str, id of the worker (host and process id if None)
+        lease_seconds: float, duration of a lease
+        heartbeat_seconds: float, time between two renewals of the lease (shorter than lease_seconds)
+        max_attempts: int, number of leases of a task before it is marked as failed
+        max_tasks: int, number of tasks to run before stopping (no limit if None)
+        run_task: callable, runs a task: run_task(sim_params, ens_params, task, worker_cache) -> results
+    returns:
+        n_committed: int, number of tasks committed by the worker"""
+    assert heartbeat_seconds < lease_seconds, 'heartbeat_seconds must be shorter than lease_seconds'
+    worker_id = worker_id if worker_id is not None else f'{socket.gethostname()}-{os.getpid()}'
+    worker_cache, n_tasks, n_committed = {}, 0, 0
+    while max_tasks is None or n_tasks < max_tasks:
+        task = lease_task(db_path, worker_id, lease_seconds, max_attempts)
+        if task is None:
+            break
+        n_tasks += 1
+        logger.info(f"Worker {worker_id} leased {task['task_id']} (attempt {task['attempts']})")
+        stop = threading.Event()
+        beat = threading.Thread(target=_heartbeat_loop, args=(db_path, task['task_id'], worker_id, lease_seconds, heartbeat_seconds, stop), daemon=True)
+        beat.start()
+        try:
+            results = run_task(sim_params, ens_params, task, worker_cache)
+        except Exception as e:
+            logger.error(f"Worker {worker_id} failed on {task['task_id']}: {e}")
+            release_task(db_path, task['task_id'], worker_id, repr(e), max_attempts)
+            continue
+        finally:
+            stop.set()
+            beat.join()
+        n_committed += commit_result(db_path, task['task_id'], worker_id, results)
+    logger.info(f'Worker {worker_id} stops after {n_committed} committed tasks')
+    return n_committed
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Work queue of backtest day blocks shared by several hosts')
+    parser.add_argument('command', choices=['enqueue', 'worker', 'status'])
+    parser.add_argument('--queue', required=True, help='path of the SQLite queue database in a shared directory')
+    parser.add_argument('--lease-seconds', type=float, default=600)
+    parser.add_argument('--heartbeat-seconds', type=float, default=60)
+    args = parser.parse_args()
+
+    from config.simulation_setting_with_ramps import Simulation, Stack
+    if args.command == 'enqueue':
+        enqueue_backtest(args.queue, Simulation.testing_period, Stack.params)
+    elif args.command == 'worker':
+        run_worker(args.queue, Simulation.testing_period, Stack.params, lease_seconds=args.lease_seconds, heartbeat_seconds=args.heartbeat_seconds)
+    print(queue_status(args.queue))
@@ -0,0 +1,388 @@
+import os
+import json
+import shutil
+import hashlib
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from loguru import logger
+from source.utils.file_read import process_file, set_index_datetiemUTC
+from source.utils.generate_timestamp import to_utc_timestamp, to_utc_index
+
+INDEX_FILE = 'index.bin'
+META_FILE = 'meta.json'
+INDEX_DTYPE = 'int64'
+VALUES_DTYPE = 'float64'
+
+def file_fingerprint(filename, hash_content=False):
+    """ Fingerprint of a source file used to invalidate cached bundles
+    args:
+        filename: str, path of the source file
+        hash_content: bool, add a sha1 of the file content to path, size and mtime
+    returns:
+        fingerprint: dict, file fingerprint"""
+    assert os.path.isfile(filename), f'File {filename} does not exist'
+    stat = os.stat(filename)
+    fingerprint = {'path': os.path.abspath(filename), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if hash_content:
+        sha1 = hashlib.sha1()
+        with open(filename, 'rb') as handle:
+            for block in iter(lambda: handle.read(1 << 20), b''):
+                sha1.update(block)
+        fingerprint['sha1'] = sha1.hexdigest()
+    return fingerprint
+
+def cache_key(fingerprint, columns, **options):
+    " Cache key from the source fingerprint, the selected columns and the reader options"
+    assert isinstance(columns, list), 'columns must be a list'
+    payload = json.dumps({'source': fingerprint, 'columns': columns, 'options': options}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:20]
+
+def bundle_path(cache_dir, key):
+    " Path of the bundle directory for a cache key"
+    return Path(cache_dir) / key
+
+def bundle_exists(bundle_dir):
+    " Check whether a complete bundle is stored in the directory"
+    return (Path(bundle_dir) / META_FILE).is_file()
+
+def write_bundle(bundle_dir, df, meta=None):
+    """ Write a dataframe with a datetime index as a columnar bundle of raw binary files
+    args:
+        bundle_dir: str or Path, bundle directory
+        df: pd.DataFrame, numeric dataframe with a sorted datetime index
+        meta: dict, extra metadata stored with the bundle
+    returns:
+        bundle_dir: Path, bundle directory"""
+    assert isinstance(df, pd.DataFrame), 'df must be a DataFrame'
+    assert pd.api.types.is_datetime64_any_dtype(df.index), 'The df index must be a datetime type.'
+    assert df.index.is_monotonic_increasing, 'The df index must be sorted'
+    bundle_dir = Path(bundle_dir)
+    # write into a temporary directory and rename it, so a bundle is either complete or missing
+    tmp_dir = bundle_dir.with_name(bundle_dir.name + f'.tmp{os.getpid()}')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    index = to_utc_index(df.index)
+    index.asi8.astype(INDEX_DTYPE).tofile(tmp_dir / INDEX_FILE)
+    for col in df.columns:
+        np.ascontiguousarray(df[col].values, dtype=VALUES_DTYPE).tofile(tmp_dir / f'{col}.bin')
+    bundle_meta = {'columns': list(df.columns), 'length': len(df), 'index_dtype': INDEX_DTYPE, 'values_dtype': VALUES_DTYPE,
+                    'nan_stats': update_nan_statistics({}, df)}
+    bundle_meta.update(meta or {})
+    write_bundle_meta(tmp_dir, bundle_meta)
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    os.replace(tmp_dir, bundle_dir)
+    return bundle_dir
+
+def read_bundle_meta(bundle_dir):
+    " Read the metadata of a bundle"
+    with open(Path(bundle_dir) / META_FILE) as handle:
+        return json.load(handle)
+
+def write_bundle_meta(bundle_dir, meta):
+    " Atomically replace the metadata of a bundle"
+    tmp_file = Path(bundle_dir) / (META_FILE + '.tmp')
+    with open(tmp_file, 'w') as handle:
+        json.dump(meta, handle, default=str)
+    os.replace(tmp_file, Path(bundle_dir) / META_FILE)
+
+def update_nan_statistics(nan_stats, df):
+    """ Update the running statistics used to impute NaN values with the rows of df
+    args:
+        nan_stats: dict, {column: {'count': non-NaN values, 'sum': sum of the non-NaN values, 'nans': NaN values}}
+        df: pd.DataFrame, new rows
+    returns:
+        nan_stats: dict, updated statistics"""
+    for col in df.columns:
+        values = df[col].values.astype(VALUES_DTYPE)
+        is_nan = np.isnan(values)
+        stats = nan_stats.setdefault(col, {'count': 0, 'sum': 0.0, 'nans': 0})
+        stats['count'] += int((~is_nan).sum())
+        stats['sum'] += float(values[~is_nan].sum())
+        stats['nans'] += int(is_nan.sum())
+    return nan_stats
+
+def _memmap(path, dtype, length):
+    " Memory map a raw binary column, empty columns cannot be mapped"
+    if length == 0:
+        return np.array([], dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(length,))
+
+def read_bundle(bundle_dir, columns=None, starting_period=None, ending_period=None):
+    """ Read the requested columns and period from a bundle
+    args:
+        bundle_dir: str or Path, bundle directory
+        columns: list, columns to load (all columns if None)
+        starting_period: str or pd.Timestamp, first timestamp to load (inclusive)
+        ending_period: str or pd.Timestamp, last timestamp to load (inclusive)
+    returns:
+        df: pd.DataFrame, dataframe indexed by UTC datetime"""
+    bundle_dir = Path(bundle_dir)
+    meta = read_bundle_meta(bundle_dir)
+    columns = meta['columns'] if columns is None else columns
+    missing = [col for col in columns if col not in meta['columns']]
+    assert not missing, f'Columns {missing} are not in the bundle'
+    length = meta['length']
+    index = _memmap(bundle_dir / INDEX_FILE, meta['index_dtype'], length)
+    # locate the period on the sorted index instead of scanning it
+    start = 0 if starting_period is None else int(np.searchsorted(index, to_utc_timestamp(starting_period).value, side='left'))
+    end = length if ending_period is None else int(np.searchsorted(index, to_utc_timestamp(ending_period).value, side='right'))
+    data = {col: np.array(_memmap(bundle_dir / f'{col}.bin', meta['values_dtype'], length)[start:end]) for col in columns}
+    datetime_index = pd.DatetimeIndex(np.array(index[start:end]).view('datetime64[ns]'), name='datetime').tz_localize('UTC')
+    return pd.DataFrame(data, index=datetime_index, columns=columns)
+
+def _append_columns(bundle_dir, filenames_values):
+    " Append raw values at the end of the column files of a bundle"
+    for filename, values in filenames_values:
+        with open(Path(bundle_dir) / filename, 'ab') as handle:
+            handle.write(np.ascontiguousarray(values).tobytes())
+
+def _sort_bundle_files(bundle_dir, columns, length, block_size=1 << 20):
+    """ Sort the column files of a bundle by time, block by block
+    Only the sort permutation is held in memory, the columns are rewritten through memory maps."""
+    bundle_dir = Path(bundle_dir)
+    order = np.argsort(_memmap(bundle_dir / INDEX_FILE, INDEX_DTYPE, length), kind='stable')
+    for filename, dtype in [(INDEX_FILE, INDEX_DTYPE)] + [(f'{col}.bin', VALUES_DTYPE) for col in columns]:
+        source = _memmap(bundle_dir / filename, dtype, length)
+        target = np.memmap(bundle_dir / (filename + '.sorted'), dtype=dtype, mode='w+', shape=(length,))
+        for start in range(0, length, block_size):
+            target[start:start + block_size] = source[order[start:start + block_size]]
+        target.flush()
+        del source, target
+        os.replace(bundle_dir / (filename + '.sorted'), bundle_dir / filename)
+
+def stream_csv_to_bundle(csv_filename, bundle_dir, columns, starting_period=None, ending_period=None,
+                            offshore_filter='Offshore', region_col='offshoreonshore', chunksize=500_000, meta=None):
+    """ Stream a csv file into a bundle chunk by chunk, the peak memory depends on the chunk size and not on the file size
+    The column, region and period predicates are applied to each chunk before it is written.
+    args:
+        csv_filename: str, path of the csv file
+        bundle_dir: str or Path, bundle directory
+        columns: list, columns to keep
+        starting_period: str or pd.Timestamp, first timestamp to keep (inclusive, no limit if None)
+        ending_period: str or pd.Timestamp, last timestamp to keep (inclusive, no limit if None)
+        offshore_filter: str, value of the region column to keep
+        region_col: str, name of the region column
+        chunksize: int, number of csv rows per chunk
+        meta: dict, extra metadata stored with the bundle
+    returns:
+        bundle_dir: Path, bundle directory"""
+    assert isinstance(columns, list), 'columns must be a list'
+    assert chunksize > 0, 'chunksize must be positive'
+    bundle_dir = Path(bundle_dir)
+    start = None if starting_period is None else to_utc_timestamp(starting_period).value
+    end = None if ending_period is None else to_utc_timestamp(ending_period).value
+    # write into a temporary directory and rename it, so a bundle is either complete or missing
+    tmp_dir = bundle_dir.with_name(bundle_dir.name + f'.tmp{os.getpid()}')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for filename in [INDEX_FILE] + [f'{col}.bin' for col in columns]:
+        (tmp_dir / filename).touch()
+    length, last_timestamp, is_sorted, nan_stats = 0, None, True, {}
+    reader = pd.read_csv(csv_filename, usecols=['datetime', region_col] + columns, chunksize=chunksize,
+                            dtype={**{col: VALUES_DTYPE for col in columns}, region_col: 'category'})
+    for chunk in reader:
+        # region first, the datetime parsing is the costly part of a chunk
+        chunk = chunk[chunk[region_col] == offshore_filter]
+        epoch = pd.DatetimeIndex(pd.to_datetime(chunk['datetime'], utc=True)).as_unit('ns').asi8
+        keep = np.ones(len(epoch), dtype=bool)
+        if start is not None:
+            keep &= epoch >= start
+        if end is not None:
+            keep &= epoch <= end
+        if not keep.any():
+            continue
+        epoch, chunk = epoch[keep], chunk[columns][keep]
+        is_sorted = is_sorted and bool((np.diff(epoch) >= 0).all()) and (last_timestamp is None or epoch[0] >= last_timestamp)
+        last_timestamp = epoch[-1]
+        _append_columns(tmp_dir, [(INDEX_FILE, epoch)] + [(f'{col}.bin', chunk[col].values.astype(VALUES_DTYPE)) for col in columns])
+        nan_stats = update_nan_statistics(nan_stats, chunk)
+        length += len(epoch)
+    if not is_sorted:
+        _sort_bundle_files(tmp_dir, columns, length)
+    bundle_meta = {'columns': columns, 'length': length, 'index_dtype': INDEX_DTYPE, 'values_dtype': VALUES_DTYPE,
+                    'nan_stats': {col: nan_stats.get(col, {'count': 0, 'sum': 0.0, 'nans': 0}) for col in columns}}
+    bundle_meta.update(meta or {})
+    write_bundle_meta(tmp_dir, bundle_meta)
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    os.replace(tmp_dir, bundle_dir)
+    logger.info(f'Streamed {length} rows of {csv_filename} into {bundle_dir}')
+    return bundle_dir
+
+def csv_bundle_path(csv_filename, columns, cache_dir='./cache_dataset/', offshore_filter='Offshore', hash_content=False):
+    " Path of the bundle caching the selected columns of a csv file"
+    fingerprint = file_fingerprint(csv_filename, hash_content=hash_content)
+    return bundle_path(cache_dir, cache_key(fingerprint, columns, offshore_filter=offshore_filter, reader='csv'))
+
+def read_csv_file_cached(csv_filename, columns, starting_period, ending_period, cache_dir='./cache_dataset/', offshore_filter='Offshore', hash_content=False, chunksize=500_000):
+    """ Read the csv file through a columnar cache, see read_csv_file
+    args:
+        csv_filename: str, path of the csv file
+        columns: list, columns to load
+        starting_period: str, first timestamp to load (inclusive)
+        ending_period: str, last timestamp to load (inclusive)
+        cache_dir: str, directory storing the cached bundles
+        offshore_filter: str, value of the 'offshoreonshore' column to keep
+        hash_content: bool, key the cache on the file content as well as on its mtime
+        chunksize: int, number of csv rows per chunk when the cache is built
+    returns:
+        df: pd.DataFrame, dataframe indexed by UTC datetime"""
+    fingerprint = file_fingerprint(csv_filename, hash_content=hash_content)
+    bundle_dir = csv_bundle_path(csv_filename, columns, cache_dir, offshore_filter, hash_content)
+    if not bundle_exists(bundle_dir):
+        logger.info(f'Building cache for {csv_filename} in {bundle_dir}')
+        stream_csv_to_bundle(csv_filename, bundle_dir, columns, offshore_filter=offshore_filter, chunksize=chunksize, meta={'source': fingerprint})
+    else:
+        logger.info(f'Loading {csv_filename} from cache {bundle_dir}')
+    return read_bundle(bundle_dir, columns, starting_period, ending_period)
+
+def process_file_cached(file, offshore_filter, cache_dir='./cache_dataset/', hash_content=False):
+    """ Process a json file through a columnar cache, see process_file
+    Only the numeric columns are cached.
+    args:
+        file: str, path of the json file
+        offshore_filter: str, value of the 'offshoreonshore' column to keep
+        cache_dir: str, directory storing the cached bundles
+        hash_content: bool, key the cache on the file content as well as on its mtime
+    returns:
+        df: pd.DataFrame, dataframe indexed by UTC datetime"""
+    assert file.endswith('.json'), 'File must be a json file'
+    fingerprint = file_fingerprint(file, hash_content=hash_content)
+    key = cache_key(fingerprint, [], offshore_filter=offshore_filter, reader='json')
+    bundle_dir = bundle_path(cache_dir, key)
+    if not bundle_exists(bundle_dir):
+        logger.info(f'Building cache for {file} in {bundle_dir}')
+        df = process_file(file, offshore_filter)
+        write_bundle(bundle_dir, df.select_dtypes('number'), meta={'source': fingerprint})
+    return read_bundle(bundle_dir)
+
+def process_and_concat_files_cached(files, offshore_filter='Offshore', cache_dir='./cache_dataset/'):
+    " Process and concatenate files through the columnar cache"
+    assert len(files) > 0, 'No files to process'
+    dataframes = [process_file_cached(file, offshore_filter, cache_dir) for file in files]
+    return pd.concat(dataframes, axis=0)
+
+def validate_day(df_day, columns, offshore_filter='Offshore', measured_col='measured', step='15min'):
+    """ Validate one new day of data before it is appended to a bundle, see process_file
+    args:
+        df_day: pd.DataFrame, rows of the day with a 'datetime' column or a datetime index
+        columns: list, columns of the bundle
+        offshore_filter: str, value of the 'offshoreonshore' column to keep
+        measured_col: str, name of the measured column, negative values are clipped to 0
+        step: str, resolution of the data
+    returns:
+        df_day: pd.DataFrame, validated day indexed by UTC datetime"""
+    assert isinstance(df_day, pd.DataFrame), 'df_day must be a DataFrame'
+    df_day = df_day.copy()
+    if 'offshoreonshore' in df_day.columns:
+        df_day = df_day[df_day['offshoreonshore'] == offshore_filter]
+    if 'datetime' in df_day.columns:
+        df_day = set_index_datetiemUTC(df_day)
+    assert pd.api.types.is_datetime64_any_dtype(df_day.index), 'The df_day index must be a datetime type.'
+    df_day.index = to_utc_index(df_day.index)
+    missing = [col for col in columns if col not in df_day.columns]
+    assert not missing, f'Columns {missing} are missing in df_day'
+    slots_per_day = pd.Timedelta(days=1) // pd.Timedelta(step)
+    assert len(df_day) == slots_per_day, f'The day must have {slots_per_day} rows'
+    assert df_day.index[0] == df_day.index[0].normalize(), 'The day must start at midnight UTC'
+    assert (np.diff(df_day.index.asi8) == pd.Timedelta(step).value).all(), f'The day must be on a regular {step} grid'
+    df_day = df_day[columns].astype(VALUES_DTYPE)
+    if measured_col in df_day.columns:
+        df_day[measured_col] = df_day[measured_col].clip(lower=0)
+    return df_day
+
+def append_day_to_bundle(bundle_dir, df_day, offshore_filter='Offshore', measured_col='measured'):
+    """ Validate one new day and append it to a bundle, the cost depends on the day only
+    The column files are extended first and the metadata is replaced last, so an interrupted append
+    leaves the bundle unchanged.
+    args:
+        bundle_dir: str or Path, bundle directory
+        df_day: pd.DataFrame, rows of the day with a 'datetime' column or a datetime index
+        offshore_filter: str, value of the 'offshoreonshore' column to keep
+        measured_col: str, name of the measured column
+    returns:
+        meta: dict, updated metadata of the bundle"""
+    bundle_dir = Path(bundle_dir)
+    meta = read_bundle_meta(bundle_dir)
+    df_day = validate_day(df_day, meta['columns'], offshore_filter, measured_col)
+    length = meta['length']
+    if length > 0:
+        last_timestamp = _memmap(bundle_dir / INDEX_FILE, meta['index_dtype'], length)[-1]
+        assert df_day.index.asi8[0] > last_timestamp, 'The day must start after the last timestamp of the bundle'
+    files = [(INDEX_FILE, df_day.index.asi8.astype(meta['index_dtype']))]
+    files += [(f'{col}.bin', df_day[col].values.astype(meta['values_dtype'])) for col in meta['columns']]
+    for filename, values in files:
+        with open(bundle_dir / filename, 'r+b' if (bundle_dir / filename).exists() else 'wb') as handle:
+            # drop the bytes of a previously interrupted append
+            handle.truncate(length * values.itemsize)
+            handle.seek(0, os.SEEK_END)
+            handle.write(values.tobytes())
+    meta['length'] = length + len(df_day)
+    meta['nan_stats'] = update_nan_statistics(meta.get('nan_stats', {}), df_day)
+    write_bundle_meta(bundle_dir, meta)
+    logger.info(f'Appended {df_day.index[0].date()} to {bundle_dir}')
+    return meta
+
+def append_store_path(cache_dir, columns, offshore_filter='Offshore'):
+    """ Path of the store receiving the new days of the selected columns
+    The store is keyed on the columns and the region only, unlike the csv bundles it is not invalidated when the csv file changes."""
+    return bundle_path(cache_dir, cache_key({'store': 'append'}, columns, offshore_filter=offshore_filter, reader='append'))
+
+def open_append_store(csv_filename, columns, cache_dir='./cache_dataset/', offshore_filter='Offshore', chunksize=500_000):
+    """ Append store of the selected columns, seeded from the csv file when it does not exist yet
+    args:
+        csv_filename: str, path of the csv file used to seed the store
+        columns: list, columns of the store
+        cache_dir: str, directory storing the cached bundles
+        offshore_filter: str, value of the 'offshoreonshore' column to keep
+        chunksize: int, number of csv rows per chunk when the store is seeded
+    returns:
+        bundle_dir: Path, bundle directory of the store"""
+    bundle_dir = append_store_path(cache_dir, columns, offshore_filter)
+    if not bundle_exists(bundle_dir):
+        logger.info(f'Seeding append store {bundle_dir} from {csv_filename}')
+        stream_csv_to_bundle(csv_filename, bundle_dir, columns, offshore_filter=offshore_filter, chunksize=chunksize,
+                                meta={'source': file_fingerprint(csv_filename)})
+    return bundle_dir
+
+def append_day_files(bundle_dir, day_files, offshore_filter='Offshore', measured_col='measured'):
+    """ Append the daily csv files to a store, the days already stored are skipped
+    args:
+        bundle_dir: str or Path, bundle directory of the store
+        day_files: list, paths of the csv files holding one day each
+        offshore_filter: str, value of the 'offshoreonshore' column to keep
+        measured_col: str, name of the measured column
+    returns:
+        meta: dict, metadata of the store"""
+    meta = read_bundle_meta(bundle_dir)
+    for day_file in sorted(day_files):
+        df_day = validate_day(pd.read_csv(day_file), meta['columns'], offshore_filter, measured_col)
+        length = meta['length']
+        if length > 0 and df_day.index.asi8[0] <= _memmap(Path(bundle_dir) / INDEX_FILE, meta['index_dtype'], length)[-1]:
+            continue
+        meta = append_day_to_bundle(bundle_dir, df_day, offshore_filter, measured_col)
+    return meta
+
+def replace_nan_values_from_bundle(sim_params, df_processed, bundle_dir):
+    """ Replace NaN values with the running statistics of a bundle, see replace_nan_values
+    The mean comes from the running sums kept up to date by append_day_to_bundle, the median is
+    recomputed from the bundle.
+    args:
+        sim_params: dict, simulation parameters
+        df_processed: pd.DataFrame, dataframe read from the bundle
+        bundle_dir: str or Path, bundle directory
+    returns:
+        df_processed: pd.DataFrame, dataframe without NaN values"""
+    method = sim_params['imputation_nan']
+    if method == 'zero':
+        return df_processed.fillna(0)
+    elif method == 'mean':
+        nan_stats = read_bundle_meta(bundle_dir)['nan_stats']
+        fill_values = {col: nan_stats[col]['sum'] / nan_stats[col]['count'] for col in df_processed.columns if nan_stats[col]['count'] > 0}
+    elif method == 'median':
+        logger.warning('Median imputation recomputes the median from the whole bundle')
+        df_bundle = read_bundle(bundle_dir, list(df_processed.columns))
+        fill_values = df_bundle.median().to_dict()
+    else:
+        raise ValueError('Invalid NaN replacement method. Please select "zero", "mean" or "median".')
+    return df_processed.fillna(fill_values)
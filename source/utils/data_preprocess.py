@@ -2,6 +2,8 @@ import numpy as np
 import pandas as pd
 from loguru import logger
 
+PRECISIONS = ['float64', 'float32']
+
 def detect_ramp_event(df, ramp_threshold):
     " Detect ramp event by comparing the absolute difference between consecutive values with a threshold"
     assert ramp_threshold > 0, "Ramp threshold must be greater than 0"
@@ -19,10 +21,9 @@ def differentiate_dataframe(df):
     return df_differential.filter(like='diff').iloc[1:]
 
 def scale(df, col_name, max_cap):
-    " Scale a column by dividing by maximum capacity"
-    assert max_cap > 0, "Maximum capacity must be greater than 0"
-    df_ = df.copy()
-    values = df_[col_name].values
+    " Scale a column, or a list of columns at once, by dividing by maximum capacity (a capacity per column for a list)"
+    assert np.all(np.asarray(max_cap) > 0), "Maximum capacity must be greater than 0"
+    values = df[col_name].values
     return values/max_cap
 
 def get_maximum_values(df, end_train, buyer_resource_name=None):
@@ -42,23 +43,16 @@ def get_maximum_values(df, end_train, buyer_resource_name=None):
         return list_maximum_values_forecasters
 
 def normalize_dataframe(df, axis=1, max_cap=None, max_cap_forecasters_list=None):
-    " Normalize dataframe by dividing by maximum capacity"
-    df_normalized = df.copy()
+    " Normalize dataframe by dividing by maximum capacity, all the columns at once"
     if axis==1:
         assert max_cap is not None, "Maximum capacity must be provided"
-        for col in df_normalized.columns:
-            normalize_col = scale(df_normalized, col, max_cap)
-            df_normalized[f'norm_{col}'] = normalize_col
-        return df_normalized.filter(like='norm')
+        max_caps = np.full(df.shape[1], max_cap, dtype=np.float64)
     elif axis==0:
         assert max_cap_forecasters_list is not None, "List of maximum capacities must be provided"
-        for i, col in enumerate(df_normalized.columns):
-            max_cap_forecaster = max_cap_forecasters_list[i]
-            normalize_col = scale(df_normalized, col, max_cap_forecaster)
-            df_normalized[f'norm_{col}'] = normalize_col
-        return df_normalized.filter(like='norm')
+        max_caps = np.asarray(max_cap_forecasters_list, dtype=np.float64)
     else:
         raise ValueError("Axis must be either 0 or 1")
+    return pd.DataFrame(scale(df, list(df.columns), max_caps), index=df.index, columns=[f'norm_{col}' for col in df.columns])
 
 def rescale_normalized_predictions(predictions, quantile, maximum_capacity):
     " Rescale normalized predictions"
@@ -73,9 +67,8 @@ def rescale_normalized_targets(df, target_name, maximum_capacity):
     return df[target_name] * maximum_capacity
 
 def standard_scale(df, col_name, mean, std):
-    " Scale a column by dividing by maximum capacity"
-    df_ = df.copy()
-    values = df_[col_name].values
+    " Standardize a column, or a list of columns at once, by subtracting the mean and dividing by the standard deviation (per column for a list)"
+    values = df[col_name].values
     return (values - mean)/std
 
 def get_mean_std_values(df, end_train, buyer_resource_name=None):
@@ -97,26 +90,18 @@ def get_mean_std_values(df, end_train, buyer_resource_name=None):
         return list_mean_values_forecasters, list_std_values_forecasters
 
 def standardize_dataframe(df, axis=1, mean_buyer=None, std_buyer=None, mean_forecasters_list=None, std_forecasters_list=None):
-    " Standardize dataframe by subtracting the mean and dividing by the standard deviation"
-    df_standardized = df.copy()
+    " Standardize dataframe by subtracting the mean and dividing by the standard deviation, all the columns at once"
     if axis==1:
         assert mean_buyer is not None, "Mean values must be provided"
         assert std_buyer is not None, "Std values must be provided"
-        for col in df_standardized.columns:
-            standardize_col = standard_scale(df_standardized, col, mean_buyer, std_buyer)
-            df_standardized[f'norm_{col}'] = standardize_col
-        return df_standardized.filter(like='norm')
+        means, stds = mean_buyer, std_buyer
     elif axis==0:
         assert mean_forecasters_list is not None, "List of mean values must be provided"
         assert std_forecasters_list is not None, "List of std values must be provided"
-        for i, col in enumerate(df_standardized.columns):
-            mean_forecaster = mean_forecasters_list[i]
-            std_forecaster = std_forecasters_list[i]
-            standardize_col = standard_scale(df_standardized, col, mean_forecaster, std_forecaster)
-            df_standardized[f'norm_{col}'] = standardize_col
-        return df_standardized.filter(like='norm')
+        means, stds = np.asarray(mean_forecasters_list, dtype=np.float64), np.asarray(std_forecasters_list, dtype=np.float64)
     else:
         raise ValueError("Axis must be either 0 or 1")
+    return pd.DataFrame(standard_scale(df, list(df.columns), means, stds), index=df.index, columns=[f'norm_{col}' for col in df.columns])
     
 def rescale_standardized_predictions(predictions, quantile, mean, std, stage = '1st'):
     " Rescale standardized predictions"
@@ -165,9 +150,35 @@ def buyer_scaler_statistics(ens_params, df_buyer, end_training_timestamp, buyer_
     logger.info('  ')
     return stats
 
-def scale_forecasters_dataframe(ens_params, stats, df_ensemble_quantile50, df_ensemble_quantile10, df_ensemble_quantile90, end_training_timestamp):
+def forecasters_scaler_statistics(ens_params, end_training_timestamp, *dfs):
+    """ Statistics of the forecasters scaler by column, computed on the training rows
+    The forecasters are scaled with the statistics of the buyer if ens_params['axis'] == 1, no statistics are computed.
+    args:
+        ens_params: dict, ensemble parameters
+        end_training_timestamp: pd.Timestamp, end of training timestamp
+        dfs: pd.DataFrame, forecasters predictions of the quantiles (the empty dataframes are skipped)
+    returns:
+        stats: pd.DataFrame, 'maximum' or 'mean' and 'std' of each forecaster column"""
+    dfs = [df for df in dfs if not df.empty]
+    if not ens_params['scale_features'] or ens_params['axis'] != 0 or not dfs:
+        return pd.DataFrame()
+    frames = []
+    for df in dfs:
+        if ens_params['normalize']:
+            frames.append(pd.DataFrame([get_maximum_values(df=df, end_train=end_training_timestamp)], index=['maximum'], columns=df.columns))
+        elif ens_params['standardize']:
+            frames.append(pd.DataFrame(list(get_mean_std_values(df=df, end_train=end_training_timestamp)), index=['mean', 'std'], columns=df.columns))
+    return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+def column_statistics(forecasters_stats, df, name):
+    " Statistic of the columns of df (None if the forecasters are not scaled column by column)"
+    return forecasters_stats.loc[name, df.columns].values if name in forecasters_stats.index else None
+
+def scale_forecasters_dataframe(ens_params, stats, df_ensemble_quantile50, df_ensemble_quantile10, df_ensemble_quantile90, end_training_timestamp, forecasters_stats=None):
     """
     Normalize or standardize the dataframes based on the given ensemble parameters.
+    The statistics of the forecasters are computed on the training rows, forecasters_stats (e.g. of a previous training window)
+    are used for the columns they have.
     """
     # Extract statistics
     maximum_capacity = stats.get('maximum_capacity', None)
@@ -179,48 +190,42 @@ def scale_forecasters_dataframe(ens_params, stats, df_ensemble_quantile50, df_en
     df_ensemble_normalized_quantile10 = pd.DataFrame()
     df_ensemble_normalized_quantile90 = pd.DataFrame()
 
+    # Statistics of the forecasters columns
+    dfs = [df_ensemble_quantile50, df_ensemble_quantile10, df_ensemble_quantile90] if ens_params['add_quantile_predictions'] else [df_ensemble_quantile50]
+    if forecasters_stats is None:
+        forecasters_stats = forecasters_scaler_statistics(ens_params, end_training_timestamp, *dfs)
+    else:
+        new_columns = [df.drop(columns=[col for col in df.columns if col in forecasters_stats.columns]) for df in dfs]
+        forecasters_stats = pd.concat([forecasters_stats, forecasters_scaler_statistics(ens_params, end_training_timestamp, *new_columns)], axis=1)
+
     # Normalize dataframes
     if ens_params['scale_features'] and ens_params['normalize']:
         logger.info('   ')
         logger.opt(colors=True).info(f'<fg 250,128,114> Normalize DataFrame </fg 250,128,114>')
-        list_max_forecasters_q50 = get_maximum_values(df=df_ensemble_quantile50, end_train=end_training_timestamp)
-        df_ensemble_normalized = normalize_dataframe(df_ensemble_quantile50, axis=ens_params['axis'], max_cap=maximum_capacity, max_cap_forecasters_list=list_max_forecasters_q50)
+        df_ensemble_normalized = normalize_dataframe(df_ensemble_quantile50, axis=ens_params['axis'], max_cap=maximum_capacity, 
+                                                        max_cap_forecasters_list=column_statistics(forecasters_stats, df_ensemble_quantile50, 'maximum'))
         if ens_params['add_quantile_predictions']:
             logger.opt(colors=True).info(f'<fg 250,128,114> -- Add quantile predictions </fg 250,128,114>')
-            # Get maximum values for forecasters
-            if not df_ensemble_quantile10.empty:
-                list_max_forecasters_q10 = get_maximum_values(df=df_ensemble_quantile10, end_train=end_training_timestamp)
-            else:
-                list_max_forecasters_q10 = []
-            if not df_ensemble_quantile90.empty:
-                list_max_forecasters_q90 = get_maximum_values(df=df_ensemble_quantile90, end_train=end_training_timestamp)
-            else:
-                list_max_forecasters_q90 = []
             # Normalize quantile predictions
             df_ensemble_normalized_quantile10 = normalize_dataframe(df_ensemble_quantile10, axis=ens_params['axis'], 
-                                                                    max_cap=maximum_capacity, max_cap_forecasters_list=list_max_forecasters_q10) if not df_ensemble_quantile10.empty else pd.DataFrame()
+                                                                    max_cap=maximum_capacity, max_cap_forecasters_list=column_statistics(forecasters_stats, df_ensemble_quantile10, 'maximum')) if not df_ensemble_quantile10.empty else pd.DataFrame()
             df_ensemble_normalized_quantile90 = normalize_dataframe(df_ensemble_quantile90, axis=ens_params['axis'], 
-                                                                    max_cap=maximum_capacity, max_cap_forecasters_list=list_max_forecasters_q90) if not df_ensemble_quantile90.empty else pd.DataFrame()
+                                                                    max_cap=maximum_capacity, max_cap_forecasters_list=column_statistics(forecasters_stats, df_ensemble_quantile90, 'maximum')) if not df_ensemble_quantile90.empty else pd.DataFrame()
     # Standardize dataframes
     elif ens_params['scale_features'] and ens_params['standardize']:
         logger.info('   ')
         logger.opt(colors=True).info(f'<fg 250,128,114> Standardize DataFrame </fg 250,128,114>')
-        mean_forecasters_q50, std_forecasters_q50 = get_mean_std_values(df=df_ensemble_quantile50, end_train=end_training_timestamp)
-        df_ensemble_normalized = standardize_dataframe(df_ensemble_quantile50, axis=ens_params['axis'], mean_buyer=mean_buyer, std_buyer=std_buyer, mean_forecasters_list=mean_forecasters_q50, std_forecasters_list=std_forecasters_q50)
+        df_ensemble_normalized = standardize_dataframe(df_ensemble_quantile50, axis=ens_params['axis'], mean_buyer=mean_buyer, std_buyer=std_buyer, 
+                                                        mean_forecasters_list=column_statistics(forecasters_stats, df_ensemble_quantile50, 'mean'), 
+                                                        std_forecasters_list=column_statistics(forecasters_stats, df_ensemble_quantile50, 'std'))
         if ens_params['add_quantile_predictions']:
             logger.opt(colors=True).info(f'<fg 250,128,114> -- Add quantile predictions </fg 250,128,114>')
-            if not df_ensemble_quantile10.empty:
-                mean_forecasters_q10, std_forecasters_q10 = get_mean_std_values(df=df_ensemble_quantile10, end_train=end_training_timestamp)
-            else:
-                mean_forecasters_q10, std_forecasters_q10 = [], []
-            if not df_ensemble_quantile90.empty:
-                mean_forecasters_q90, std_forecasters_q90 = get_mean_std_values(df=df_ensemble_quantile90, end_train=end_training_timestamp)
-            else:
-                mean_forecasters_q90, std_forecasters_q90 = [], []
             df_ensemble_normalized_quantile10 = standardize_dataframe(df_ensemble_quantile10, axis=ens_params['axis'], mean_buyer=mean_buyer, std_buyer=std_buyer, 
-                                                                        mean_forecasters_list=mean_forecasters_q10, std_forecasters_list=std_forecasters_q10) if not df_ensemble_quantile10.empty else pd.DataFrame()
+                                                                        mean_forecasters_list=column_statistics(forecasters_stats, df_ensemble_quantile10, 'mean'), 
+                                                                        std_forecasters_list=column_statistics(forecasters_stats, df_ensemble_quantile10, 'std')) if not df_ensemble_quantile10.empty else pd.DataFrame()
             df_ensemble_normalized_quantile90 = standardize_dataframe(df_ensemble_quantile90, axis=ens_params['axis'], mean_buyer=mean_buyer, std_buyer=std_buyer, 
-                                                                        mean_forecasters_list=mean_forecasters_q90, std_forecasters_list=std_forecasters_q90) if not df_ensemble_quantile90.empty else pd.DataFrame()
+                                                                        mean_forecasters_list=column_statistics(forecasters_stats, df_ensemble_quantile90, 'mean'), 
+                                                                        std_forecasters_list=column_statistics(forecasters_stats, df_ensemble_quantile90, 'std')) if not df_ensemble_quantile90.empty else pd.DataFrame()
     # If no scaling is applied, simply copy and prefix dataframes
     else:
         df_ensemble_normalized = df_ensemble_quantile50.copy().add_prefix('norm_')
@@ -309,3 +314,18 @@ def impute_mean_for_nan(df):
             # Impute mean for NaN values
             df[col].fillna(df[col].mean(), inplace=True)
     return df
+
+
+def compute_dtype(ens_params):
+    """
+    Floating point dtype of the feature matrices from the 'precision' ensemble parameter ('float64' by default).
+    """
+    precision = ens_params.get('precision', 'float64')
+    assert precision in PRECISIONS, f'Invalid precision. Please select one of {PRECISIONS}.'
+    return np.dtype(precision)
+
+def cast_dataframes(dtype, *dfs):
+    """
+    Cast the non-empty dataframes to the compute dtype (no copy if they already have it).
+    """
+    return tuple(df.astype(dtype, copy=False) if not df.empty else df for df in dfs)
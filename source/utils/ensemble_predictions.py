@@ -16,4 +16,11 @@ def dict2df_quantiles90(prediction, col_name):
     df_pred = pd.DataFrame.from_records(prediction)
     df_pred.set_index('datetime', inplace=True)
     df_pred.columns = [col_name + '_quantile90']
-    return df_pred
\ No newline at end of file
+    return df_pred
+
+def columns2df(df, columns, col_names):
+    " Slice the columns of a DataFrame indexed by datetime and rename them in bulk, the vectorized counterpart of dict2df_* "
+    assert df.index.name == 'datetime', "Index must be datetime"
+    df_pred = df[list(columns)]
+    df_pred.columns = list(col_names)
+    return df_pred
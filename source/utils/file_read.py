@@ -1,5 +1,6 @@
 import pandas as pd
 from loguru import logger
+from source.utils.time_grid import grid_rows_between
 
 def read_csv_file(csv_filename, columns, starting_period, ending_period):
     """
@@ -60,9 +61,15 @@ def filter_df(df, forecasts_col, measured_col):
     df_filtered = df[lst_cols]
     return df_filtered
 
-def filter_data(df, start, end, string = 'training'):
-    """Filters the dataframe for the given date range."""
-    df_trimmed = df[df.index.to_series().between(start, end)].iloc[:-1, :]
+def filter_data(df, start, end, string = 'training', grid=None):
+    """Filters the dataframe for the given date range.
+    With the time grid of df (see build_time_grid) the range is located by arithmetic and returned as a positional slice."""
+    if grid is not None:
+        assert grid['row_offsets'][-1] == len(df), 'The time grid does not match the dataframe'
+        row_start, row_end = grid_rows_between(grid, start, end)
+        df_trimmed = df.iloc[row_start:max(row_start, row_end - 1)]
+    else:
+        df_trimmed = df[df.index.to_series().between(start, end)].iloc[:-1, :]
     logger.opt(colors = True).info(f'<blue> -----------------> Length of {string} data: {len(df_trimmed)} </blue>')
     return df_trimmed
 
@@ -1,10 +1,26 @@
 import pandas as pd
 from loguru import logger
 
-def generate_timestamps(start_training, i, window_size):
+def to_utc_timestamp(timestamp):
+    " Convert a timestamp to a UTC pd.Timestamp, naive timestamps are taken as UTC"
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_localize('UTC') if timestamp.tz is None else timestamp.tz_convert('UTC')
+
+def to_utc_index(index):
+    " Convert a DatetimeIndex to UTC, a naive index is taken as UTC as in to_utc_timestamp"
+    return index.tz_localize('UTC') if index.tz is None else index.tz_convert('UTC')
+
+def generate_timestamps(start_training, i, window_size, window='sliding', max_window_size=None):
     # Generate timestamps for training and prediction
+    # 'sliding': window_size days, 'expanding': from start_training, 'capped': expanding up to max_window_size days
     assert window_size > 0, "Window size must be greater than 0"
+    assert window in ['sliding', 'expanding', 'capped'], "Window must be 'sliding', 'expanding' or 'capped'"
+    assert window != 'capped' or (max_window_size is not None and max_window_size >= window_size), "max_window_size must be at least window_size for a capped window"
     start_training_timestamp = pd.to_datetime(start_training, utc=True) + pd.Timedelta(days=i)
+    if window == 'expanding':
+        start_training_timestamp = pd.to_datetime(start_training, utc=True)
+    elif window == 'capped':
+        start_training_timestamp = pd.to_datetime(start_training, utc=True) + pd.Timedelta(days=max(0, i + window_size - max_window_size))
     end_training_timestamp = pd.to_datetime(start_training, utc=True) + pd.Timedelta(days=i + window_size)
     start_prediction_timestamp = pd.to_datetime(start_training, utc=True) + pd.Timedelta(days=1 + i + window_size)
     end_prediction_timestamp = pd.to_datetime(start_training, utc=True) + pd.Timedelta(days=2 + i + window_size)
@@ -0,0 +1,104 @@
+import warnings
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+IMPUTATION_STRATEGIES = ['zero', 'mean', 'median', 'last']
+
+def build_imputation_sums(df):
+    """ Running sums of a dataframe used to compute window statistics in O(1)
+    args:
+        df: pd.DataFrame, numeric dataframe
+    returns:
+        sums: dict, running sums
+            values: np.array, values of df
+            cum_sum: np.array, cumulative sum of the non-NaN values (n_rows + 1 rows)
+            cum_count: np.array, cumulative count of the non-NaN values (n_rows + 1 rows)
+            last_valid: np.array, row position of the last non-NaN value up to each row (-1 if none)"""
+    assert isinstance(df, pd.DataFrame), 'df must be a DataFrame'
+    values = df.values.astype(np.float64)
+    valid = ~np.isnan(values)
+    n_rows, n_cols = values.shape
+    cum_sum = np.zeros((n_rows + 1, n_cols))
+    cum_count = np.zeros((n_rows + 1, n_cols), dtype=np.int64)
+    np.cumsum(np.where(valid, values, 0.0), axis=0, out=cum_sum[1:])
+    np.cumsum(valid, axis=0, out=cum_count[1:])
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(n_rows)[:, None], -1), axis=0) if n_rows else np.zeros((0, n_cols), dtype=np.int64)
+    return {'values': values, 'cum_sum': cum_sum, 'cum_count': cum_count, 'last_valid': last_valid}
+
+def window_statistics(sums, row_start, row_end, strategy='mean'):
+    """ Fill values of each column computed only from the rows [row_start, row_end)
+    'zero', 'mean' and 'last' are O(1) in the window length, 'median' reads the window.
+    args:
+        sums: dict, running sums from build_imputation_sums
+        row_start: int, first row of the window
+        row_end: int, row after the last row of the window
+        strategy: str, 'zero', 'mean', 'median' or 'last'
+    returns:
+        fill_values: np.array, fill value of each column (NaN if the column has no value in the window)"""
+    assert strategy in IMPUTATION_STRATEGIES, f'Invalid imputation strategy. Please select one of {IMPUTATION_STRATEGIES}.'
+    assert 0 <= row_start <= row_end, 'Invalid window'
+    n_cols = sums['values'].shape[1]
+    if strategy == 'zero':
+        return np.zeros(n_cols)
+    if strategy == 'mean':
+        count = sums['cum_count'][row_end] - sums['cum_count'][row_start]
+        total = sums['cum_sum'][row_end] - sums['cum_sum'][row_start]
+        return np.divide(total, count, out=np.full(n_cols, np.nan), where=count > 0)
+    if strategy == 'median':
+        if row_end == row_start:
+            return np.full(n_cols, np.nan)
+        with warnings.catch_warnings():
+            # columns without any value in the window have a NaN median
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            return np.nanmedian(sums['values'][row_start:row_end], axis=0)
+    # last value observed in the window
+    if row_end == row_start:
+        return np.full(n_cols, np.nan)
+    last_rows = sums['last_valid'][row_end - 1]
+    in_window = last_rows >= row_start
+    return np.where(in_window, sums['values'][np.maximum(last_rows, 0), np.arange(n_cols)], np.nan)
+
+def impute_nan_values(df, fill_values):
+    """ Replace the NaN values of all the columns at once
+    The columns without any value in the window (NaN fill value) are filled with zeros.
+    args:
+        df: pd.DataFrame, numeric dataframe
+        fill_values: np.array, fill value of each column
+    returns:
+        df: pd.DataFrame, dataframe without NaN values (df itself if it has no NaN values)"""
+    assert len(fill_values) == df.shape[1], 'One fill value per column must be provided'
+    values = df.values
+    mask = np.isnan(values)
+    if not mask.any():
+        return df
+    nan_counts = mask.sum(axis=0)
+    logger.warning(f'Imputing NaN values: {dict((col, int(n)) for col, n in zip(df.columns, nan_counts) if n)}')
+    fill_values = np.asarray(fill_values, dtype=values.dtype)
+    empty_columns = np.isnan(fill_values) & mask.any(axis=0)
+    if empty_columns.any():
+        logger.warning(f'No value in the window, filling with zeros: {list(df.columns[empty_columns])}')
+        fill_values = np.where(np.isnan(fill_values), 0, fill_values)
+    imputed = np.where(mask, fill_values[None, :], values)
+    return pd.DataFrame(imputed, index=df.index, columns=df.columns)
+
+def impute_train_window(df, end_training_timestamp, strategy='mean'):
+    """ Impute NaN values with statistics of the training rows only (index before end_training_timestamp)
+    The backtest imputes the windows of each day from the running sums of the dataset (see load_backtest_day),
+    so the frames built from them have no NaN value and are returned after a NaN check. The statistics are
+    only computed for the columns with NaN values (e.g. live submissions, see ingest_submissions).
+    args:
+        df: pd.DataFrame, training and test rows indexed by datetime
+        end_training_timestamp: pd.Timestamp, end of the training window
+        strategy: str, 'zero', 'mean', 'median' or 'last'
+    returns:
+        df: pd.DataFrame, dataframe without NaN values"""
+    if df.empty:
+        return df
+    nan_columns = np.isnan(df.values).any(axis=0)
+    if not nan_columns.any():
+        return df
+    row_end = int(df.index.searchsorted(end_training_timestamp, side='left'))
+    fill_values = np.zeros(df.shape[1])
+    fill_values[nan_columns] = window_statistics(build_imputation_sums(df.iloc[:row_end, nan_columns]), 0, row_end, strategy)
+    return impute_nan_values(df, fill_values)
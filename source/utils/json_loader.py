@@ -0,0 +1,133 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+FORECAST_SUFFIXES = ('forecast', 'confidence10', 'confidence90')
+VALUES_DTYPE = np.float32
+EPOCH_DTYPE = np.int64
+
+def is_schema_column(name, measured_col='measured'):
+    " Check whether a column is a measured or forecast column of the ELIA schema"
+    return name == measured_col or name.endswith(FORECAST_SUFFIXES)
+
+def region_filter(regions, offshore_filter='Offshore'):
+    " Mask of the rows kept by filter_offshore: the rows of the region and the rows without region (0)"
+    regions = np.asarray(regions, dtype=object)
+    return (regions == offshore_filter) | (regions == 0)
+
+def parse_month_file(file, offshore_filter='Offshore', columns=None, measured_col='measured'):
+    """ Parse a monthly ELIA json file into typed arrays sorted by time
+    The records are filtered by region as they are parsed, as filter_offshore: the records of the other region are never
+    turned into columns, and the kept records are cast column by column once.
+    args:
+        file: str, path of the json file (a list of records)
+        offshore_filter: str, value of the 'offshoreonshore' column to keep (with the rows without region)
+        columns: list, columns to keep (all measured and forecast columns if None)
+        measured_col: str, name of the measured column, negative values are clipped to 0
+    returns:
+        block: dict, 'datetime' int64 epoch ns array, 'offshoreonshore' int8 codes (0 for the region, 1 without region)
+               and one float32 array per column"""
+    assert file.endswith('.json'), 'File must be a json file'
+    with open(file) as handle:
+        records = json.load(handle)
+    assert isinstance(records, list), 'The json file must contain a list of records'
+    names = set().union(*records)
+    assert 'datetime' in names, "The json file must contain the 'datetime' column."
+    assert 'offshoreonshore' in names, "The json file must contain the 'offshoreonshore' column."
+    if columns is None:
+        columns = sorted(name for name in names if is_schema_column(name, measured_col))
+    keep = region_filter([record.get('offshoreonshore') for record in records], offshore_filter)
+    records = [record for record, kept in zip(records, keep) if kept]
+    epoch = pd.to_datetime([record['datetime'] for record in records], utc=True).asi8.astype(EPOCH_DTYPE)
+    order = np.argsort(epoch, kind='stable')
+    block = {'datetime': epoch[order],
+             'offshoreonshore': np.array([record['offshoreonshore'] != offshore_filter for record in records], dtype=np.int8)[order]}
+    for col in columns:
+        if col in names:
+            array = pd.to_numeric(pd.Series([record.get(col) for record in records], dtype=object), errors='coerce').to_numpy(dtype=np.float64).astype(VALUES_DTYPE)[order]
+        else:
+            array = np.full(len(epoch), np.nan, dtype=VALUES_DTYPE)
+        if col == measured_col:
+            array[array < 0] = 0
+        block[col] = array
+    return block
+
+def _merge_two_blocks(first, second, keys):
+    " Merge two blocks sorted by time, the rows of first come before the rows of second at equal times"
+    positions = np.searchsorted(first['datetime'], second['datetime'], side='right') + np.arange(len(second['datetime']))
+    from_first = np.ones(len(first['datetime']) + len(second['datetime']), dtype=bool)
+    from_first[positions] = False
+    merged = {}
+    for key in keys:
+        values = np.empty(len(from_first), dtype=first[key].dtype)
+        values[from_first], values[~from_first] = first[key], second[key]
+        merged[key] = values
+    return merged
+
+def merge_sorted_blocks(blocks, columns):
+    """ Merge blocks sorted by time into one block sorted by time
+    Disjoint blocks (the usual case for month files) are concatenated in order. Overlapping blocks
+    are merged pairwise in a k-way merge tree, O(n log k) without sorting the rows again.
+    args:
+        blocks: list, blocks returned by parse_month_file
+        columns: list, value columns of the blocks
+    returns:
+        block: dict, merged block"""
+    blocks = [block for block in blocks if len(block['datetime']) > 0]
+    keys = ['datetime'] + [key for key in ('offshoreonshore',) if blocks and all(key in block for block in blocks)] + list(columns)
+    if not blocks:
+        return {'datetime': np.array([], dtype=EPOCH_DTYPE), 'offshoreonshore': np.array([], dtype=np.int8), **{col: np.array([], dtype=VALUES_DTYPE) for col in columns}}
+    blocks = sorted(blocks, key=lambda block: block['datetime'][0])
+    if all(previous['datetime'][-1] <= following['datetime'][0] for previous, following in zip(blocks[:-1], blocks[1:])):
+        return {key: np.concatenate([block[key] for block in blocks]) for key in keys}
+    while len(blocks) > 1:
+        blocks = [_merge_two_blocks(blocks[k], blocks[k + 1], keys) if k + 1 < len(blocks) else blocks[k] for k in range(0, len(blocks), 2)]
+    return {key: blocks[0][key] for key in keys}
+
+def load_month_files(files, offshore_filter='Offshore', columns=None, measured_col='measured', max_workers=None):
+    """ Load the monthly ELIA json files in a process pool with an explicit dtype schema
+    args:
+        files: list, paths of the json files
+        offshore_filter: str, value of the 'offshoreonshore' column to keep (with the rows without region, as filter_offshore)
+        columns: list, columns to keep (all measured and forecast columns if None)
+        measured_col: str, name of the measured column
+        max_workers: int, number of worker processes (files are parsed in this process if 1)
+    returns:
+        df: pd.DataFrame, float32 columns and categorical 'offshoreonshore', indexed by UTC datetime"""
+    assert len(files) > 0, 'No files to process'
+    logger.info(f'Loading {len(files)} json files')
+    args = ([file, offshore_filter, columns, measured_col] for file in files)
+    if max_workers == 1:
+        blocks = [parse_month_file(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            blocks = list(executor.map(parse_month_file, *zip(*args)))
+    if columns is None:
+        columns = sorted({key for block in blocks for key in block if key not in ('datetime', 'offshoreonshore')})
+        blocks = [{**{col: np.full(len(block['datetime']), np.nan, dtype=VALUES_DTYPE) for col in columns}, **block} for block in blocks]
+    merged = merge_sorted_blocks(blocks, columns)
+    index = pd.DatetimeIndex(merged['datetime'].view('datetime64[ns]'), name='datetime').tz_localize('UTC')
+    df = pd.DataFrame({col: merged[col] for col in columns}, index=index, columns=columns)
+    df['offshoreonshore'] = pd.Categorical.from_codes(merged['offshoreonshore'], categories=[offshore_filter, 0])
+    return df
+
+def month_files(sim_params):
+    " Monthly json files of the simulation parameters (file_1, file_2, ...) in order"
+    keys = sorted((key for key in sim_params if key.startswith('file_')), key=lambda key: int(key.split('_')[1]))
+    return [sim_params[key] for key in keys]
+
+def read_month_files(files, columns, starting_period, ending_period, offshore_filter='Offshore', max_workers=None):
+    """ Read the monthly json files as read_csv_file reads the csv file
+    args:
+        files: list, paths of the json files
+        columns: list, columns to keep
+        starting_period: str, first timestamp
+        ending_period: str, last timestamp
+        offshore_filter: str, value of the 'offshoreonshore' column to keep
+        max_workers: int, number of worker processes
+    returns:
+        df: pd.DataFrame, float32 columns indexed by UTC datetime"""
+    df = load_month_files(files, offshore_filter, columns, max_workers=max_workers)[columns]
+    return df[df.index.to_series().between(pd.to_datetime(starting_period, utc=True), pd.to_datetime(ending_period, utc=True))]
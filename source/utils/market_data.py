@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+MARKET_QUANTILES = ('q50', 'q10', 'q90')
+
+def parse_market_column(name):
+    """ Split a market column name into seller, quantile and buyer resource
+    args:
+        name: str, column name, e.g. 's1_q50_b1r1'
+    returns:
+        seller: str, seller name, e.g. 's1'
+        quantile: str, quantile, e.g. 'q50'
+        buyer_resource_name: str, buyer resource, e.g. 'b1r1'"""
+    seller, quantile, buyer_resource_name = name.rsplit('_', 2)
+    return seller, quantile, buyer_resource_name
+
+class MarketData:
+    """ Predictions of the sellers of a market as a (time x seller x quantile) array with a registry of the sellers
+    The array is stored as (quantile x seller x time), the layout of the blocks of a dataframe: the frame of a quantile
+    is a view of its block built without matching column names, and each seller is a contiguous column. Sellers are added and removed in bulk, the arrays are
+    replaced and never modified in place so a market can be copied cheaply and shared (e.g. by the scenarios of a sweep).
+    The columns of the frames are named '{seller}_{quantile}_{buyer_resource_name}' as in the market dataframe."""
+    def __init__(self, index, buyer_resource_name='b1r1', quantiles=MARKET_QUANTILES):
+        self.index = index
+        self.buyer_resource_name = buyer_resource_name
+        self.quantiles = tuple(quantiles)
+        self.sellers = []
+        self.registry = {}
+        self._values = np.empty((len(self.quantiles), 0, len(index)))
+
+    @property
+    def values(self):
+        " (time x seller x quantile) view of the predictions"
+        return self._values.transpose(2, 1, 0)
+
+    @property
+    def columns(self):
+        " Column names of the market dataframe, quantile by quantile"
+        return [name for quantile in self.quantiles for name in self.column_names(quantile)]
+
+    def copy(self):
+        " Market sharing the predictions of this one, adding or removing sellers of the copy leaves this one unchanged"
+        market = MarketData(self.index, self.buyer_resource_name, self.quantiles)
+        market.sellers, market.registry, market._values = list(self.sellers), dict(self.registry), self._values
+        return market
+
+    def add_sellers(self, sellers, values):
+        """ Add sellers with their predictions
+        args:
+            sellers: list, names of the new sellers
+            values: np.array, (time x seller x quantile) predictions of the new sellers
+        returns:
+            market: MarketData, the market itself"""
+        sellers = list(sellers)
+        values = np.asarray(values, dtype=np.float64)
+        assert values.shape == (len(self.index), len(sellers), len(self.quantiles)), 'values must be a (time x seller x quantile) array of the new sellers'
+        assert len(set(sellers)) == len(sellers) and not set(sellers) & set(self.registry), 'The seller names must be unique'
+        self._values = np.concatenate([self._values, values.transpose(2, 1, 0)], axis=1)
+        self.registry.update((seller, len(self.sellers) + k) for k, seller in enumerate(sellers))
+        self.sellers.extend(sellers)
+        return self
+
+    def remove_sellers(self, sellers):
+        """ Remove sellers from the market
+        args:
+            sellers: list, names of the sellers to remove
+        returns:
+            market: MarketData, the market itself"""
+        removed = set(sellers)
+        assert removed <= set(self.registry), f'Unknown sellers: {sorted(removed - set(self.registry))}'
+        self.sellers = [seller for seller in self.sellers if seller not in removed]
+        self._values = self._values[:, [self.registry[seller] for seller in self.sellers], :]
+        self.registry = {seller: k for k, seller in enumerate(self.sellers)}
+        return self
+
+    def seller_values(self, seller):
+        " (time x quantile) predictions of a seller"
+        return self._values[:, self.registry[seller], :].T
+
+    def column_names(self, quantile):
+        " Column names of the sellers for a quantile"
+        return [f'{seller}_{quantile}_{self.buyer_resource_name}' for seller in self.sellers]
+
+    def quantile_frame(self, quantile):
+        " (time x seller) dataframe of the predictions of a quantile, a view of the market not to be modified (empty if there is no seller)"
+        if not self.sellers:
+            return pd.DataFrame()
+        return pd.DataFrame(self._values[self.quantiles.index(quantile)].T, index=self.index, columns=self.column_names(quantile), copy=False)
+
+    def to_dataframe(self):
+        " Market dataframe with the columns of the sellers quantile by quantile"
+        n_quantiles, n_sellers, n_rows = self._values.shape
+        return pd.DataFrame(self._values.reshape(n_quantiles * n_sellers, n_rows).T, index=self.index, columns=self.columns)
+
+    @classmethod
+    def from_values(cls, index, sellers, values, buyer_resource_name='b1r1', quantiles=MARKET_QUANTILES):
+        """ Market wrapping a (quantile x seller x time) array without copying it, e.g. an array in shared memory
+        args:
+            index: pd.DatetimeIndex, time index of the predictions
+            sellers: list, names of the sellers
+            values: np.array, (quantile x seller x time) predictions, the layout of the market
+            buyer_resource_name: str, buyer resource of the predictions
+            quantiles: tuple, quantiles of the market
+        returns:
+            market: MarketData, market"""
+        market = cls(index, buyer_resource_name, quantiles)
+        assert values.shape == (len(market.quantiles), len(sellers), len(index)), 'values must be a (quantile x seller x time) array'
+        market.sellers, market.registry, market._values = list(sellers), {seller: k for k, seller in enumerate(sellers)}, values
+        return market
+
+    @classmethod
+    def from_dataframe(cls, df_market, quantiles=MARKET_QUANTILES):
+        """ Market of a market dataframe, the column names are parsed once (missing quantiles of a seller are NaN)
+        args:
+            df_market: pd.DataFrame, market dataframe with columns '{seller}_{quantile}_{buyer_resource_name}'
+            quantiles: tuple, quantiles of the market
+        returns:
+            market: MarketData, market"""
+        parsed = [parse_market_column(name) for name in df_market.columns]
+        buyer_resource_names = {buyer_resource_name for _, _, buyer_resource_name in parsed}
+        assert len(buyer_resource_names) <= 1, 'The market dataframe must have a single buyer resource'
+        sellers = list(dict.fromkeys(seller for seller, _, _ in parsed))
+        positions = {seller: k for k, seller in enumerate(sellers)}
+        values = np.full((len(df_market), len(sellers), len(quantiles)), np.nan)
+        for column, (seller, quantile, _) in enumerate(parsed):
+            values[:, positions[seller], quantiles.index(quantile)] = df_market.iloc[:, column].values
+        market = cls(df_market.index, buyer_resource_names.pop() if buyer_resource_names else 'b1r1', quantiles)
+        return market.add_sellers(sellers, values)
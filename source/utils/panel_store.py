@@ -0,0 +1,127 @@
+import os
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from loguru import logger
+from source.utils.generate_timestamp import to_utc_index
+from source.utils.time_grid import build_time_grid, grid_rows_between
+
+PANEL_FILE = 'panel.bin'
+INDEX_FILE = 'index.bin'
+META_FILE = 'panel.json'
+PANEL_DTYPE = 'float32'
+COLUMN_KINDS = ('forecast', 'confidence10', 'confidence90')
+
+def parse_column_name(name, measured_col='measured'):
+    """ Split an ELIA column name into forecaster and kind
+    args:
+        name: str, column name, e.g. 'dayaheadconfidence10'
+        measured_col: str, name of the measured column
+    returns:
+        forecaster: str, forecaster name, e.g. 'dayahead' (None for the measured column)
+        kind: str, 'measured', 'forecast', 'confidence10' or 'confidence90' (None if unknown)"""
+    if name == measured_col:
+        return None, 'measured'
+    for kind in COLUMN_KINDS:
+        if name.endswith(kind) and len(name) > len(kind):
+            return name[:-len(kind)], kind
+    return None, None
+
+def build_column_registry(columns, measured_col='measured'):
+    """ Registry of the panel columns by forecaster and kind
+    args:
+        columns: list, column names of the panel
+        measured_col: str, name of the measured column
+    returns:
+        registry: dict, {'measured': position, 'forecasters': {forecaster: {kind: position}}}"""
+    registry = {'measured': None, 'forecasters': {}}
+    for position, name in enumerate(columns):
+        forecaster, kind = parse_column_name(name, measured_col)
+        if kind == 'measured':
+            registry['measured'] = position
+        elif kind is not None:
+            registry['forecasters'].setdefault(forecaster, {})[kind] = position
+    return registry
+
+def create_panel_store(df, panel_dir, measured_col='measured'):
+    """ Write a dataframe as a contiguous (time x column) float32 panel in a memory-mappable file
+    args:
+        df: pd.DataFrame, numeric dataframe indexed by a sorted datetime index
+        panel_dir: str or Path, directory of the panel store
+        measured_col: str, name of the measured column
+    returns:
+        panel_dir: Path, directory of the panel store"""
+    assert isinstance(df, pd.DataFrame), 'df must be a DataFrame'
+    assert pd.api.types.is_datetime64_any_dtype(df.index), 'The df index must be a datetime type.'
+    panel_dir = Path(panel_dir)
+    panel_dir.mkdir(parents=True, exist_ok=True)
+    values = np.memmap(panel_dir / (PANEL_FILE + '.tmp'), dtype=PANEL_DTYPE, mode='w+', shape=(len(df), len(df.columns)))
+    values[:] = df.values
+    values.flush()
+    del values
+    index = to_utc_index(df.index)
+    index.asi8.tofile(panel_dir / (INDEX_FILE + '.tmp'))
+    meta = {'columns': list(df.columns), 'shape': [len(df), len(df.columns)], 'dtype': PANEL_DTYPE,
+            'registry': build_column_registry(list(df.columns), measured_col)}
+    with open(panel_dir / (META_FILE + '.tmp'), 'w') as handle:
+        json.dump(meta, handle)
+    # the metadata is renamed last, a panel with metadata is complete
+    os.replace(panel_dir / (PANEL_FILE + '.tmp'), panel_dir / PANEL_FILE)
+    os.replace(panel_dir / (INDEX_FILE + '.tmp'), panel_dir / INDEX_FILE)
+    os.replace(panel_dir / (META_FILE + '.tmp'), panel_dir / META_FILE)
+    logger.info(f'Panel store of shape {meta["shape"]} written to {panel_dir}')
+    return panel_dir
+
+def open_panel_store(panel_dir):
+    """ Open a panel store read-only, the panel is memory mapped and shared by all the processes opening it
+    args:
+        panel_dir: str or Path, directory of the panel store
+    returns:
+        store: dict, panel store
+            values: np.memmap, (time x column) float32 panel
+            index: pd.DatetimeIndex, UTC index of the panel
+            columns: list, column names
+            registry: dict, column registry by forecaster and kind
+            grid: dict, time grid of the index"""
+    panel_dir = Path(panel_dir)
+    with open(panel_dir / META_FILE) as handle:
+        meta = json.load(handle)
+    n_rows, n_cols = meta['shape']
+    values = np.memmap(panel_dir / PANEL_FILE, dtype=meta['dtype'], mode='r', shape=(n_rows, n_cols)) if n_rows else np.zeros((0, n_cols), dtype=meta['dtype'])
+    epoch = np.fromfile(panel_dir / INDEX_FILE, dtype=np.int64)
+    index = pd.DatetimeIndex(epoch.view('datetime64[ns]'), name='datetime').tz_localize('UTC')
+    return {'values': values, 'index': index, 'columns': meta['columns'], 'registry': meta['registry'], 'grid': build_time_grid(index)}
+
+def panel_columns(store, kind, forecasters=None):
+    """ Column names of a kind ('forecast', 'confidence10', 'confidence90') from the registry
+    args:
+        store: dict, panel store
+        kind: str, kind of the columns
+        forecasters: list, forecasters to select (all forecasters if None)
+    returns:
+        columns: list, column names"""
+    assert kind in COLUMN_KINDS, f'kind must be one of {COLUMN_KINDS}'
+    registry = store['registry']['forecasters']
+    forecasters = list(registry) if forecasters is None else forecasters
+    return [store['columns'][registry[name][kind]] for name in forecasters if kind in registry[name]]
+
+def panel_window(store, start, end, columns=None):
+    """ Window [start, end) of the panel as a dataframe, see filter_data
+    The dataframe is a view of the memory mapped panel when all the columns are selected.
+    args:
+        store: dict, panel store
+        start: pd.Timestamp, start of the window
+        end: pd.Timestamp, end of the window (the row at end is excluded)
+        columns: list, columns to select (all columns if None)
+    returns:
+        df: pd.DataFrame, window of the panel indexed by datetime"""
+    row_start, row_end = grid_rows_between(store['grid'], start, end)
+    row_end = max(row_start, row_end - 1)
+    values = store['values'][row_start:row_end]
+    if columns is not None:
+        positions = [store['columns'].index(col) for col in columns]
+        values = values[:, positions]
+    else:
+        columns = store['columns']
+    return pd.DataFrame(values, index=store['index'][row_start:row_end], columns=columns, copy=False)
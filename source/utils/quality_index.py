@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from loguru import logger
+from source.utils.generate_timestamp import to_utc_timestamp, to_utc_index
+from source.utils.panel_store import build_column_registry
+
+DAY_NS = pd.Timedelta(days=1).value
+REPAIRABLE_CHECKS = ('test_slots', 'test_nans')
+
+def build_quality_index(df, measured_col='measured', step='15min', local_tz='Europe/Brussels'):
+    """ Per-day data quality index of a dataset, built once at ingest time
+    args:
+        df: pd.DataFrame, dataset indexed by datetime (before any NaN replacement)
+        measured_col: str, name of the measured column
+        step: str or pd.Timedelta, resolution of the dataset
+        local_tz: str, time zone of the market day (its length changes on DST days)
+    returns:
+        quality_index: pd.DataFrame, one row per UTC day
+            n_slots: int, number of rows of the day
+            expected_slots: int, number of slots of a full UTC day
+            local_day_slots: int, number of slots of the local day with the same date (92 or 100 on DST days)
+            nans_<measured_col>: int, NaN values of the measured column
+            nans_<forecaster>: int, NaN values of the forecaster columns (forecast and confidence columns)
+        the number of columns of each forecaster is kept in quality_index.attrs['forecaster_columns']"""
+    assert pd.api.types.is_datetime64_any_dtype(df.index), 'The df index must be a datetime type.'
+    step_ns = pd.Timedelta(step).value
+    index = to_utc_index(df.index)
+    if len(index) == 0:
+        return pd.DataFrame(columns=['n_slots', 'expected_slots', 'local_day_slots'], index=pd.DatetimeIndex([], tz='UTC', name='date'))
+    day = index.asi8 // DAY_NS
+    first_day = day.min()
+    day = day - first_day
+    n_days = int(day.max()) + 1
+    days = pd.DatetimeIndex((first_day + np.arange(n_days)) * DAY_NS, tz='UTC', name='date')
+    local_days = days.tz_localize(None).tz_localize(local_tz)
+    next_local_days = (days.tz_localize(None) + pd.Timedelta(days=1)).tz_localize(local_tz)
+    local_day_slots = (next_local_days.asi8 - local_days.asi8) // step_ns
+    quality_index = pd.DataFrame({'n_slots': np.bincount(day, minlength=n_days),
+                                    'expected_slots': np.full(n_days, DAY_NS // step_ns),
+                                    'local_day_slots': local_day_slots}, index=days)
+    # NaN counts of all the columns at once, then summed by forecaster
+    values = df.select_dtypes(include='number')
+    nans = np.zeros((n_days, values.shape[1]), dtype=np.int64)
+    np.add.at(nans, day, np.isnan(values.values.astype(np.float64)))
+    registry = build_column_registry(list(values.columns), measured_col)
+    if registry['measured'] is not None:
+        quality_index[f'nans_{measured_col}'] = nans[:, registry['measured']]
+    for forecaster, positions in registry['forecasters'].items():
+        quality_index[f'nans_{forecaster}'] = nans[:, list(positions.values())].sum(axis=1)
+    quality_index.attrs['forecaster_columns'] = {forecaster: len(positions) for forecaster, positions in registry['forecasters'].items()}
+    return quality_index
+
+def window_quality(quality_index, start, end):
+    " Sum of the quality index over the days in [start, end)"
+    start, end = to_utc_timestamp(start).floor('D'), to_utc_timestamp(end)
+    return quality_index[(quality_index.index >= start) & (quality_index.index < end)].sum()
+
+def day_eligibility(quality_index, start_training, end_training, start_prediction, end_prediction, measured_col='measured', check_measured_nans=True):
+    """ Check upfront whether a backtest day can run through the ensemble pipeline
+    args:
+        quality_index: pd.DataFrame, per-day quality index (see build_quality_index)
+        start_training: pd.Timestamp, start of the training window
+        end_training: pd.Timestamp, end of the training window
+        start_prediction: pd.Timestamp, start of the test day
+        end_prediction: pd.Timestamp, end of the test day
+        measured_col: str, name of the measured column
+        check_measured_nans: bool, flag the NaN measurements of the test day (False if they are imputed)
+    returns:
+        eligible: bool, True if the day can run as is
+        reasons: dict, failed checks and their message (the checks in REPAIRABLE_CHECKS can be repaired with repair_window)"""
+    reasons = {}
+    test = window_quality(quality_index, start_prediction, end_prediction)
+    n_test_days = len(pd.date_range(to_utc_timestamp(start_prediction), to_utc_timestamp(end_prediction), freq='D', inclusive='left'))
+    expected_test_slots = int(quality_index['expected_slots'].iloc[0]) * n_test_days if len(quality_index) else 0
+    if test.get('n_slots', 0) != expected_test_slots:
+        reasons['test_slots'] = f'test day has {int(test.get("n_slots", 0))} of {expected_test_slots} slots'
+    if check_measured_nans and test.get(f'nans_{measured_col}', 0) > 0:
+        reasons['test_nans'] = f'test day has {int(test[f"nans_{measured_col}"])} NaN measurements'
+    train = window_quality(quality_index, start_training, end_training)
+    train_slots = int(train.get('n_slots', 0))
+    if train_slots == 0:
+        reasons['train_slots'] = 'training window is empty'
+    for forecaster, n_columns in quality_index.attrs.get('forecaster_columns', {}).items():
+        # a forecaster without any value in the training window cannot be imputed
+        if train_slots and train[f'nans_{forecaster}'] >= train_slots * n_columns:
+            reasons[f'train_{forecaster}'] = f'{forecaster} has no value in the training window'
+    return len(reasons) == 0, reasons
+
+def repair_window(df, start, end, step='15min'):
+    """ Reindex a window on the full grid [start, end) and fill the missing slots and NaN values by time interpolation
+    args:
+        df: pd.DataFrame, window of the dataset indexed by UTC datetime
+        start: pd.Timestamp, start of the window
+        end: pd.Timestamp, end of the window (excluded)
+        step: str or pd.Timedelta, resolution of the dataset
+    returns:
+        df: pd.DataFrame, repaired window"""
+    full_index = pd.date_range(to_utc_timestamp(start), to_utc_timestamp(end), freq=step, inclusive='left', name=df.index.name)
+    n_missing = len(full_index.difference(df.index))
+    logger.warning(f'Repairing window from {full_index[0]}: {n_missing} missing slots, {int(df.isna().sum().sum())} NaN values')
+    df = df.reindex(full_index).astype(np.float64)
+    return df.interpolate(method='time', limit_direction='both')
@@ -1,8 +1,15 @@
 import pandas as pd
 import numpy as np
+from loguru import logger
+from source.utils.market_data import MarketData
 
 def extract_quantile_columns(df, quantile):
-    """Extract columns containing the specified quantile."""
+    """Extract columns containing the specified quantile, the quantile frame of the registry for a MarketData."""
+    if isinstance(df, MarketData):
+        if quantile in df.quantiles and df.sellers:
+            return df.quantile_frame(quantile)
+        logger.info(f"No columns found for {quantile}")
+        return pd.DataFrame()
     columns = [name for name in df.columns if quantile in name]
     if columns:
         return df[columns]
@@ -1,29 +1,99 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import pickle
 import os
 from loguru import logger
 
-def load_or_initialize_results(ens_params, buyer_resource_name):
-    " Load or initialize results dictionary"
-    file_info = ens_params['save_info'] + buyer_resource_name + '_' + ens_params['save_file']
+def previous_day_pickle_file(ens_params, buyer_resource_name):
+    " Path of the previous day pickle file of a buyer"
+    return ens_params['save_info'] + buyer_resource_name + '_' + ens_params['save_file']
+
+def atomic_pickle_dump(obj, filename):
+    " Pickle an object to a temporary file and move it in place, a crash never leaves a truncated file"
+    tmp_filename = f'{filename}.tmp'
+    with open(tmp_filename, 'wb') as handle:
+        pickle.dump(obj, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_filename, filename)
+
+class SessionState:
+    """ In-process state of a buyer handed from one simulated day to the next and from the ensemble to the contributions
+    The state is the results dictionary of the previous day (iteration, best hyperparameters and models of the contributions).
+    If persist is True, each new state is also written to the previous day pickle file by a background thread,
+    the results dictionary must not be modified after it is handed to update."""
+    def __init__(self, file_info, persist=False, results=None):
+        self.file_info = file_info
+        self.persist = persist
+        self.results = results
+        self._executor = ThreadPoolExecutor(max_workers=1) if persist else None
+        self._pending = None
+
+    def update(self, results):
+        " Replace the state by the results of the day and write them to the pickle file in the background"
+        self.results = results
+        if self.persist:
+            self.flush()
+            self._pending = self._executor.submit(atomic_pickle_dump, results, self.file_info)
+
+    def reset(self):
+        " Forget the state, the next day starts from the first iteration"
+        self.flush()
+        self.results = None
+        delete_previous_day_pickle(self.file_info)
+
+    def flush(self):
+        " Wait for the pending write of the pickle file"
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def close(self):
+        " Wait for the pending write and stop the background thread"
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+def load_previous_day_results(ens_params, buyer_resource_name, session_state=None):
+    """ Results dictionary of the previous day, from the in-process state if one is given
+    returns:
+        file_info: str, path of the previous day pickle file
+        results_challenge_dict: dict, results of the previous day (None on the first day)"""
+    file_info = previous_day_pickle_file(ens_params, buyer_resource_name)
     file_path = Path(file_info)
-    if file_path.is_file():
+    if session_state is not None and session_state.results is not None:
+        results_challenge_dict = session_state.results
+    elif session_state is None and file_path.is_file():
         with open(file_info, 'rb') as handle:
             results_challenge_dict = pickle.load(handle)
+    else:
+        results_challenge_dict = None
+    return file_info, results_challenge_dict
+
+def initialize_results(ens_params, results_challenge_dict):
+    " Iteration and best hyperparameters of the day from the results of the previous day (None on the first day)"
+    if results_challenge_dict is not None:
         iteration = results_challenge_dict['iteration'] + 1
-        best_results = results_challenge_dict['wind_power']['best_results']
-        best_results_var = results_challenge_dict['wind_power_variability']['best_results']
+        # copies, the results of the previous day may still be written in the background
+        best_results = dict(results_challenge_dict['wind_power']['best_results'])
+        best_results_var = dict(results_challenge_dict['wind_power_variability']['best_results'])
     else:
-        iteration = 0
+        # a backtest block starts at the iteration of its first day
+        iteration = ens_params.get('first_iteration', 0)
         best_results = {}
         best_results_var = {}
+    return iteration, best_results, best_results_var
+
+def load_or_initialize_results(ens_params, buyer_resource_name, session_state=None):
+    " Load or initialize results dictionary, from the in-process state if one is given"
+    file_info, results_challenge_dict = load_previous_day_results(ens_params, buyer_resource_name, session_state)
+    iteration, best_results, best_results_var = initialize_results(ens_params, results_challenge_dict)
     return file_info, iteration, best_results, best_results_var
 
 
 # create function to remove previous day pickle file
-def delete_previous_day_pickle():
+def delete_previous_day_pickle(filename='./info_model/b1r1_previous_day.pickle'):
     "Delete previous day pickle file"
-    filename = './info_model/b1r1_previous_day.pickle'
     try:
         os.remove(filename)
         logger.opt(colors = True).warning('previous day pickle file removed')
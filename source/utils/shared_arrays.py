@@ -0,0 +1,41 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+def share_arrays(arrays):
+    """ Copy arrays into shared memory blocks that other processes can attach without copying
+    args:
+        arrays: dict, numpy arrays by name
+    returns:
+        blocks: list, shared memory blocks (to close and unlink once the processes are done)
+        spec: dict, name, shape and dtype of the block of each array, picklable"""
+    blocks, spec = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        spec[name] = {'block': block.name, 'shape': array.shape, 'dtype': array.dtype.str}
+    return blocks, spec
+
+def attach_arrays(spec):
+    """ Attach the arrays shared by share_arrays as read-only views
+    args:
+        spec: dict, specification returned by share_arrays
+    returns:
+        blocks: list, attached shared memory blocks (to keep alive as long as the arrays are used)
+        arrays: dict, read-only numpy arrays by name"""
+    blocks, arrays = [], {}
+    for name, array_spec in spec.items():
+        block = shared_memory.SharedMemory(name=array_spec['block'])
+        array = np.ndarray(array_spec['shape'], dtype=np.dtype(array_spec['dtype']), buffer=block.buf)
+        array.flags.writeable = False
+        blocks.append(block)
+        arrays[name] = array
+    return blocks, arrays
+
+def release_arrays(blocks, unlink=False):
+    " Close the shared memory blocks, and free them if unlink is True (by the process that created them)"
+    for block in blocks:
+        block.close()
+        if unlink:
+            block.unlink()
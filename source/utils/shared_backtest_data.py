@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from source.utils.time_grid import build_time_grid
+from source.utils.panel_store import open_panel_store
+from source.utils.market_data import MarketData
+from source.utils.shared_arrays import share_arrays, attach_arrays
+
+# backtest data of a worker process, attached once by the pool initializer
+_WORKER_DATA = None
+_WORKER_BLOCKS = []
+
+def share_backtest_data(data):
+    """ Put the arrays of the backtest data in shared memory, with the base submissions of the test days if any
+    args:
+        data: dict, backtest data (see prepare_backtest_data)
+    returns:
+        blocks: list, shared memory blocks
+        spec: dict, picklable specification to rebuild the backtest data with attach_backtest_data"""
+    df = data['df_processed']
+    arrays = {'values': df.values.astype(np.float64), 'index': df.index.asi8}
+    if data['imputation_sums'] is not None:
+        arrays.update({f'imputation_{name}': array for name, array in data['imputation_sums'].items()})
+    base_submissions = data.get('base_submissions')
+    if base_submissions:
+        # the (quantile x seller x time) arrays of the days one after the other along the time axis
+        arrays['base_values'] = np.concatenate([market.values.transpose(2, 1, 0) for market in base_submissions.values()], axis=2)
+        arrays['base_index'] = np.concatenate([market.index.asi8 for market in base_submissions.values()])
+    blocks, arrays_spec = share_arrays(arrays)
+    spec = {'arrays': arrays_spec, 'columns': list(df.columns), 'index_name': df.index.name,
+            'index_tz': str(df.index.tz) if df.index.tz is not None else None,
+            'quality_index': data['quality_index'], 'panel_store': data['panel_store'] is not None}
+    if base_submissions:
+        first = next(iter(base_submissions.values()))
+        spec['base_submissions'] = {'keys': list(base_submissions), 'lengths': [len(market.index) for market in base_submissions.values()],
+                                    'sellers': first.sellers, 'buyer_resource_name': first.buyer_resource_name, 'quantiles': first.quantiles}
+    return blocks, spec
+
+def _shared_index(epoch, spec):
+    " Datetime index of epoch nanoseconds in shared memory, with the name and time zone of the dataset index"
+    index = pd.DatetimeIndex(epoch.view('datetime64[ns]'), name=spec['index_name'])
+    return index.tz_localize('UTC').tz_convert(spec['index_tz']) if spec['index_tz'] is not None else index
+
+def attach_backtest_data(spec, panel_dir=None):
+    """ Rebuild the backtest data from the arrays in shared memory, without copying them
+    args:
+        spec: dict, specification returned by share_backtest_data
+        panel_dir: str, directory of the panel store (if the backtest data uses one)
+    returns:
+        blocks: list, attached shared memory blocks
+        data: dict, backtest data with read-only arrays"""
+    blocks, arrays = attach_arrays(spec['arrays'])
+    index = _shared_index(arrays['index'], spec)
+    df_processed = pd.DataFrame(arrays['values'], index=index, columns=spec['columns'], copy=False)
+    imputation_sums = {name[len('imputation_'):]: array for name, array in arrays.items() if name.startswith('imputation_')} or None
+    data = {'df_processed': df_processed, 'grid': build_time_grid(df_processed.index), 'quality_index': spec['quality_index'],
+            'imputation_sums': imputation_sums, 'panel_store': open_panel_store(panel_dir) if spec['panel_store'] else None}
+    if 'base_submissions' in spec:
+        base_spec, base_submissions = spec['base_submissions'], {}
+        ends = np.cumsum(base_spec['lengths'])
+        for key, end, length in zip(base_spec['keys'], ends, base_spec['lengths']):
+            base_submissions[tuple(key)] = MarketData.from_values(_shared_index(arrays['base_index'][end - length:end], spec), base_spec['sellers'],
+                                                                  arrays['base_values'][:, :, end - length:end],
+                                                                  base_spec['buyer_resource_name'], base_spec['quantiles'])
+        data['base_submissions'] = base_submissions
+    return blocks, data
+
+def init_worker(spec, panel_dir):
+    " Attach the backtest data shared by the parent process once per worker process"
+    global _WORKER_DATA, _WORKER_BLOCKS
+    _WORKER_BLOCKS, _WORKER_DATA = attach_backtest_data(spec, panel_dir)
+
+def worker_data():
+    " Backtest data attached by init_worker in the worker process"
+    return _WORKER_DATA
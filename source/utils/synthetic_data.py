@@ -0,0 +1,146 @@
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from loguru import logger
+
+# forecast horizons of the ELIA forecasters: (standard deviation, autocorrelation per quarter hour) of the wind speed error in m/s
+FORECASTER_STYLES = {'mostrecent': (0.6, 0.95),
+                     'dayahead11h': (1.1, 0.98),
+                     'dayahead': (1.3, 0.98),
+                     'weekahead': (2.6, 0.995)}
+Z_QUANTILE_90 = 1.2815515655446004  # standard normal quantile 0.9
+
+def power_curve(wind_speed, capacity, cut_in=3.0, rated=12.0):
+    " Non decreasing power curve of a wind farm, cubic between the cut-in and the rated wind speed"
+    ratio = np.clip((np.asarray(wind_speed) - cut_in) / (rated - cut_in), 0.0, 1.0)
+    return capacity * ratio ** 3
+
+def ar1_process(noise, phi, initial=0.0):
+    """ AR(1) process x[t] = phi * x[t-1] + noise[t] along the first axis, vectorized with lfilter
+    args:
+        noise: np.array, innovations (rows are time steps)
+        phi: float, autocorrelation
+        initial: float or np.array, value before the first step (one per column)
+    returns:
+        process: np.array, process
+        last: np.array, last value (initial value of the next chunk)"""
+    initial = np.broadcast_to(np.asarray(initial, dtype=np.float64), noise.shape[1:])
+    process, _ = lfilter([1.0], [1.0, -phi], noise, axis=0, zi=phi * initial[None])
+    return process, process[-1]
+
+def _ar1_columns(noise, phis, initial):
+    " AR(1) processes with one autocorrelation per column, grouped by autocorrelation"
+    process, last = np.empty_like(noise), np.empty(noise.shape[1])
+    for phi in np.unique(phis):
+        columns = phis == phi
+        process[:, columns], last[columns] = ar1_process(noise[:, columns], phi, initial[columns])
+    return process, last
+
+def synthetic_sellers(n_sellers, seed=0):
+    """ Forecast style of additional sellers, each one a random horizon with its own skill and bias
+    args:
+        n_sellers: int, number of additional sellers
+        seed: int, random seed
+    returns:
+        sellers: dict, name: (standard deviation, autocorrelation, bias) of the wind speed error"""
+    rng = np.random.default_rng([seed, 1])
+    styles = list(FORECASTER_STYLES.values())
+    sellers = {}
+    for k in range(n_sellers):
+        sigma, phi = styles[rng.integers(len(styles))]
+        sellers[f'seller{k + 1:03d}'] = (sigma * rng.uniform(0.7, 1.5), phi, rng.normal(0.0, 0.3))
+    return sellers
+
+def iter_synthetic_elia(start, end, n_sellers=0, capacity=2262.0, regions=('Offshore',), missing_rate=0.0, seed=0, chunk_days=31):
+    """ Generate an ELIA-like dataset chunk by chunk, the peak memory depends on chunk_days and not on the horizon
+    The measured power follows an AR(1) wind speed with seasonal and diurnal cycles through a power curve.
+    Each forecaster adds an AR(1) wind speed error whose size grows with the horizon, its confidence10 and confidence90
+    columns are the power of the forecast wind speed -/+ the 0.9 normal quantile of the error.
+    Every series has its own random stream, so the values do not depend on chunk_days.
+    args:
+        start: str or pd.Timestamp, first timestamp (UTC)
+        end: str or pd.Timestamp, last timestamp (UTC, inclusive)
+        n_sellers: int, number of sellers added to the mostrecent, dayahead11h, dayahead and weekahead forecasters
+        capacity: float, monitored capacity in MW
+        regions: tuple, values of the 'offshoreonshore' column, one independent wind farm per region
+        missing_rate: float, fraction of missing forecaster values
+        seed: int, random seed
+        chunk_days: int, number of days per chunk
+    yields:
+        chunk: pd.DataFrame, rows of the chunk with the datetime, offshoreonshore, monitoredcapacity, measured and forecaster columns"""
+    assert 0.0 <= missing_rate < 1.0, 'missing_rate must be in [0, 1)'
+    assert chunk_days > 0, 'chunk_days must be positive'
+    index = pd.date_range(pd.to_datetime(start, utc=True), pd.to_datetime(end, utc=True), freq='15min', name='datetime')
+    forecasters = {name: (sigma, phi, 0.0) for name, (sigma, phi) in FORECASTER_STYLES.items()}
+    forecasters.update(synthetic_sellers(n_sellers, seed))
+    sigmas, phis, biases = (np.array(values) for values in zip(*forecasters.values()))
+    # one random stream per region and series: wind, forecasters errors and missing values
+    streams = {region: [np.random.default_rng([seed, 2, r, k]) for k in range(2 * len(forecasters) + 1)] for r, region in enumerate(regions)}
+    states = {region: (0.0, np.zeros(len(forecasters))) for region in regions}
+    chunk_size = chunk_days * 96
+    for chunk_start in range(0, len(index), chunk_size):
+        chunk_index = index[chunk_start:chunk_start + chunk_size]
+        n = len(chunk_index)
+        day_of_year = chunk_index.dayofyear.values
+        hour = chunk_index.hour.values + chunk_index.minute.values / 60
+        # windier in winter and in the afternoon
+        mean_speed = 8.5 + 2.0 * np.cos(2 * np.pi * (day_of_year - 15) / 365.25) + 0.8 * np.sin(2 * np.pi * (hour - 9) / 24)
+        frames = []
+        for region in regions:
+            rngs = streams[region]
+            wind_state, error_state = states[region]
+            wind_anomaly, wind_state = ar1_process(rngs[0].normal(0.0, 0.35, size=n), 0.995, wind_state)
+            wind_speed = np.clip(mean_speed + wind_anomaly, 0.0, None)
+            error_noise = np.column_stack([rngs[1 + k].standard_normal(n) for k in range(len(forecasters))])
+            # innovations scaled to the stationary standard deviation of each error
+            error, error_state = _ar1_columns(error_noise * sigmas * np.sqrt(1 - phis ** 2), phis, error_state)
+            forecast_speed = wind_speed[:, None] + error + biases
+            frame = {'datetime': chunk_index, 'offshoreonshore': region, 'monitoredcapacity': capacity,
+                     'measured': power_curve(wind_speed, capacity)}
+            for k, name in enumerate(forecasters):
+                missing = rngs[1 + len(forecasters) + k].random(n) < missing_rate
+                for column, shift in ((f'{name}forecast', 0.0), (f'{name}confidence10', -Z_QUANTILE_90), (f'{name}confidence90', Z_QUANTILE_90)):
+                    values = power_curve(forecast_speed[:, k] + shift * sigmas[k], capacity)
+                    values[missing] = np.nan
+                    frame[column] = values
+            frames.append(pd.DataFrame(frame))
+            states[region] = (wind_state, error_state)
+        yield pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+def generate_synthetic_elia(start, end, **kwargs):
+    """ Generate an ELIA-like dataset in memory, see iter_synthetic_elia
+    returns:
+        df: pd.DataFrame, dataset with the columns of the ELIA csv file"""
+    return pd.concat(iter_synthetic_elia(start, end, **kwargs), ignore_index=True)
+
+def write_synthetic_elia_csv(csv_filename, start, end, **kwargs):
+    """ Write an ELIA-like csv file readable by read_csv_file chunk by chunk, see iter_synthetic_elia
+    args:
+        csv_filename: str, path of the csv file
+        start: str or pd.Timestamp, first timestamp (UTC)
+        end: str or pd.Timestamp, last timestamp (UTC, inclusive)
+    returns:
+        columns: list, measured and forecaster columns of the file (list_columns of the simulation parameters)"""
+    Path(csv_filename).parent.mkdir(parents=True, exist_ok=True)
+    length = 0
+    for n_chunk, chunk in enumerate(iter_synthetic_elia(start, end, **kwargs)):
+        chunk.to_csv(csv_filename, mode='w' if n_chunk == 0 else 'a', header=n_chunk == 0, index=False, float_format='%.3f', date_format='%Y-%m-%dT%H:%M:%S%z')
+        length += len(chunk)
+    logger.info(f'Wrote {length} synthetic rows to {csv_filename}')
+    return [col for col in chunk.columns if col not in ('datetime', 'offshoreonshore', 'monitoredcapacity')]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Synthetic ELIA-like dataset for scale and load testing')
+    parser.add_argument('--output', required=True, help='path of the csv file')
+    parser.add_argument('--start', default='2021-01-01')
+    parser.add_argument('--end', default='2023-12-31 23:45')
+    parser.add_argument('--sellers', type=int, default=0, help='number of sellers added to the four ELIA forecasters')
+    parser.add_argument('--missing-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_synthetic_elia_csv(args.output, args.start, args.end, n_sellers=args.sellers, missing_rate=args.missing_rate, seed=args.seed)
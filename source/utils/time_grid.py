@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from source.utils.generate_timestamp import to_utc_timestamp, to_utc_index
+
+def build_time_grid(index, step='15min'):
+    """ Build the regular time grid of a dataset index: start epoch plus a fixed step, gaps flagged explicitly
+    args:
+        index: pd.DatetimeIndex, sorted and unique index aligned on the step
+        step: str or pd.Timedelta, resolution of the grid
+    returns:
+        grid: dict, time grid
+            start: int, epoch ns of the first slot
+            step: int, step in ns
+            n_slots: int, number of slots from the first to the last timestamp
+            present: np.array, True for the slots with a row in the dataset
+            row_offsets: np.array, row position of each slot (n_slots + 1 entries)"""
+    assert isinstance(index, pd.DatetimeIndex), 'index must be a DatetimeIndex'
+    step_ns = pd.Timedelta(step).value
+    assert step_ns > 0, 'step must be positive'
+    if len(index) == 0:
+        return {'start': 0, 'step': step_ns, 'n_slots': 0, 'present': np.zeros(0, dtype=bool), 'row_offsets': np.zeros(1, dtype=np.int64)}
+    epoch = to_utc_index(index).asi8
+    offsets = epoch - epoch[0]
+    if np.any(offsets % step_ns != 0):
+        raise ValueError(f'The index is not aligned on a {pd.Timedelta(step)} grid')
+    slots = offsets // step_ns
+    if np.any(np.diff(slots) <= 0):
+        raise ValueError('The index must be sorted and without duplicates')
+    n_slots = int(slots[-1]) + 1
+    present = np.zeros(n_slots, dtype=bool)
+    present[slots] = True
+    row_offsets = np.zeros(n_slots + 1, dtype=np.int64)
+    np.cumsum(present, out=row_offsets[1:])
+    return {'start': int(epoch[0]), 'step': step_ns, 'n_slots': n_slots, 'present': present, 'row_offsets': row_offsets}
+
+def grid_slot(grid, timestamp, side='left'):
+    """ Slot of a timestamp on the grid, by arithmetic on its epoch
+    args:
+        grid: dict, time grid
+        timestamp: str or pd.Timestamp, timestamp
+        side: str, 'left' rounds up to the next slot, 'right' rounds down to the previous slot
+    returns:
+        slot: int, slot clipped to [-1, n_slots]"""
+    assert side in ['left', 'right'], "side must be either 'left' or 'right'"
+    delta = to_utc_timestamp(timestamp).value - grid['start']
+    slot = -((-delta) // grid['step']) if side == 'left' else delta // grid['step']
+    return int(min(max(slot, -1), grid['n_slots']))
+
+def grid_rows_between(grid, start, end):
+    """ Positional bounds of the rows with a timestamp between start and end (inclusive)
+    args:
+        grid: dict, time grid
+        start: str or pd.Timestamp, first timestamp
+        end: str or pd.Timestamp, last timestamp
+    returns:
+        row_start: int, first row position
+        row_end: int, row position after the last row"""
+    first_slot = max(grid_slot(grid, start, side='left'), 0)
+    last_slot = min(grid_slot(grid, end, side='right'), grid['n_slots'] - 1)
+    if last_slot < first_slot:
+        row = int(grid['row_offsets'][min(first_slot, grid['n_slots'])])
+        return row, row
+    return int(grid['row_offsets'][first_slot]), int(grid['row_offsets'][last_slot + 1])
+
+def grid_missing_timestamps(grid, start=None, end=None):
+    " Timestamps of the missing slots between start and end (the whole grid if None)"
+    first_slot = 0 if start is None else max(grid_slot(grid, start, side='left'), 0)
+    last_slot = grid['n_slots'] - 1 if end is None else min(grid_slot(grid, end, side='right'), grid['n_slots'] - 1)
+    missing = np.flatnonzero(~grid['present'][first_slot:last_slot + 1]) + first_slot
+    return pd.DatetimeIndex(grid['start'] + missing * grid['step'], tz='UTC', name='datetime')
+
+def slots_per_day(grid):
+    " Number of slots in a UTC day"
+    return pd.Timedelta(days=1).value // grid['step']
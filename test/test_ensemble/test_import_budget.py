@@ -0,0 +1,32 @@
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+# import time of the engine modules on top of their numerical dependencies, in seconds
+IMPORT_TIME_BUDGET = 0.5
+ROOT = Path(__file__).resolve().parents[2]
+
+IMPORT_SCRIPT = '''
+import sys, json, time
+import numpy, pandas, scipy, sklearn.ensemble, sklearn.linear_model, sklearn.model_selection, joblib, loguru, tqdm
+start = time.perf_counter()
+import source.ml_engine, source.assessment_contributions, source.simulation.helpers_simulation
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'modules': sorted(name for name in ('matplotlib', 'seaborn', 'scikit_posthocs') if name in sys.modules)}))
+'''
+
+def run_import_script():
+    " Import the engine in a fresh interpreter and return its import time and the plotting modules loaded"
+    env = dict(os.environ, PATH_CURRENT=os.environ.get('PATH_CURRENT', str(ROOT)))
+    output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def test_engine_import_does_not_load_plotting_libraries():
+    "Test that importing the engine and the contribution modules does not import the plotting libraries"
+    assert run_import_script()['modules'] == []
+
+def test_engine_import_time_budget():
+    "Test that the engine modules import within the budget"
+    assert run_import_script()['elapsed'] < IMPORT_TIME_BUDGET
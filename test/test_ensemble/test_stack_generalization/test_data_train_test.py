@@ -33,3 +33,11 @@ def test_get_numpy_Xy_train_test(mock_data_for_get_numpy_Xy_train_test):
         get_numpy_Xy_train_test(df_train_ensemble, None)
 
 
+def test_get_numpy_Xy_train_test_float32(mock_data_for_get_numpy_Xy_train_test):
+    "Test that the features are cast to the compute dtype and the targets are not"
+    df_train_ensemble, df_test_ensemble = mock_data_for_get_numpy_Xy_train_test
+    X_train, y_train, X_test, _ = get_numpy_Xy_train_test(df_train_ensemble.astype(float), df_test_ensemble.astype(float), dtype=np.float32)
+    assert X_train.dtype == np.float32
+    assert X_test.dtype == np.float32
+    assert y_train.dtype == np.float64
+    assert np.array_equal(X_train[:, 1], df_train_ensemble['feature2'].values.astype(np.float32))
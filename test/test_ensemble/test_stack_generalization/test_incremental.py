@@ -0,0 +1,87 @@
+import pytest
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Lasso
+from source.ensemble.stack_generalization.hyperparam_optimization.incremental import day_blocks_statistics, fit_lasso_statistics, incremental_fit
+from source.utils.data_preprocess import buyer_scaler_statistics, scale_buyer_dataframe, scale_forecasters_dataframe
+
+@pytest.fixture
+def mock_incremental_data():
+    " Mock training rows of 10 days of 96 quarter hours"
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2023-01-01', periods=10 * 96, freq='15min', tz='UTC')
+    X = rng.normal(size=(len(index), 4))
+    y = X @ np.array([0.5, -0.2, 0.0, 0.1]) + 0.3 + rng.normal(scale=0.1, size=len(index))
+    return X, y, index
+
+@pytest.mark.parametrize('fit_intercept', [True, False])
+def test_fit_lasso_statistics(mock_incremental_data, fit_intercept):
+    " Test that the Lasso fitted on the sufficient statistics matches the Lasso fitted on the rows"
+    X, y, index = mock_incremental_data
+    best_params = {'alpha': 0.001, 'fit_intercept': fit_intercept}
+    model = fit_lasso_statistics(day_blocks_statistics(X, y, index), best_params)
+    expected = Lasso(**best_params).fit(X, y)
+    np.testing.assert_allclose(model.coef_, expected.coef_, atol=1e-5)
+    np.testing.assert_allclose(model.intercept_, expected.intercept_, atol=1e-5)
+    assert model.get_params()['alpha'] == 0.001
+
+def test_incremental_fit_lasso_capped_window(mock_incremental_data):
+    " Test that the Lasso updated with a new day and without the first day matches a Lasso refit on the window"
+    X, y, index = mock_incremental_data
+    best_params = {'alpha': 0.001, 'fit_intercept': True}
+    previous_model, previous_state = incremental_fit('LR', 0.5, best_params, 'highs', X[:8 * 96], y[:8 * 96], index[:8 * 96])
+    window = slice(96, 9 * 96)
+    model, state = incremental_fit('LR', 0.5, best_params, 'highs', X[window], y[window], index[window], previous_model, previous_state)
+    expected = Lasso(**best_params).fit(X[window], y[window])
+    np.testing.assert_allclose(model.coef_, expected.coef_, atol=1e-5)
+    assert len(state['blocks']) == 8
+    assert state['last_index'] == index[9 * 96 - 1]
+    # the state of the previous day is left untouched
+    assert len(previous_state['blocks']) == 8 and index[0].floor('D') in previous_state['blocks']
+
+def test_incremental_fit_gbr_adds_trees(mock_incremental_data):
+    " Test that the GBR model of the previous day gets new trees fitted on the new rows"
+    X, y, index = mock_incremental_data
+    best_params = {'max_iter': 20, 'max_depth': 2}
+    previous_model, previous_state = incremental_fit('GBR', 0.9, best_params, 'highs', X[:9 * 96], y[:9 * 96], index[:9 * 96])
+    model, state = incremental_fit('GBR', 0.9, best_params, 'highs', X, y, index, previous_model, previous_state, n_new_trees=5)
+    assert model.n_iter_ == previous_model.n_iter_ + 5
+    assert previous_model.n_iter_ == 20
+    assert state['last_index'] == index[-1]
+
+def test_incremental_fit_quantile_regression_recent_days(mock_incremental_data):
+    " Test that the quantile regression is refit on the last refit_days days"
+    X, y, index = mock_incremental_data
+    best_params = {'alpha': 0.001}
+    previous_model, previous_state = incremental_fit('LR', 0.1, best_params, 'highs', X[:9 * 96], y[:9 * 96], index[:9 * 96])
+    model, _ = incremental_fit('LR', 0.1, best_params, 'highs', X, y, index, previous_model, previous_state, refit_days=2)
+    expected, _ = incremental_fit('LR', 0.1, best_params, 'highs', X[-2 * 96:], y[-2 * 96:], index[-2 * 96:])
+    np.testing.assert_allclose(model.coef_, expected.coef_)
+
+def standardized_window(df, start_day, n_days):
+    " Return the forecasters and the buyer of a training window standardized with the statistics of the window"
+    ens_params = {'scale_features': True, 'normalize': False, 'standardize': True, 'axis': 0, 'add_quantile_predictions': False}
+    df_window = df.iloc[start_day * 96:(start_day + n_days) * 96]
+    end_training = df_window.index[-1] + pd.Timedelta('15min')
+    stats = buyer_scaler_statistics(ens_params, df_window[['b1r1']], end_training, 'b1r1')
+    df_features, _, _ = scale_forecasters_dataframe(ens_params, stats, df_window[['s1_q50_b1r1', 's2_q50_b1r1']], pd.DataFrame(), pd.DataFrame(), end_training)
+    df_buyer = scale_buyer_dataframe(ens_params, stats, df_window[['b1r1']])
+    return df_features.values, df_buyer.values[:, 0], df_window.index
+
+def test_incremental_fit_standardized_sliding_window(mock_incremental_data):
+    " Test that the models are refit when the standardization of the sliding window changes, the cached rows are on another scale"
+    X, y, index = mock_incremental_data
+    df = pd.DataFrame({'s1_q50_b1r1': 100 + 10 * X[:, 0], 's2_q50_b1r1': 50 + 5 * X[:, 1], 'b1r1': 100 + 10 * y}, index=index)
+    df.iloc[-96:] += 20  # the statistics of the second window differ from the first
+    X_previous, y_previous, index_previous = standardized_window(df, 0, 8)
+    X_day, y_day, index_day = standardized_window(df, 2, 8)
+    best_params = {'alpha': 0.001, 'fit_intercept': True}
+    previous_model, previous_state = incremental_fit('LR', 0.5, best_params, 'highs', X_previous, y_previous, index_previous)
+    model, state = incremental_fit('LR', 0.5, best_params, 'highs', X_day, y_day, index_day, previous_model, previous_state)
+    expected = Lasso(**best_params).fit(X_day, y_day)
+    np.testing.assert_allclose(model.coef_, expected.coef_, atol=1e-5)
+    np.testing.assert_allclose(model.intercept_, expected.intercept_, atol=1e-5)
+    assert min(state['blocks']) == index_day[0].floor('D')
+    previous_gbr, previous_gbr_state = incremental_fit('GBR', 0.9, {'max_iter': 20, 'max_depth': 2}, 'highs', X_previous, y_previous, index_previous)
+    gbr, _ = incremental_fit('GBR', 0.9, {'max_iter': 20, 'max_depth': 2}, 'highs', X_day, y_day, index_day, previous_gbr, previous_gbr_state, n_new_trees=5)
+    assert gbr.n_iter_ == 20
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+from source.forecasters.attacks import generate_attack_values, attack_forecasts
+
+def test_generate_attack_values():
+    "Test that the attack values are reproducible for a seed and that replay draws whole rows of the replayed forecasts"
+    values = np.arange(12, dtype=float).reshape(4, 3)
+    replay_values = np.array([[0.0, -1.0, 1.0], [10.0, 9.0, 11.0]])
+    attack_values = generate_attack_values(values, np.random.default_rng(0), noise_degree=2.0, bias=5.0)
+    np.testing.assert_array_equal(attack_values, generate_attack_values(values, np.random.default_rng(0), noise_degree=2.0, bias=5.0))
+    assert not np.array_equal(attack_values, values + 5.0)
+    np.testing.assert_array_equal(generate_attack_values(values, np.random.default_rng(0), bias=5.0), values + 5.0)
+    replayed = generate_attack_values(values, np.random.default_rng(0), replay_values=replay_values)
+    assert replayed.shape == values.shape
+    assert all(any(np.array_equal(row, replay_row) for replay_row in replay_values) for row in replayed)
+
+def test_attack_forecasts():
+    "Test that the test window of a replay attack is drawn from the train window"
+    index = pd.date_range('2023-01-01', periods=6, freq='15min', name='datetime')
+    df = pd.DataFrame({'xforecast': np.arange(6.0), 'xconfidence10': np.arange(6.0) - 1}, index=index)
+    train_values, test_values = attack_forecasts(df.iloc[:4], df.iloc[4:], ['xforecast', 'xconfidence10'], np.random.default_rng(1),
+                                                 replay_test='train')
+    np.testing.assert_array_equal(train_values, df.iloc[:4].values)
+    assert set(test_values[:, 0]) <= set(range(4))
+    np.testing.assert_array_equal(test_values[:, 1], test_values[:, 0] - 1)
@@ -0,0 +1,5 @@
+import os
+from pathlib import Path
+
+# the simulation modules import the settings, which are built from the project path
+os.environ.setdefault('PATH_CURRENT', str(Path(__file__).resolve().parents[2]))
@@ -0,0 +1,64 @@
+import pickle
+import pytest
+import numpy as np
+from source.simulation import backtest
+from source.simulation.backtest_runner import plan_backtest_blocks, block_ens_params, run_backtest_block
+from source.utils.session_ml_info import load_or_initialize_results
+
+@pytest.fixture
+def backtest_params(tmp_path):
+    " Return the simulation and ensemble parameters of a backtest saving its state in a temporary directory"
+    sim_params = {'buyer_resource_name': 'b1r1', 'random_seed': 42}
+    ens_params = {'save_info': str(tmp_path) + '/', 'save_file': 'previous_day.pickle', 'gbr_update_every_days': 2}
+    return sim_params, ens_params
+
+def test_plan_backtest_blocks():
+    "Test that the blocks start at the iteration of their first eligible day"
+    test_days = [(0, False), (1, False), (3, True), (4, False), (6, False)]
+    blocks = plan_backtest_blocks(test_days, block_size=2)
+    assert [block['first_iteration'] for block in blocks] == [0, 2, 4]
+    assert [block['test_days'] for block in blocks] == [test_days[:2], test_days[2:4], test_days[4:]]
+    assert [block['block_id'] for block in blocks] == [0, 1, 2]
+
+def test_block_ens_params(backtest_params):
+    "Test that each block saves its state in its own directory without changing the ensemble parameters"
+    _, ens_params = backtest_params
+    params = block_ens_params(ens_params, {'block_id': 3, 'first_iteration': 6})
+    assert params['save_info'] == ens_params['save_info'] + 'block_0003/'
+    assert params['first_iteration'] == 6
+    assert 'first_iteration' not in ens_params
+
+def test_load_or_initialize_results_first_iteration(backtest_params):
+    "Test that a new state starts at the first iteration and a saved state at the next iteration"
+    _, ens_params = backtest_params
+    file_info, iteration, best_results, _ = load_or_initialize_results(dict(ens_params, first_iteration=4), 'b1r1')
+    assert (iteration, best_results) == (4, {})
+    with open(file_info, 'wb') as handle:
+        pickle.dump({'iteration': 7, 'wind_power': {'best_results': {'a': 1}}, 'wind_power_variability': {'best_results': {}}}, handle)
+    _, iteration, best_results, _ = load_or_initialize_results(dict(ens_params, first_iteration=4), 'b1r1')
+    assert (iteration, best_results) == (8, {'a': 1})
+
+def test_run_backtest_block(backtest_params, monkeypatch):
+    "Test that a block runs its days in order with its own state and first iteration"
+    sim_params, ens_params = backtest_params
+    calls = []
+    monkeypatch.setattr(backtest, 'run_backtest_day',
+                        lambda sim_params, ens_params, data, i, repair_test_day, session_state=None: calls.append((ens_params['save_info'], ens_params['first_iteration'], i, repair_test_day)) or {'day': i})
+    block = plan_backtest_blocks([(0, False), (1, False), (3, True), (4, False)], block_size=2)[1]
+    results = run_backtest_block(sim_params, ens_params, block, data={})
+    assert results == [{'day': 3}, {'day': 4}]
+    assert calls == [(ens_params['save_info'] + 'block_0001/', 2, 3, True), (ens_params['save_info'] + 'block_0001/', 2, 4, False)]
+
+def test_run_ensemble_day_seeds_the_global_generator_by_day(backtest_params, monkeypatch):
+    "Test that the global random draws of a day do not depend on the days run before it"
+    sim_params, ens_params = backtest_params
+    draws = []
+    def fake_ensemble_forecasts(**kwargs):
+        draws.append(np.random.random())
+        raise StopIteration
+    monkeypatch.setattr(backtest, 'create_ensemble_forecasts', fake_ensemble_forecasts)
+    for state in [0, 1]:
+        np.random.seed(state)
+        with pytest.raises(StopIteration):
+            backtest.run_ensemble_day(sim_params, ens_params, {'day': 5, 'end_training': None}, None, None, None, None)
+    assert draws[0] == draws[1]
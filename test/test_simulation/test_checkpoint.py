@@ -0,0 +1,109 @@
+import os
+from itertools import islice
+import pickle
+import numpy as np
+import pytest
+from source.simulation import backtest
+from source.simulation.backtest import run_test_days, iter_test_days
+from source.simulation.checkpoint import load_checkpoint, iter_checkpoint_results
+from source.utils.session_ml_info import previous_day_pickle_file
+
+TEST_DAYS = [(0, False), (1, False), (2, True), (4, False), (5, False)]
+
+@pytest.fixture
+def fake_backtest_day(monkeypatch):
+    " Replace the backtest day by a day handing its iteration to the next day, the days in fail_days raise"
+    calls, fail_days = [], set()
+    def run_backtest_day(sim_params, ens_params, data, i, repair_test_day, session_state=None):
+        if i in fail_days:
+            raise RuntimeError(f'day {i} failed')
+        iteration = session_state.results['iteration'] + 1 if session_state.results is not None else 0
+        session_state.update({'iteration': iteration})
+        calls.append(i)
+        return {'day': i, 'iteration': iteration, 'draw': np.random.rand()}
+    monkeypatch.setattr(backtest, 'run_backtest_day', run_backtest_day)
+    return calls, fail_days
+
+@pytest.fixture
+def checkpoint_params(tmp_path):
+    " Return the simulation and ensemble parameters of a backtest saving its state in a temporary directory"
+    sim_params = {'buyer_resource_name': 'b1r1'}
+    ens_params = {'save_info': str(tmp_path) + '/', 'save_file': 'previous_day.pickle'}
+    return sim_params, ens_params, str(tmp_path / 'checkpoints')
+
+def test_resume_from_checkpoint(checkpoint_params, fake_backtest_day):
+    "Test that a resumed backtest skips the completed days and matches an uninterrupted run"
+    sim_params, ens_params, checkpoint_dir = checkpoint_params
+    calls, fail_days = fake_backtest_day
+    np.random.seed(0)
+    expected = run_test_days(sim_params, ens_params, {}, TEST_DAYS, checkpoint_dir=checkpoint_dir)
+    fail_days.add(4)
+    np.random.seed(0)
+    with pytest.raises(RuntimeError):
+        run_test_days(sim_params, ens_params, {}, TEST_DAYS, checkpoint_dir=checkpoint_dir)
+    assert load_checkpoint(checkpoint_dir)['completed_days'] == 3
+    fail_days.clear()
+    calls.clear()
+    results = run_test_days(sim_params, ens_params, {}, TEST_DAYS, checkpoint_dir=checkpoint_dir, resume=True)
+    assert calls == [4, 5]
+    assert results == expected
+
+def test_checkpoint_cadence(checkpoint_params, fake_backtest_day):
+    "Test that the checkpoints are saved every checkpoint_every_days days and after the last day"
+    sim_params, ens_params, checkpoint_dir = checkpoint_params
+    calls, fail_days = fake_backtest_day
+    fail_days.add(5)
+    with pytest.raises(RuntimeError):
+        run_test_days(sim_params, ens_params, {}, TEST_DAYS, checkpoint_dir=checkpoint_dir, checkpoint_every_days=2)
+    assert load_checkpoint(checkpoint_dir)['completed_days'] == 4
+    fail_days.clear()
+    calls.clear()
+    results = run_test_days(sim_params, ens_params, {}, TEST_DAYS, checkpoint_dir=checkpoint_dir, checkpoint_every_days=2, resume=True)
+    assert calls == [5]
+    assert [day_results['iteration'] for day_results in results] == [0, 1, 2, 3, 4]
+    assert load_checkpoint(checkpoint_dir)['completed_days'] == 5
+
+def test_resume_with_other_test_days(checkpoint_params, fake_backtest_day):
+    "Test that a checkpoint is not resumed for other test days"
+    sim_params, ens_params, checkpoint_dir = checkpoint_params
+    run_test_days(sim_params, ens_params, {}, TEST_DAYS[:2], checkpoint_dir=checkpoint_dir)
+    with pytest.raises(AssertionError):
+        run_test_days(sim_params, ens_params, {}, TEST_DAYS, checkpoint_dir=checkpoint_dir, resume=True)
+
+def test_persist_state(checkpoint_params, fake_backtest_day):
+    "Test that the state of the last day is written to the previous day pickle file only if persist_state is set"
+    sim_params, ens_params, _ = checkpoint_params
+    state_file = previous_day_pickle_file(ens_params, sim_params['buyer_resource_name'])
+    run_test_days(dict(sim_params, persist_state=False), ens_params, {}, TEST_DAYS)
+    assert not os.path.isfile(state_file)
+    run_test_days(dict(sim_params, persist_state=True), ens_params, {}, TEST_DAYS)
+    with open(state_file, 'rb') as handle:
+        assert pickle.load(handle) == {'iteration': 4}
+
+def test_iter_test_days_early_stop(checkpoint_params, fake_backtest_day):
+    "Test that the test days are run only as they are consumed and that a stopped generator closes the state"
+    sim_params, ens_params, checkpoint_dir = checkpoint_params
+    sim_params = dict(sim_params, persist_state=True)
+    calls, _ = fake_backtest_day
+    state_file = previous_day_pickle_file(ens_params, sim_params['buyer_resource_name'])
+    days = iter_test_days(sim_params, ens_params, {}, TEST_DAYS, checkpoint_dir=checkpoint_dir)
+    assert [day_results['day'] for day_results in islice(days, 2)] == [0, 1]
+    days.close()
+    assert calls == [0, 1]
+    with open(state_file, 'rb') as handle:
+        assert pickle.load(handle) == {'iteration': 1}
+    calls.clear()
+    results = list(iter_test_days(sim_params, ens_params, {}, TEST_DAYS, checkpoint_dir=checkpoint_dir, resume=True))
+    assert calls == [2, 4, 5]
+    assert [day_results['iteration'] for day_results in results] == [0, 1, 2, 3, 4]
+
+def test_checkpoint_saves_each_day_once(checkpoint_params, fake_backtest_day, monkeypatch):
+    "Test that the results of each day are written once in their own file and not with the state of the checkpoint"
+    sim_params, ens_params, checkpoint_dir = checkpoint_params
+    written = []
+    save_day_results = backtest.save_day_results
+    monkeypatch.setattr(backtest, 'save_day_results', lambda checkpoint_dir, position, day_results: written.append(position) or save_day_results(checkpoint_dir, position, day_results))
+    results = run_test_days(sim_params, ens_params, {}, TEST_DAYS, checkpoint_dir=checkpoint_dir)
+    assert written == [0, 1, 2, 3, 4]
+    assert 'results' not in load_checkpoint(checkpoint_dir)
+    assert list(iter_checkpoint_results(checkpoint_dir, 5)) == results
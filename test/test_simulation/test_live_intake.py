@@ -0,0 +1,100 @@
+import time
+import asyncio
+import numpy as np
+import pandas as pd
+from source.ml_engine import create_ensemble_forecasts
+from source.simulation.buyer_module import prepare_buyer_data
+from source.simulation.submission_module import submission_forecasters
+from source.utils.file_read import filter_data
+from source.utils.generate_timestamp import generate_timestamps
+from source.utils.market_data import MarketData
+from source.utils.session_ml_info import SessionState, previous_day_pickle_file
+from source.utils.synthetic_data import generate_synthetic_elia
+from source.simulation.live_intake import SubmissionIntake, ensemble_engine, send_submission
+from config.simulation_setting import Stack
+
+N_SELLERS = 50
+ENGINE_SECONDS = 0.5
+
+def history_market(n_sellers=N_SELLERS):
+    " Return the market of the training window of registered sellers"
+    index = pd.date_range('2024-01-01', periods=2 * 96, freq='15min', tz='UTC', name='datetime')
+    return MarketData(index).add_sellers([f'seller{k:02d}' for k in range(n_sellers)], np.full((len(index), n_sellers, 3), 10.0))
+
+def slow_engine(market, validity, context):
+    " Stand in for the training of the ensemble"
+    assert validity.shape == (len(market.sellers), 96)
+    time.sleep(ENGINE_SECONDS)
+    return market, context
+
+def submission_rows(index, value):
+    " Return the rows of a submission on the forecast range"
+    return [{'datetime': timestamp.isoformat(), 'q50': value, 'q10': value - 1.0, 'q90': value + 1.0} for timestamp in index]
+
+def test_submission_intake(tmp_path):
+    "Test that concurrent submissions are committed at gate closure and that the intake answers while the engine runs"
+    async def session():
+        intake = SubmissionIntake(slow_engine, capacity=100.0)
+        history = history_market()
+        index = pd.date_range(history.index[-1] + pd.Timedelta('15min'), periods=96, freq='15min', tz='UTC')
+        path = str(tmp_path / 'intake.sock')
+        server = await intake.serve(path)
+        assert (await send_submission(path, 'seller00', submission_rows(index, 1.0)))['reason'] == 'gate closed'
+        intake.open_session(history, index, context={'session': 0})
+        replies = await asyncio.gather(*[send_submission(path, f'seller{k:02d}', submission_rows(index, float(k))) for k in range(1, N_SELLERS)],
+                                       send_submission(path, 'intruder', submission_rows(index, 1.0)),
+                                       send_submission(path, 'seller00', [{'datetime': index[0].isoformat()}]),
+                                       send_submission(path, 'seller00', submission_rows(index.tz_localize(None), 1.0)))
+        assert all(reply == {'status': 'accepted', 'rows': 96} for reply in replies[:-3])
+        assert [reply['status'] for reply in replies[-3:]] == ['rejected', 'rejected', 'rejected']
+        assert 'without timezone' in replies[-1]['reason']
+        # a later submission of a seller replaces its forecast
+        await send_submission(path, 'seller01', submission_rows(index[:1], 200.0))
+        task = await intake.close_gate()
+        # the next session opens and is served while the engine of the previous one runs
+        intake.open_session(history, index + pd.Timedelta('1D'), context={'session': 1})
+        start = time.perf_counter()
+        reply = await send_submission(path, 'seller01', submission_rows(index + pd.Timedelta('1D'), 1.0))
+        assert reply['status'] == 'accepted' and time.perf_counter() - start < ENGINE_SECONDS / 2 and not task.done()
+        # the next session is committed without waiting for the engine of the previous one
+        next_task = await intake.close_gate()
+        assert not task.done() and index[0] + pd.Timedelta('1D') in intake.market_store
+        (market, context), (_, next_context) = await task, await next_task
+        server.close()
+        await server.wait_closed()
+        return intake, market, index, context, next_context
+    intake, market, index, context, next_context = asyncio.run(session())
+    assert (context, next_context) == ({'session': 0}, {'session': 1})
+    assert market is intake.market_store[index[0]]['market']
+    assert market.sellers == [f'seller{k:02d}' for k in range(1, N_SELLERS)]
+    assert len(market.index) == 3 * 96 and market.index[-1] == index[-1]
+    np.testing.assert_array_equal(market.seller_values('seller01')[2 * 96], [100.0, 100.0, 100.0])
+    np.testing.assert_array_equal(market.seller_values('seller07')[-1], [7.0, 6.0, 8.0])
+    assert intake.market_store[index[0]]['validity'].all()
+
+def test_ensemble_engine(tmp_path):
+    "Test that the engine gets the forecasts of a direct call on the market of a session with the context of the session"
+    df = generate_synthetic_elia('2023-01-01', '2023-01-06 23:45', seed=1).set_index('datetime')
+    start_training, end_training, start_prediction, end_prediction = generate_timestamps('2023-01-01', 0, 3)
+    df_train, df_test = filter_data(df, start_training, end_training), filter_data(df, start_prediction, end_prediction)
+    df_market, _, _ = submission_forecasters({'most_recent': False, 'malicious': False, 'noisy': False}, df_train, df_test)
+    df_buyer, forecast_range = prepare_buyer_data(df_train, df_test, start_prediction, end_prediction, buyer_resource_name='b1r1')
+    ens_params = dict(Stack.params, save_info=str(tmp_path) + '/', nr_cv_splits=2)
+    market = MarketData.from_dataframe(df_market)
+    expected = create_ensemble_forecasts(ens_params, df_buyer, market, end_training, forecast_range, challenge_usecase='simulation',
+                                         simulation=True, session_state=SessionState(previous_day_pickle_file(ens_params, 'b1r1')))
+    # the registered sellers submit their forecasts of the test window
+    history_rows = market.index <= end_training
+    history = MarketData(market.index[history_rows]).add_sellers(market.sellers, market.values[history_rows])
+    index = market.index[~history_rows]
+    async def session():
+        intake = SubmissionIntake(ensemble_engine(ens_params, SessionState(previous_day_pickle_file(ens_params, 'b1r1'))), capacity=1e9)
+        intake.open_session(history, index, context={'df_buyer': df_buyer, 'end_training_timestamp': end_training, 'forecast_range': forecast_range})
+        for seller in market.sellers:
+            rows = [{'datetime': timestamp.isoformat(), **dict(zip(market.quantiles, slot_values))} for timestamp, slot_values in zip(index, market.seller_values(seller)[~history_rows])]
+            assert intake.submit({'seller': seller, 'rows': rows})['status'] == 'accepted'
+        return await (await intake.close_gate())
+    results = asyncio.run(session())
+    pd.testing.assert_frame_equal(results['wind_power']['predictions'], expected['wind_power']['predictions'])
+    pd.testing.assert_frame_equal(results['wind_power_variability']['predictions'], expected['wind_power_variability']['predictions'])
+    assert results['input_coverage'].index.equals(index) and (results['input_coverage'] == 1.0).all()
@@ -0,0 +1,81 @@
+import pytest
+import pandas as pd
+from source import ml_engine
+from source.ml_engine import create_ensemble_forecasts, create_ensemble_forecasts_batch, merge_market_features
+from source.simulation.buyer_module import prepare_buyer_data
+from source.simulation.submission_module import submission_forecasters
+from source.utils.data_preprocess import buyer_scaler_statistics
+from source.utils.file_read import filter_data
+from source.utils.generate_timestamp import generate_timestamps
+from source.utils.market_data import MarketData
+from source.utils.session_ml_info import SessionState, previous_day_pickle_file
+from source.utils.synthetic_data import generate_synthetic_elia
+from config.simulation_setting import Stack
+
+@pytest.fixture
+def batch_inputs(tmp_path):
+    " Return the ensemble parameters and the data of two buyers seeing the same market, and of a buyer seeing another market"
+    df = generate_synthetic_elia('2023-01-01', '2023-01-06 23:45', seed=1).set_index('datetime')
+    start_training, end_training, start_prediction, end_prediction = generate_timestamps('2023-01-01', 0, 3)
+    df_train = filter_data(df, start_training, end_training)
+    df_test = filter_data(df, start_prediction, end_prediction)
+    df_market, _, _ = submission_forecasters({'most_recent': False, 'malicious': False, 'noisy': False}, df_train, df_test)
+    buyers = {}
+    for name, factor, market in [('b1r1', 1.0, df_market), ('b2r1', 0.5, df_market), ('b3r1', 1.0, df_market.iloc[:, :-1])]:
+        df_buyer, forecast_range = prepare_buyer_data(df_train.assign(measured=df_train['measured'] * factor), df_test, start_prediction, end_prediction, buyer_resource_name=name)
+        buyers[name] = (df_buyer, market)
+    ens_params = dict(Stack.params, save_info=str(tmp_path) + '/', nr_cv_splits=2,
+                      lr_config_params={'alpha': [0.0001, 0.001], 'fit_intercept': [True]},
+                      var_lr_config_params={'alpha': [0.0001, 0.001], 'fit_intercept': [True]})
+    return ens_params, buyers, end_training, forecast_range
+
+def session_states(ens_params, buyers):
+    " Return a session state per buyer"
+    return {name: SessionState(previous_day_pickle_file(ens_params, name)) for name in buyers}
+
+def test_create_ensemble_forecasts_batch_shares_market_features(batch_inputs, monkeypatch):
+    "Test that the batch computes the features once per market and returns the forecasts of a call per buyer"
+    ens_params, buyers, end_training, forecast_range = batch_inputs
+    calls = []
+    prepare_market_features = ml_engine.prepare_market_features
+    monkeypatch.setattr(ml_engine, 'prepare_market_features', lambda *args: calls.append(args) or prepare_market_features(*args))
+    states = session_states(ens_params, buyers)
+    batch_results = create_ensemble_forecasts_batch(ens_params, buyers, end_training, forecast_range, challenge_usecase='simulation',
+                                                    simulation=True, session_states=states, max_workers=1)
+    assert len(calls) == 2
+    assert all(states[name].results is batch_results[name] for name in buyers)
+    # b2r1 reuses the features computed for b1r1
+    df_buyer, df_market = buyers['b2r1']
+    expected = create_ensemble_forecasts(ens_params, df_buyer, df_market, end_training, forecast_range, challenge_usecase='simulation',
+                                         simulation=True, session_state=SessionState(previous_day_pickle_file(ens_params, 'b2r1')))
+    pd.testing.assert_frame_equal(batch_results['b2r1']['wind_power']['predictions'], expected['wind_power']['predictions'])
+    pd.testing.assert_frame_equal(batch_results['b2r1']['wind_power_variability']['predictions'], expected['wind_power_variability']['predictions'])
+
+def test_create_ensemble_forecasts_batch_process_pool(batch_inputs):
+    "Test that the buyers fitted in worker processes get the forecasts and states of the buyers fitted in this process"
+    ens_params, buyers, end_training, forecast_range = batch_inputs
+    buyers = {name: buyers[name] for name in ['b1r1', 'b3r1']}
+    kwargs = dict(challenge_usecase='simulation', simulation=True)
+    inline_results = create_ensemble_forecasts_batch(ens_params, buyers, end_training, forecast_range, session_states=session_states(ens_params, buyers), max_workers=1, **kwargs)
+    states = session_states(ens_params, buyers)
+    pool_results = create_ensemble_forecasts_batch(ens_params, buyers, end_training, forecast_range, session_states=states, max_workers=2, **kwargs)
+    for name in buyers:
+        pd.testing.assert_frame_equal(pool_results[name]['wind_power']['predictions'], inline_results[name]['wind_power']['predictions'])
+        pd.testing.assert_frame_equal(pool_results[name]['wind_power_variability']['predictions'], inline_results[name]['wind_power_variability']['predictions'])
+        assert states[name].results['iteration'] == 0
+
+@pytest.mark.parametrize('overrides', [{}, {'add_quantile_predictions': True, 'max_lags': 3, 'augment_with_roll_stats': True, 'differenciate': True},
+                                       {'normalize': True, 'standardize': False, 'axis': 1, 'add_quantile_predictions': True, 'precision': 'float32'}])
+def test_merge_market_features(batch_inputs, overrides):
+    "Test that the features of the base sellers merged with the features of the other sellers are the features of the whole market"
+    ens_params, buyers, end_training, forecast_range = batch_inputs
+    ens_params = dict(ens_params, **overrides)
+    df_buyer, df_market = buyers['b1r1']
+    market = MarketData.from_dataframe(df_market)
+    base_market = market.copy().remove_sellers(market.sellers[2:])
+    seller_market = market.copy().remove_sellers(market.sellers[:2])
+    stats = buyer_scaler_statistics(ens_params, df_buyer, end_training, 'b1r1')
+    features = [ml_engine.prepare_market_features(ens_params, df, stats, end_training, forecast_range[0]) for df in (market, base_market, seller_market)]
+    merged = merge_market_features(ens_params, features[1], features[2])
+    for name, df_features in features[0].items():
+        pd.testing.assert_frame_equal(merged[name], df_features)
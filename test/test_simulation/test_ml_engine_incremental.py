@@ -0,0 +1,38 @@
+import numpy as np
+from source.ml_engine import create_ensemble_forecasts
+from source.ensemble.stack_generalization.hyperparam_optimization import incremental
+from source.simulation.buyer_module import prepare_buyer_data
+from source.simulation.submission_module import submission_forecasters
+from source.utils.file_read import filter_data
+from source.utils.generate_timestamp import generate_timestamps
+from source.utils.session_ml_info import SessionState, previous_day_pickle_file
+from source.utils.synthetic_data import generate_synthetic_elia
+from config.simulation_setting import Stack
+
+def test_incremental_update_between_refreshes(tmp_path, monkeypatch):
+    "Test that the first stage model of the previous day is updated with the new day, the scaling of the refresh day is kept"
+    df = generate_synthetic_elia('2023-01-01', '2023-01-07 23:45', seed=1).set_index('datetime')
+    ens_params = dict(Stack.params, save_info=str(tmp_path) + '/', nr_cv_splits=2, incremental_update=True, gbr_update_every_days=2,
+                      lr_config_params={'alpha': [0.01, 0.1], 'fit_intercept': [True]},
+                      var_lr_config_params={'alpha': [0.01, 0.1], 'fit_intercept': [True]})
+    same_scaling, updates = incremental.same_scaling, []
+    monkeypatch.setattr(incremental, 'same_scaling', lambda *args: updates.append(same_scaling(*args)) or updates[-1])
+    session_state = SessionState(previous_day_pickle_file(ens_params, 'b1r1'))
+    day_results = []
+    for i in range(2):
+        start_training, end_training, start_prediction, end_prediction = generate_timestamps('2023-01-01', i, 3)
+        df_train, df_test = filter_data(df, start_training, end_training), filter_data(df, start_prediction, end_prediction)
+        df_market, _, _ = submission_forecasters({'most_recent': False, 'malicious': False, 'noisy': False}, df_train, df_test)
+        df_buyer, forecast_range = prepare_buyer_data(df_train, df_test, start_prediction, end_prediction, buyer_resource_name='b1r1')
+        day_results.append(create_ensemble_forecasts(ens_params, df_buyer, df_market, end_training, forecast_range,
+                                                     challenge_usecase='simulation', simulation=True, session_state=session_state))
+    # the model of the quantile 0.5 is updated on the second day, the second stage features are the predictions of the updated model
+    assert updates[0]
+    assert day_results[1]['scaler_stats'] is day_results[0]['scaler_stats']
+    previous, model = (results['wind_power']['info_contributions'][0.5] for results in day_results)
+    first_day = previous['df_train_ensemble_augmented'].index[0].floor('D')
+    assert all(model['incremental']['blocks'][day] is statistics for day, statistics in previous['incremental']['blocks'].items() if day > first_day)
+    # the updated model is the Lasso fitted on the statistics of the kept blocks and of the new day
+    best_params = day_results[1]['wind_power']['best_results'][0.5][1][1]
+    expected = incremental.fit_lasso_statistics(model['incremental']['blocks'], best_params)
+    np.testing.assert_allclose(model['fitted_model'].coef_, expected.coef_, atol=1e-4)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from source.utils.time_grid import build_time_grid
+from source.simulation import scenario_sweep
+from source.simulation.scenario_sweep import scenario_params, run_scenario_sweep
+
+SCENARIOS = [{'name': 'base'}, {'name': 'most_recent', 'sim_params': {'most_recent': True}}, {'name': 'noisy', 'sim_params': {'noisy': True}}]
+
+@pytest.fixture
+def sweep_params(tmp_path):
+    " Return the simulation and ensemble parameters of a two-day sweep and its backtest data"
+    sim_params = {'buyer_resource_name': 'b1r1', 'random_seed': 42, 'start_training': '2023-01-01', 'window_size': 2, 'num_test_days': 2,
+                  'most_recent': False, 'malicious': False, 'noisy': False, 'noisy_name': 'weekahead'}
+    ens_params = {'save_info': str(tmp_path) + '/', 'save_file': 'previous_day.pickle'}
+    index = pd.date_range('2023-01-01', periods=96 * 5, freq='15min', tz='UTC', name='datetime')
+    df = pd.DataFrame({'measured': np.arange(len(index), dtype=float)}, index=index)
+    for forecaster in ['mostrecent', 'dayahead11h', 'dayahead', 'weekahead']:
+        for kind in ['forecast', 'confidence10', 'confidence90']:
+            df[forecaster + kind] = df['measured'] + 1
+    data = {'df_processed': df, 'grid': build_time_grid(df.index), 'quality_index': None, 'imputation_sums': None, 'panel_store': None}
+    return sim_params, ens_params, data
+
+def test_scenario_params(sweep_params):
+    "Test that each scenario has its own state directory and only changes the scenario parameters"
+    sim_params, ens_params, _ = sweep_params
+    noisy_sim_params, noisy_ens_params = scenario_params(sim_params, ens_params, SCENARIOS[2])
+    assert noisy_sim_params['noisy'] and not sim_params['noisy']
+    assert noisy_ens_params['save_info'] == ens_params['save_info'] + 'noisy/'
+    with pytest.raises(AssertionError):
+        scenario_params(sim_params, ens_params, {'name': 'other_window', 'sim_params': {'window_size': 10}})
+
+def test_run_scenario_sweep(sweep_params, monkeypatch, tmp_path):
+    "Test that the base submission and its features are shared by the scenarios and that the predictions are written side by side"
+    sim_params, ens_params, data = sweep_params
+    n_base_submissions, markets = [], {}
+    submission_base_forecasters = scenario_sweep.submission_base_forecasters
+    monkeypatch.setattr(scenario_sweep, 'submission_base_forecasters', lambda df_train, df_test: n_base_submissions.append(1) or submission_base_forecasters(df_train, df_test))
+    feature_sellers = []
+    monkeypatch.setattr(scenario_sweep, 'day_scaler_statistics', lambda *args, **kwargs: {'buyer': {}, 'forecasters': None})
+    monkeypatch.setattr(scenario_sweep, 'prepare_market_features', lambda ens_params, market, *args: feature_sellers.append(market.sellers) or {'sellers': market.sellers})
+    monkeypatch.setattr(scenario_sweep, 'merge_market_features', lambda ens_params, features, seller_features: {'sellers': features['sellers'] + seller_features['sellers']})
+    def run_ensemble_day(sim_params, ens_params, day, market, df_test, df_buyer, forecast_range, session_state=None, market_features=None):
+        assert market_features['sellers'] == market.sellers
+        df_market = market.to_dataframe()
+        markets.setdefault(ens_params['save_info'], []).append(list(df_market.columns))
+        wind_power = pd.DataFrame({'q50_b1r1': df_market['s1_q50_b1r1'].loc[df_test.index].values}, index=df_test.index)
+        return {'day': day['day'], 'wind_power': wind_power}
+    monkeypatch.setattr(scenario_sweep, 'run_ensemble_day', run_ensemble_day)
+    output_file = tmp_path / 'scenarios.csv'
+    sweep_results = run_scenario_sweep(sim_params, ens_params, SCENARIOS, data=data, output_file=output_file)
+    assert len(n_base_submissions) == 2
+    # the features of the base forecasters are computed once per day, the scenarios only add the features of their own sellers
+    assert feature_sellers == [['s1', 's2', 's3'], ['s4'], ['s6']] * 2
+    assert [len(results) for results in sweep_results.values()] == [2, 2, 2]
+    assert markets[ens_params['save_info'] + 'most_recent/'][0] == ['s1_q50_b1r1', 's2_q50_b1r1', 's3_q50_b1r1', 's4_q50_b1r1',
+                                                                      's1_q10_b1r1', 's2_q10_b1r1', 's3_q10_b1r1', 's4_q10_b1r1',
+                                                                      's1_q90_b1r1', 's2_q90_b1r1', 's3_q90_b1r1', 's4_q90_b1r1']
+    df_predictions = pd.read_csv(output_file, header=[0, 1], index_col=0)
+    assert list(df_predictions.columns.get_level_values(0)) == ['base', 'most_recent', 'noisy']
+    assert len(df_predictions) == sum(len(day_results['wind_power']) for day_results in sweep_results['base'])
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+from source.simulation.submission_ingest import ingest_submissions, epoch_utc
+
+def test_ingest_submissions():
+    "Test that the submissions are aligned on the grid: last duplicate kept, off-grid rows dropped, values clipped and sparse sellers left out"
+    index = pd.date_range('2024-01-01', periods=4, freq='15min', tz='UTC', name='datetime')
+    rows = [('s1', index[k], 10.0 * k, 5.0 * k, 15.0 * k) for k in range(4)]
+    rows += [('s1', index[1], 11.0, 6.0, 16.0),                           # duplicate, the last one wins
+             ('s1', index[1] + pd.Timedelta('5min'), 1.0, 1.0, 1.0),      # off the grid
+             ('s1', index[-1] + pd.Timedelta('15min'), 1.0, 1.0, 1.0)]    # after the grid
+    rows += [('s2', index[k], 50.0, -1.0, 120.0) for k in range(4)]       # clipped to [0, 100]
+    rows += [('s3', index[0], 1.0, 1.0, 1.0), ('s3', index[1], 1.0, np.nan, 1.0)]
+    df_submissions = pd.DataFrame(rows, columns=['seller', 'datetime', 'q50', 'q10', 'q90'])
+    ingest = ingest_submissions(df_submissions, index, capacity=100.0, min_coverage=0.75)
+    report = ingest['report']
+    assert list(report.index) == ['s1', 's2', 's3']
+    assert report.loc['s1', ['rows', 'off_grid', 'duplicates', 'clipped', 'missing_slots']].tolist() == [7, 2, 1, 0, 0]
+    assert report.loc['s2', 'clipped'] == 8
+    assert report.loc['s3', 'missing_slots'] == 3 and report['eligible'].tolist() == [True, True, False]
+    market = ingest['market']
+    assert market.sellers == ['s1', 's2'] and ingest['validity'].shape == (2, 4) and ingest['validity'].all()
+    np.testing.assert_array_equal(market.seller_values('s1')[1], [11.0, 6.0, 16.0])
+    np.testing.assert_array_equal(market.seller_values('s2')[0], [50.0, 0.0, 100.0])
+    assert list(market.to_dataframe().columns[:2]) == ['s1_q50_b1r1', 's2_q50_b1r1']
+
+def test_epoch_utc():
+    "Test that the timestamps with a UTC offset are converted to UTC and that naive timestamps are rejected"
+    expected = pd.DatetimeIndex(['2024-03-31 00:45', '2024-03-31 01:00'], tz='UTC').asi8
+    np.testing.assert_array_equal(epoch_utc(['2024-03-31T01:45:00+01:00', '2024-03-31T03:00:00+02:00']), expected)
+    np.testing.assert_array_equal(epoch_utc(pd.Series(pd.DatetimeIndex(['2024-03-31 00:45', '2024-03-31 01:00'], tz='UTC'))), expected)
+    with pytest.raises(ValueError, match='1 of 2 timestamps without timezone'):
+        epoch_utc(['2024-03-31T00:45:00Z', '2024-03-31T01:00:00'])
+    with pytest.raises(ValueError, match='without timezone'):
+        epoch_utc(pd.Series(pd.date_range('2024-03-31', periods=2, freq='15min')))
+    with pytest.raises(ValueError, match='without timezone'):
+        epoch_utc([pd.Timestamp('2024-03-31 00:45', tz='UTC'), pd.Timestamp('2024-03-31 01:00')])
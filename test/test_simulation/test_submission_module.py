@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from source.simulation.submission_module import create_seller_market, submission_forecasters, submission_market, submission_rng
+from source.utils.synthetic_data import generate_synthetic_elia
+
+def test_submission_seller_market():
+    "Test that the seller market holds the forecasters columns of the train and test data by seller and quantile"
+    df = generate_synthetic_elia('2023-01-01', '2023-01-03 23:45').set_index('datetime')
+    df_train, df_test = df.iloc[:-96], df.iloc[-96:]
+    market = create_seller_market(df_train, df_test, {'s1': 'dayahead', 's4': 'mostrecent'})
+    assert market.quantiles == ('q50', 'q10', 'q90')
+    assert list(market.quantile_frame('q10').columns) == ['s1_q10_b1r1', 's4_q10_b1r1']
+    pd.testing.assert_index_equal(market.quantile_frame('q90').index, df.index)
+    np.testing.assert_array_equal(market.quantile_frame('q90')['s4_q90_b1r1'].values, df['mostrecentconfidence90'].values)
+    np.testing.assert_array_equal(market.seller_values('s1')[:, 1], df['dayaheadconfidence10'].values)
+    df_market, _, _ = submission_forecasters({'most_recent': True, 'malicious': False, 'noisy': False}, df_train, df_test)
+    assert list(df_market.columns) == [f's{k}_{quantile}_b1r1' for quantile in ('q50', 'q10', 'q90') for k in (1, 2, 3, 4)]
+    np.testing.assert_array_equal(df_market['s2_q50_b1r1'].values, df['dayahead11hforecast'].values)
+
+def test_submission_generated_forecasters():
+    "Test that the malicious and noisy forecasters are reproducible for a generator and follow their attack models"
+    df = generate_synthetic_elia('2023-01-01', '2023-01-03 23:45').set_index('datetime')
+    df_train, df_test = df.iloc[:-96], df.iloc[-96:]
+    sim_params = {'most_recent': False, 'malicious': True, 'noisy': True, 'malicious_name': 'dayahead', 'noisy_name': 'weekahead',
+                  'noise_degree': 0.0, 'malicious_attack': {'bias': 100.0, 'replay_test': None}, 'random_seed': 3}
+    df_market, df_train_sub, df_test_sub = submission_forecasters(sim_params, df_train, df_test, rng=submission_rng(sim_params, 7))
+    df_market_again, _, _ = submission_forecasters(sim_params, df_train, df_test, rng=submission_rng(sim_params, 7))
+    pd.testing.assert_frame_equal(df_market, df_market_again)
+    assert list(df_market.columns)[3:5] == ['s5_q50_b1r1', 's6_q50_b1r1']
+    np.testing.assert_allclose(df_market['s5_q10_b1r1'].values, df['dayaheadconfidence10'].values + 100.0)
+    np.testing.assert_array_equal(df_test_sub['noisyforecast'].values, df_market['s6_q50_b1r1'].values[-96:])
+    assert set(df_test_sub['noisyforecast']) <= set(df_test['weekaheadforecast'])
+    assert 'maliciousforecast' not in df_train.columns
+
+def test_submission_additional_sellers():
+    "Test that the additional sellers of the settings join the market after the ELIA forecasters"
+    df = generate_synthetic_elia('2023-01-01', '2023-01-02 23:45', n_sellers=3).set_index('datetime')
+    df_train, df_test = df.iloc[:-96], df.iloc[-96:]
+    sim_params = {'most_recent': True, 'malicious': False, 'noisy': False, 'additional_sellers': {'s7': 'seller001', 's8': 'seller003'}}
+    market, _, _ = submission_market(sim_params, df_train, df_test)
+    assert market.sellers == ['s1', 's2', 's3', 's4', 's7', 's8']
+    np.testing.assert_array_equal(market.quantile_frame('q10')['s8_q10_b1r1'].values, df['seller003confidence10'].values)
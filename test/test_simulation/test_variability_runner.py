@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from source.utils.imputation import build_imputation_sums
+from source.utils.time_grid import build_time_grid
+from source.utils.shared_arrays import release_arrays
+from source.utils.synthetic_data import generate_synthetic_elia
+from source.simulation.submission_module import submission_base_forecasters
+from source.simulation.backtest import plan_test_days, load_backtest_day, build_base_submissions, shared_base_submission
+from source.utils.shared_backtest_data import share_backtest_data, attach_backtest_data
+from source.simulation.variability_runner import plan_variability_runs, backtest_metrics
+
+@pytest.fixture
+def backtest_data():
+    " Return the backtest data of a two-day dataset"
+    index = pd.date_range('2023-01-01', periods=192, freq='15min', tz='UTC', name='datetime')
+    df = pd.DataFrame({'measured': np.arange(192, dtype=float), 'dayaheadforecast': np.arange(192, dtype=float) + 1}, index=index)
+    df.iloc[5, 1] = np.nan
+    return {'df_processed': df, 'grid': build_time_grid(df.index), 'quality_index': None,
+            'imputation_sums': build_imputation_sums(df), 'panel_store': None}
+
+def test_plan_variability_runs():
+    "Test that every configuration runs with every seed"
+    runs = plan_variability_runs([1, 2], [{'name': 'lr'}, {'name': 'noisy', 'sim_params': {'noisy': True}}])
+    assert [(run['run_id'], run['config'], run['seed']) for run in runs] == [(0, 'lr', 1), (1, 'lr', 2), (2, 'noisy', 1), (3, 'noisy', 2)]
+    assert runs[2]['sim_params'] == {'noisy': True}
+    with pytest.raises(AssertionError):
+        plan_variability_runs([1], [{'name': 'other_data', 'sim_params': {'csv_filename': 'other.csv'}}])
+
+def test_backtest_metrics(backtest_data):
+    "Test that the predictions are scored against the measurements"
+    measured = backtest_data['df_processed']['measured']
+    index = measured.index[96:]
+    wind_power = pd.DataFrame({'q10_b1r1': measured[index] - 1, 'q90_b1r1': measured[index] + 1, 'q50_b1r1': measured[index] + 2,
+                               'targets': np.nan}, index=index)
+    metrics = backtest_metrics([{'wind_power': wind_power, 'alarm_status': 1}], measured)
+    assert metrics['pinball_q10'] == pytest.approx(0.1)
+    assert metrics['pinball_q90'] == pytest.approx(0.1)
+    assert metrics['rmse_q50'] == pytest.approx(2)
+    assert metrics['coverage'] == 1
+    assert metrics['ramp_alarms'] == 1
+
+def test_share_base_submissions():
+    "Test that the base submissions of the days are shared with the runs and only used for the windows they were built for"
+    df = generate_synthetic_elia('2023-01-01', '2023-01-05 23:45', seed=1).set_index('datetime').drop(columns=['offshoreonshore', 'monitoredcapacity'])
+    sim_params = {'start_training': '2023-01-01', 'window_size': 2, 'num_test_days': 2, 'measured_col': 'measured', 'replace_nan': True}
+    data = {'df_processed': df, 'grid': build_time_grid(df.index), 'quality_index': None, 'imputation_sums': None, 'panel_store': None}
+    data['base_submissions'] = build_base_submissions(sim_params, data, plan_test_days(sim_params, data))
+    blocks, spec = share_backtest_data(data)
+    try:
+        attached_blocks, attached = attach_backtest_data(spec)
+        for i in range(2):
+            day = load_backtest_day(sim_params, attached, i)
+            shared = shared_base_submission(attached, day, False)
+            pd.testing.assert_frame_equal(shared.to_dataframe(), submission_base_forecasters(day['df_train'], day['df_test']).to_dataframe(), check_freq=False)
+            assert shared_base_submission(attached, load_backtest_day(dict(sim_params, window_size=1), attached, i), False) is None
+        del attached, shared
+        release_arrays(attached_blocks)
+    finally:
+        release_arrays(blocks, unlink=True)
@@ -0,0 +1,86 @@
+import os
+import time
+import multiprocessing
+import pytest
+from source.simulation import work_queue
+from source.simulation.work_queue import (create_work_queue, enqueue_tasks, enqueue_backtest, lease_task, heartbeat, commit_result, release_task,
+                                          queue_status, collect_results, run_worker)
+
+@pytest.fixture
+def queue(tmp_path):
+    " Return a queue database with six block tasks"
+    db_path = str(tmp_path / 'queue.sqlite')
+    create_work_queue(db_path)
+    enqueue_tasks(db_path, [{'task_id': f'default__block_{block_id:04d}', 'payload': {'block': {'block_id': block_id}}} for block_id in range(6)])
+    return db_path
+
+def fake_run_task(sim_params, ens_params, task, worker_cache):
+    " Return the block id of the task after a short computation"
+    time.sleep(0.05)
+    return [{'day': task['payload']['block']['block_id']}]
+
+def failing_run_task(sim_params, ens_params, task, worker_cache):
+    " Fail on every task"
+    raise RuntimeError('node failure')
+
+def start_worker(queue, worker_id):
+    " Worker process standing in for a node"
+    run_worker(queue, {}, {}, worker_id=worker_id, lease_seconds=5, heartbeat_seconds=0.02, run_task=fake_run_task)
+
+def test_enqueue_is_idempotent(queue):
+    "Test that a task already in the queue is not added again"
+    assert enqueue_tasks(queue, [{'task_id': 'default__block_0000', 'payload': {}}, {'task_id': 'other__block_0000', 'payload': {}}]) == 1
+    assert queue_status(queue)['pending'] == 7
+
+def test_lease_expiry_and_idempotent_commit(queue):
+    "Test that an expired lease is taken over and that only the first commit of a task is kept"
+    task = lease_task(queue, 'node-a', lease_seconds=0)
+    assert task['task_id'] == 'default__block_0000'
+    time.sleep(0.01)
+    assert not heartbeat(queue, task['task_id'], 'node-b')
+    task_b = lease_task(queue, 'node-b', lease_seconds=60)
+    assert (task_b['task_id'], task_b['attempts']) == (task['task_id'], 2)
+    assert not heartbeat(queue, task['task_id'], 'node-a')
+    assert heartbeat(queue, task['task_id'], 'node-b')
+    assert commit_result(queue, task['task_id'], 'node-b', ['b'])
+    assert not commit_result(queue, task['task_id'], 'node-a', ['a'])
+    assert collect_results(queue) == {task['task_id']: ['b']}
+
+def test_commit_unknown_task(queue):
+    "Test that committing a task missing from the queue raises a clear error and leaves no result file"
+    with pytest.raises(KeyError, match='Unknown task'):
+        commit_result(queue, 'other__block_0000', 'node-a', ['a'])
+    assert os.listdir(os.path.join(os.path.dirname(queue), 'results')) == []
+
+def test_enqueue_backtest_plans_each_config(tmp_path, monkeypatch):
+    "Test that the test days and the blocks of each configuration are planned with its own parameters"
+    monkeypatch.setattr(work_queue, 'prepare_backtest_data', lambda sim_params: {'quality_index': None})
+    db_path = str(tmp_path / 'queue.sqlite')
+    configs = [{'name': 'default'}, {'name': 'short', 'sim_params': {'num_test_days': 4}}, {'name': 'weekly', 'ens_params': {'gbr_update_every_days': 7}}]
+    assert enqueue_backtest(db_path, {'num_test_days': 10}, {'gbr_update_every_days': 5}, configs) == 2 + 1 + 2
+    blocks = {}
+    while (task := lease_task(db_path, 'node-a')) is not None:
+        blocks[task['task_id']] = [day for day, _ in task['payload']['block']['test_days']]
+    assert blocks == {'default__block_0000': [0, 1, 2, 3, 4], 'default__block_0001': [5, 6, 7, 8, 9], 'short__block_0000': [0, 1, 2, 3],
+                      'weekly__block_0000': [0, 1, 2, 3, 4, 5, 6], 'weekly__block_0001': [7, 8, 9]}
+
+def test_failed_task(queue):
+    "Test that a task failing on every attempt is marked as failed"
+    for _ in range(2):
+        task = lease_task(queue, 'node-a')
+        release_task(queue, task['task_id'], 'node-a', 'error', max_attempts=2)
+    assert queue_status(queue)['failed'] == 1
+    assert run_worker(queue, {}, {}, worker_id='node-a', heartbeat_seconds=0.01, run_task=failing_run_task, max_attempts=1) == 0
+    assert queue_status(queue)['failed'] == 6
+
+def test_local_worker_processes(queue):
+    "Test that several worker processes run every task exactly once"
+    workers = [multiprocessing.get_context('spawn').Process(target=start_worker, args=(queue, f'node-{n}')) for n in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=120)
+        assert worker.exitcode == 0
+    assert queue_status(queue) == {'pending': 0, 'leased': 0, 'done': 6, 'failed': 0}
+    results = collect_results(queue)
+    assert [block_results[0]['day'] for block_results in results.values()] == list(range(6))
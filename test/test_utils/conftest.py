@@ -79,3 +79,31 @@ def sample_df_ramp_event():
 
 
 
+@pytest.fixture
+def elia_csv_file(tmp_path):
+    " Write a small ELIA-like csv file with offshore and onshore rows"
+    datetime = pd.date_range('2023-01-01', periods=8, freq='15min', tz='UTC')
+    df_offshore = pd.DataFrame({'datetime': datetime.strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+                                'offshoreonshore': 'Offshore',
+                                'measured': [float(i) for i in range(8)],
+                                'dayaheadforecast': [float(i) + 0.5 for i in range(8)]})
+    df_onshore = df_offshore.assign(offshoreonshore='Onshore', measured=-1.0)
+    csv_filename = tmp_path / 'ELIA_dataset.csv'
+    pd.concat([df_onshore, df_offshore]).to_csv(csv_filename, index=False)
+    return str(csv_filename)
+
+@pytest.fixture
+def elia_json_files(tmp_path):
+    " Write two monthly ELIA-like json files with offshore and onshore records"
+    files = []
+    for month in [1, 2]:
+        datetime = pd.date_range(f'2023-0{month}-01', periods=4, freq='15min', tz='UTC')
+        records = []
+        for i, timestamp in enumerate(datetime[::-1]):
+            for region in ['Offshore', 'Onshore']:
+                records.append({'datetime': timestamp.isoformat(), 'offshoreonshore': region,
+                                'measured': float(i - 1), 'dayaheadforecast': float(i) + 0.5})
+        filename = tmp_path / f'0{month}.json'
+        pd.DataFrame(records).to_json(filename, orient='records')
+        files.append(str(filename))
+    return files
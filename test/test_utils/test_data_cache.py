@@ -0,0 +1,95 @@
+import os
+import pytest
+import pandas as pd
+from source.utils.file_read import read_csv_file
+from source.utils.data_cache import read_csv_file_cached, write_bundle, read_bundle, bundle_exists, read_bundle_meta
+from source.utils.data_cache import append_day_to_bundle, replace_nan_values_from_bundle, stream_csv_to_bundle
+from source.utils.data_cache import open_append_store, append_day_files
+
+def test_read_csv_file_cached_matches_read_csv_file(elia_csv_file, tmp_path):
+    "Test that the cached reader returns the same data as read_csv_file"
+    columns = ['measured', 'dayaheadforecast']
+    start, end = '2023-01-01 00:15:00+00:00', '2023-01-01 01:00:00+00:00'
+    expected = read_csv_file(elia_csv_file, columns, start, end)
+    result = read_csv_file_cached(elia_csv_file, columns, start, end, cache_dir=tmp_path / 'cache')
+    pd.testing.assert_frame_equal(result, expected, check_freq=False)
+    # second call is served from the cache
+    result_cached = read_csv_file_cached(elia_csv_file, columns, start, end, cache_dir=tmp_path / 'cache')
+    pd.testing.assert_frame_equal(result_cached, expected, check_freq=False)
+
+def test_read_csv_file_cached_invalidated_by_mtime(elia_csv_file, tmp_path):
+    "Test that a new bundle is built when the source file changes"
+    cache_dir = tmp_path / 'cache'
+    read_csv_file_cached(elia_csv_file, ['measured'], '2023-01-01', '2023-01-02', cache_dir=cache_dir)
+    stat = os.stat(elia_csv_file)
+    os.utime(elia_csv_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    read_csv_file_cached(elia_csv_file, ['measured'], '2023-01-01', '2023-01-02', cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+
+@pytest.mark.parametrize('chunksize', [1, 3, 100])
+def test_stream_csv_to_bundle_pushes_predicates_down(elia_csv_file, tmp_path, chunksize):
+    "Test that the chunked reader keeps the region, columns and period in time order whatever the chunk size"
+    df_csv = pd.read_csv(elia_csv_file)
+    df_csv.iloc[::-1].to_csv(elia_csv_file, index=False)  # newest rows first, as in the ELIA exports
+    start, end = '2023-01-01 00:15:00+00:00', '2023-01-01 01:00:00+00:00'
+    stream_csv_to_bundle(elia_csv_file, tmp_path / 'bundle', ['measured'], start, end, chunksize=chunksize)
+    result = read_bundle(tmp_path / 'bundle')
+    expected = read_csv_file(elia_csv_file, ['measured'], start, end).sort_index()
+    pd.testing.assert_frame_equal(result, expected, check_freq=False)
+    assert read_bundle_meta(tmp_path / 'bundle')['nan_stats']['measured']['count'] == len(expected)
+
+def test_read_bundle_selects_columns_and_period(tmp_path):
+    "Test that only the requested columns and period are loaded"
+    index = pd.date_range('2023-01-01', periods=10, freq='15min', tz='UTC', name='datetime')
+    df = pd.DataFrame({'a': range(10), 'b': range(10, 20)}, index=index, dtype=float)
+    write_bundle(tmp_path / 'bundle', df)
+    assert bundle_exists(tmp_path / 'bundle')
+    result = read_bundle(tmp_path / 'bundle', ['b'], index[2], index[5])
+    pd.testing.assert_frame_equal(result, df[['b']].iloc[2:6], check_freq=False)
+
+def make_day(day, measured):
+    " Return one day of offshore and onshore rows"
+    datetime = pd.date_range(day, periods=96, freq='15min', tz='UTC')
+    df_offshore = pd.DataFrame({'datetime': datetime, 'offshoreonshore': 'Offshore', 'measured': measured, 'dayaheadforecast': 1.0})
+    return pd.concat([df_offshore, df_offshore.assign(offshoreonshore='Onshore')])
+
+def test_append_day_to_bundle(tmp_path):
+    "Test that a validated day is appended and the running statistics are updated"
+    index = pd.date_range('2023-01-01', periods=96, freq='15min', tz='UTC', name='datetime')
+    df = pd.DataFrame({'measured': 2.0, 'dayaheadforecast': 1.0}, index=index)
+    write_bundle(tmp_path / 'bundle', df)
+    meta = append_day_to_bundle(tmp_path / 'bundle', make_day('2023-01-02', [-1.0] + [4.0] * 94 + [None]))
+    assert meta['length'] == 2 * 96
+    assert meta['nan_stats']['measured'] == {'count': 191, 'sum': 2.0 * 96 + 4.0 * 94, 'nans': 1}
+    result = read_bundle(tmp_path / 'bundle', starting_period='2023-01-02')
+    assert len(result) == 96
+    assert result['measured'].iloc[0] == 0
+    df_imputed = replace_nan_values_from_bundle({'imputation_nan': 'mean'}, result, tmp_path / 'bundle')
+    assert df_imputed['measured'].iloc[-1] == pytest.approx((2.0 * 96 + 4.0 * 94) / 191)
+
+def test_append_day_to_bundle_invalid_day(tmp_path):
+    "Test that incomplete or overlapping days are rejected"
+    index = pd.date_range('2023-01-01', periods=96, freq='15min', tz='UTC', name='datetime')
+    write_bundle(tmp_path / 'bundle', pd.DataFrame({'measured': 2.0}, index=index))
+    with pytest.raises(AssertionError, match='The day must have 96 rows'):
+        append_day_to_bundle(tmp_path / 'bundle', make_day('2023-01-02', 1.0).iloc[3:])
+    with pytest.raises(AssertionError, match='The day must start after the last timestamp of the bundle'):
+        append_day_to_bundle(tmp_path / 'bundle', make_day('2023-01-01', 1.0))
+    assert read_bundle_meta(tmp_path / 'bundle')['length'] == 96
+
+def test_append_store_outlives_the_csv_file(elia_csv_file, tmp_path):
+    "Test that the new days are appended once and kept when the csv file changes"
+    columns, cache_dir = ['measured', 'dayaheadforecast'], tmp_path / 'cache'
+    day_files = []
+    for day in ['2023-01-03', '2023-01-02']:
+        day_files.append(tmp_path / f'{day}.csv')
+        make_day(day, 3.0).to_csv(day_files[-1], index=False)
+    bundle_dir = open_append_store(elia_csv_file, columns, cache_dir=cache_dir)
+    assert append_day_files(bundle_dir, day_files)['length'] == 8 + 2 * 96
+    # the days already stored are skipped
+    assert append_day_files(bundle_dir, day_files)['length'] == 8 + 2 * 96
+    stat = os.stat(elia_csv_file)
+    os.utime(elia_csv_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert open_append_store(elia_csv_file, columns, cache_dir=cache_dir) == bundle_dir
+    result = read_bundle(bundle_dir, columns, starting_period='2023-01-02')
+    assert len(result) == 2 * 96 and result.index.is_monotonic_increasing
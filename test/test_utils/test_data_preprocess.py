@@ -1,6 +1,7 @@
 import pytest
 import pandas as pd
-from source.utils.data_preprocess import scale, detect_ramp_event, differentiate_dataframe
+import numpy as np
+from source.utils.data_preprocess import scale, detect_ramp_event, differentiate_dataframe, compute_dtype, cast_dataframes
 
 def test_scale_max_cap(sample_data_preprocess):
     "Test that the maximum capacity is greater than 0"
@@ -23,6 +24,14 @@ def test_scale_valid(sample_data_preprocess):
     # Check if all values are between 0 and 1
     assert all(0 <= x <= 1 for x in result)
 
+def test_scale_columns(sample_data_preprocess):
+    "Test that a list of columns is scaled at once with a maximum capacity per column"
+    df = sample_data_preprocess.assign(other=[5, 10, 15, 20])
+    result = scale(df, ['values', 'other'], np.array([50, 20]))
+    np.testing.assert_allclose(result, [[0.2, 0.25], [0.4, 0.5], [0.6, 0.75], [0.8, 1.0]])
+    with pytest.raises(AssertionError, match="Maximum capacity must be greater than 0"):
+        scale(df, ['values', 'other'], np.array([50, 0]))
+
 def test_detect_ramp_event_valid(sample_df_ramp_event):
     "Test that ramp event is correctly detected"
     df = sample_df_ramp_event
@@ -66,4 +75,14 @@ def test_differentiate_dataframe_non_numeric():
     "Test that the function raises a TypeError if the DataFrame contains non-numeric values"
     df = pd.DataFrame({'value1': [10, 20, 'a'], 'value2': [5, 15, 25]})
     with pytest.raises(TypeError):
-        differentiate_dataframe(df)
\ No newline at end of file
+        differentiate_dataframe(df)
+
+def test_compute_dtype_and_cast_dataframes():
+    "Test that the dataframes are cast to the precision of the ensemble parameters"
+    assert compute_dtype({}) == np.float64
+    assert compute_dtype({'precision': 'float32'}) == np.float32
+    with pytest.raises(AssertionError, match="Invalid precision"):
+        compute_dtype({'precision': 'float16'})
+    df, df_empty = cast_dataframes(np.float32, pd.DataFrame({'value1': [1.0, 2.0]}), pd.DataFrame())
+    assert (df.dtypes == np.float32).all()
+    assert df_empty.empty
@@ -1,5 +1,5 @@
 import pandas as pd
-from source.utils.ensemble_predictions import dict2df_predictions, dict2df_quantiles10, dict2df_quantiles90
+from source.utils.ensemble_predictions import dict2df_predictions, dict2df_quantiles10, dict2df_quantiles90, columns2df
 
 
 def test_dict2df_predictions(sample_prediction_dict):
@@ -36,4 +36,13 @@ def test_dict2df_quantiles90(sample_quantile_prediction_dict):
     assert result.columns == [col_name + '_quantile90']
     # Check if DataFrame values match the input dictionary
     expected_values = [10, 20, 30]
-    assert result[col_name + '_quantile90'].tolist() == expected_values
\ No newline at end of file
+    assert result[col_name + '_quantile90'].tolist() == expected_values
+
+def test_columns2df(df_datetime):
+    "Test that the columns are sliced and renamed in bulk with the datetime index"
+    df = df_datetime.assign(other=[1, 2, 3]).set_index('datetime')
+    result = columns2df(df, ['other', 'value'], ['blabla_pred', 'blabla_quantile10'])
+    assert result.index.name == 'datetime'
+    assert list(result.columns) == ['blabla_pred', 'blabla_quantile10']
+    assert result['blabla_quantile10'].tolist() == [10, 20, 30]
+    assert list(df.columns) == ['value', 'other']
@@ -1,4 +1,5 @@
 import pytest
+import pandas as pd
 from source.utils.generate_timestamp import generate_timestamps
 
 def test_generate_timestamps_invalid_window_size():
@@ -8,3 +9,22 @@ def test_generate_timestamps_invalid_window_size():
     window_size = 0  # This should trigger the assertion
     with pytest.raises(AssertionError, match="Window size must be greater than 0"):
         generate_timestamps(start_training, i, window_size)
+
+def test_generate_timestamps_window_modes():
+    " Test the start of the training window of the sliding, expanding and capped windows"
+    start_training = pd.Timestamp("2023-01-01", tz='UTC')
+    sliding = generate_timestamps(start_training, 10, 5)
+    expanding = generate_timestamps(start_training, 10, 5, window='expanding')
+    capped = generate_timestamps(start_training, 10, 5, window='capped', max_window_size=8)
+    assert sliding[0] == start_training + pd.Timedelta(days=10)
+    assert expanding[0] == start_training
+    assert capped[0] == start_training + pd.Timedelta(days=7)
+    # the end of the training window and the test day do not depend on the window mode
+    assert sliding[1:] == expanding[1:] == capped[1:]
+    # a capped window expands until it reaches max_window_size days
+    assert generate_timestamps(start_training, 2, 5, window='capped', max_window_size=8)[0] == start_training
+
+def test_generate_timestamps_capped_window_requires_max_window_size():
+    " Test that a capped window must be at least window_size days"
+    with pytest.raises(AssertionError, match="max_window_size"):
+        generate_timestamps("2023-01-01", 0, 5, window='capped', max_window_size=3)
@@ -0,0 +1,61 @@
+import pytest
+import numpy as np
+import pandas as pd
+from source.utils.imputation import build_imputation_sums, window_statistics, impute_nan_values, impute_train_window
+
+@pytest.fixture
+def df_with_nans():
+    " Return a 15-minute dataframe over two days with NaN values in the training and test rows"
+    index = pd.date_range('2023-01-01', '2023-01-02 23:45', freq='15min', tz='UTC', name='datetime')
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'a': rng.normal(size=len(index)), 'b': rng.normal(size=len(index))}, index=index)
+    df.iloc[[3, 10, 120], 0] = np.nan
+    df.iloc[[50, 150], 1] = np.nan
+    return df
+
+@pytest.mark.parametrize('strategy', ['zero', 'mean', 'median', 'last'])
+@pytest.mark.parametrize('row_start, row_end', [(0, 96), (20, 140), (100, 192)])
+def test_window_statistics_match_pandas(df_with_nans, strategy, row_start, row_end):
+    "Test that the window statistics from the running sums match pandas on the window"
+    window = df_with_nans.iloc[row_start:row_end]
+    expected = {'zero': np.zeros(2), 'mean': window.mean().values, 'median': window.median().values,
+                'last': window.ffill().iloc[-1].values}[strategy]
+    result = window_statistics(build_imputation_sums(df_with_nans), row_start, row_end, strategy)
+    np.testing.assert_allclose(result, expected)
+
+def test_impute_train_window_ignores_test_rows(df_with_nans):
+    "Test that the test rows do not leak into the imputed values"
+    end_training = pd.Timestamp('2023-01-02', tz='UTC')
+    result = impute_train_window(df_with_nans, end_training, 'mean')
+    train_mean = df_with_nans[df_with_nans.index < end_training].mean()
+    assert not result.isna().any().any()
+    assert result['a'].iloc[120] == pytest.approx(train_mean['a'])
+    assert result['b'].iloc[150] == pytest.approx(train_mean['b'])
+    pd.testing.assert_frame_equal(result[df_with_nans.notna()], df_with_nans)
+
+def test_impute_nan_values_without_nan_returns_input(df_with_nans):
+    "Test that a dataframe without NaN values is returned as is"
+    df = df_with_nans.fillna(0)
+    assert impute_nan_values(df, np.zeros(2)) is df
+
+@pytest.mark.parametrize('strategy', ['mean', 'median', 'last'])
+def test_impute_train_window_all_nan_column_filled_with_zeros(df_with_nans, strategy):
+    "Test that a column without any value in the training window is filled with zeros"
+    end_training = pd.Timestamp('2023-01-02', tz='UTC')
+    df = df_with_nans.copy()
+    df.loc[df.index < end_training, 'a'] = np.nan
+    result = impute_train_window(df, end_training, strategy)
+    assert not result.isna().any().any()
+    assert (result.loc[df['a'].isna(), 'a'] == 0).all()
+    pd.testing.assert_series_equal(result['a'][df['a'].notna()], df['a'].dropna())
+
+def test_impute_train_window_without_nan_skips_statistics(df_with_nans, monkeypatch):
+    "Test that the statistics are only computed for the columns with NaN values"
+    from source.utils import imputation
+    built = []
+    monkeypatch.setattr(imputation, 'build_imputation_sums', lambda df: built.append(list(df.columns)) or build_imputation_sums(df))
+    end_training = pd.Timestamp('2023-01-02', tz='UTC')
+    df = df_with_nans.fillna(0)
+    assert impute_train_window(df, end_training) is df and built == []
+    impute_train_window(df_with_nans.assign(b=df['b']), end_training)
+    assert built == [['a']]
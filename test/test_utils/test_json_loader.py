@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from source.utils.file_read import process_file
+from source.utils import json_loader
+from source.utils.json_loader import load_month_files, merge_sorted_blocks, read_month_files, month_files, parse_month_file
+
+def test_load_month_files_schema(elia_json_files):
+    "Test that the loaded dataframe follows the dtype schema"
+    df = load_month_files(elia_json_files, max_workers=1)
+    assert df.index.is_monotonic_increasing
+    assert str(df.index.tz) == 'UTC'
+    assert df['measured'].dtype == np.float32
+    assert df['dayaheadforecast'].dtype == np.float32
+    assert isinstance(df['offshoreonshore'].dtype, pd.CategoricalDtype)
+    assert len(df) == 8
+    assert (df['measured'] >= 0).all()
+
+def test_load_month_files_parallel_matches_serial(elia_json_files):
+    "Test that the process pool returns the same dataframe as the serial loader"
+    pd.testing.assert_frame_equal(load_month_files(elia_json_files, max_workers=2), 
+                                    load_month_files(elia_json_files, max_workers=1))
+
+def test_parse_month_file_filters_records(elia_json_files, monkeypatch):
+    "Test that the records of the other region are dropped before their values are converted"
+    lengths = []
+    to_numeric = pd.to_numeric
+    monkeypatch.setattr(json_loader.pd, 'to_numeric', lambda values, **kwargs: lengths.append(len(values)) or to_numeric(values, **kwargs))
+    block = parse_month_file(elia_json_files[0])
+    assert lengths == [4, 4] and block['offshoreonshore'].tolist() == [0, 0, 0, 0]
+
+def test_merge_sorted_blocks_overlapping():
+    "Test that overlapping blocks are merged in time order"
+    block_1 = {'datetime': np.array([0, 2, 4]), 'value': np.array([0., 2., 4.], dtype=np.float32)}
+    block_2 = {'datetime': np.array([1, 3]), 'value': np.array([1., 3.], dtype=np.float32)}
+    block_3 = {'datetime': np.array([2, 5]), 'value': np.array([2.5, 5.], dtype=np.float32)}
+    merged = merge_sorted_blocks([block_1, block_2, block_3], ['value'])
+    assert merged['datetime'].tolist() == [0, 1, 2, 2, 3, 4, 5]
+    assert merged['value'].tolist() == [0., 1., 2., 2.5, 3., 4., 5.]
+
+def test_load_month_files_keeps_rows_without_region(tmp_path):
+    "Test that the rows without region are kept as by process_file"
+    records = [{'datetime': '2023-01-01T00:15:00+00:00', 'offshoreonshore': 'Offshore', 'measured': 1.0},
+               {'datetime': '2023-01-01T00:00:00+00:00', 'offshoreonshore': 0, 'measured': 2.0},
+               {'datetime': '2023-01-01T00:30:00+00:00', 'offshoreonshore': 'Onshore', 'measured': 3.0}]
+    filename = str(tmp_path / '01.json')
+    pd.DataFrame(records).to_json(filename, orient='records')
+    df = load_month_files([filename], max_workers=1)
+    assert df['measured'].tolist() == process_file(filename, 'Offshore')['measured'].tolist() == [2.0, 1.0]
+    assert df['offshoreonshore'].tolist() == [0, 'Offshore']
+
+def test_read_month_files(elia_json_files):
+    "Test that the month files of the simulation parameters are read in order and trimmed to the period"
+    assert month_files({'file_10': 'b', 'file_2': 'a', 'csv_filename': 'c'}) == ['a', 'b']
+    df = read_month_files(elia_json_files, ['measured'], '2023-01-01T00:15:00+00:00', '2023-02-01T00:00:00+00:00', max_workers=1)
+    assert list(df.columns) == ['measured'] and len(df) == 4
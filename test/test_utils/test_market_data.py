@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+from source.utils.market_data import MarketData, parse_market_column
+from source.utils.quantile_preprocess import extract_quantile_columns
+
+@pytest.fixture
+def df_market():
+    " Return a market dataframe of two sellers"
+    index = pd.date_range('2024-01-01', periods=4, freq='15min', name='datetime')
+    return pd.DataFrame({'s1_q50_b1r1': [1.0, 2.0, 3.0, 4.0], 's2_q50_b1r1': [5.0, 6.0, 7.0, 8.0],
+                         's1_q10_b1r1': [0.5, 1.5, 2.5, 3.5], 's2_q10_b1r1': [4.5, 5.5, 6.5, 7.5],
+                         's1_q90_b1r1': [1.5, 2.5, 3.5, 4.5], 's2_q90_b1r1': [5.5, 6.5, 7.5, 8.5]}, index=index)
+
+def test_market_data_round_trip(df_market):
+    "Test that the market dataframe is rebuilt from the market and that the quantile frames match the column extraction"
+    assert parse_market_column('s1_q10_b1r1') == ('s1', 'q10', 'b1r1')
+    market = MarketData.from_dataframe(df_market)
+    assert market.sellers == ['s1', 's2'] and market.registry == {'s1': 0, 's2': 1}
+    assert market.values.shape == (4, 2, 3)
+    pd.testing.assert_frame_equal(market.to_dataframe(), df_market)
+    for quantile in ('q50', 'q10', 'q90'):
+        pd.testing.assert_frame_equal(extract_quantile_columns(market, quantile), extract_quantile_columns(df_market, quantile))
+    np.testing.assert_array_equal(market.seller_values('s2')[0], [5.0, 4.5, 5.5])
+
+def test_market_data_dynamic_sellers(df_market):
+    "Test that sellers are added and removed without changing the copies of the market"
+    market = MarketData.from_dataframe(df_market)
+    copy = market.copy().add_sellers(['s3'], np.full((4, 1, 3), 9.0))
+    assert market.sellers == ['s1', 's2']
+    assert list(copy.quantile_frame('q90').columns) == ['s1_q90_b1r1', 's2_q90_b1r1', 's3_q90_b1r1']
+    copy.remove_sellers(['s1'])
+    assert copy.registry == {'s2': 0, 's3': 1}
+    np.testing.assert_array_equal(copy.quantile_frame('q50')['s3_q50_b1r1'].values, np.full(4, 9.0))
+    np.testing.assert_array_equal(copy.quantile_frame('q10')['s2_q10_b1r1'].values, df_market['s2_q10_b1r1'].values)
+    with pytest.raises(AssertionError):
+        copy.add_sellers(['s2'], np.zeros((4, 1, 3)))
+    assert copy.remove_sellers(['s2', 's3']).quantile_frame('q50').empty
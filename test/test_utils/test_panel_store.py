@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+from source.utils.file_read import filter_data
+from source.utils.panel_store import create_panel_store, open_panel_store, panel_window, panel_columns, build_column_registry
+
+def make_elia_frame():
+    " Return a processed ELIA-like dataframe over three days"
+    index = pd.date_range('2023-01-01', periods=3 * 96, freq='15min', tz='UTC', name='datetime')
+    columns = ['measured', 'dayaheadforecast', 'weekaheadforecast', 'dayaheadconfidence10', 'weekaheadconfidence10', 
+                'dayaheadconfidence90', 'weekaheadconfidence90']
+    return pd.DataFrame(np.random.rand(len(index), len(columns)), index=index, columns=columns)
+
+def test_build_column_registry():
+    "Test that the columns are registered by forecaster and kind"
+    registry = build_column_registry(['measured', 'dayaheadforecast', 'dayaheadconfidence10', 'other'])
+    assert registry['measured'] == 0
+    assert registry['forecasters'] == {'dayahead': {'forecast': 1, 'confidence10': 2}}
+
+def test_panel_window_matches_filter_data(tmp_path):
+    "Test that the panel window is a float32 view with the rows of filter_data"
+    df = make_elia_frame()
+    create_panel_store(df, tmp_path / 'panel')
+    store = open_panel_store(tmp_path / 'panel')
+    start, end = df.index[96], df.index[2 * 96]
+    window = panel_window(store, start, end)
+    expected = filter_data(df, start, end)
+    assert window.index.equals(expected.index)
+    assert window.index.name == 'datetime'
+    assert window.dtypes.unique().tolist() == [np.float32]
+    np.testing.assert_allclose(window.values, expected.values, rtol=1e-6)
+    assert np.shares_memory(window.values, store['values'])
+
+def test_panel_columns(tmp_path):
+    "Test that the columns of a kind are taken from the registry"
+    create_panel_store(make_elia_frame(), tmp_path / 'panel')
+    store = open_panel_store(tmp_path / 'panel')
+    assert panel_columns(store, 'confidence90') == ['dayaheadconfidence90', 'weekaheadconfidence90']
+    assert panel_columns(store, 'forecast', forecasters=['weekahead']) == ['weekaheadforecast']
@@ -0,0 +1,55 @@
+import pytest
+import numpy as np
+import pandas as pd
+from source.utils.quality_index import build_quality_index, day_eligibility, repair_window
+
+@pytest.fixture
+def df_quality():
+    " Return a 15-minute dataset over five days around the March DST change with gaps and NaN values"
+    index = pd.date_range('2023-03-24', '2023-03-28 23:45', freq='15min', tz='UTC', name='datetime')
+    df = pd.DataFrame({'measured': np.arange(len(index), dtype=float)}, index=index)
+    for forecaster in ['dayahead', 'weekahead']:
+        for kind in ['forecast', 'confidence10', 'confidence90']:
+            df[forecaster + kind] = np.arange(len(index), dtype=float)
+    df.loc['2023-03-24', 'weekaheadforecast'] = np.nan
+    df.iloc[250, 0] = np.nan
+    return df.drop(index[[200, 201]])
+
+def test_build_quality_index(df_quality):
+    "Test the slot counts, the DST day length and the NaN counts by forecaster"
+    quality_index = build_quality_index(df_quality)
+    assert len(quality_index) == 5
+    assert quality_index['n_slots'].tolist() == [96, 96, 94, 96, 96]
+    assert (quality_index['expected_slots'] == 96).all()
+    assert quality_index.loc['2023-03-26', 'local_day_slots'].item() == 92
+    assert quality_index['nans_weekahead'].tolist() == [96, 0, 0, 0, 0]
+    assert quality_index['nans_measured'].sum() == 1
+    assert quality_index.attrs['forecaster_columns'] == {'dayahead': 3, 'weekahead': 3}
+
+def test_day_eligibility(df_quality):
+    "Test that the days with missing slots or NaN measurements are flagged"
+    quality_index = build_quality_index(df_quality)
+    ts = lambda day: pd.Timestamp(day, tz='UTC')
+    eligible, reasons = day_eligibility(quality_index, ts('2023-03-24'), ts('2023-03-25'), ts('2023-03-26'), ts('2023-03-27'))
+    assert not eligible
+    assert set(reasons) == {'test_slots', 'test_nans'}
+    eligible, _ = day_eligibility(quality_index, ts('2023-03-24'), ts('2023-03-26'), ts('2023-03-27'), ts('2023-03-28'))
+    assert eligible
+
+def test_day_eligibility_forecaster_without_training_values(df_quality):
+    "Test that a forecaster without any value in the training window is flagged"
+    df_quality.loc['2023-03-24', ['weekaheadconfidence10', 'weekaheadconfidence90']] = np.nan
+    quality_index = build_quality_index(df_quality)
+    ts = lambda day: pd.Timestamp(day, tz='UTC')
+    eligible, reasons = day_eligibility(quality_index, ts('2023-03-24'), ts('2023-03-25'), ts('2023-03-27'), ts('2023-03-28'))
+    assert not eligible
+    assert list(reasons) == ['train_weekahead']
+
+def test_repair_window(df_quality):
+    "Test that the repaired test day is complete and without NaN values"
+    start, end = pd.Timestamp('2023-03-26', tz='UTC'), pd.Timestamp('2023-03-27', tz='UTC')
+    df_test = df_quality[(df_quality.index >= start) & (df_quality.index < end)]
+    df_repaired = repair_window(df_test, start, end)
+    assert len(df_repaired) == 96
+    assert not df_repaired.isna().any().any()
+    assert df_repaired['dayaheadforecast'].iloc[200 - 192] == 200
@@ -0,0 +1,34 @@
+import os
+import pickle
+from source.utils.session_ml_info import SessionState, load_or_initialize_results
+
+def previous_day_results(iteration):
+    " Return a minimal results dictionary of a previous day"
+    return {'iteration': iteration, 'wind_power': {'best_results': {0.5: 'params'}}, 'wind_power_variability': {'best_results': {}}}
+
+def test_load_from_session_state(tmp_path):
+    "Test that the in-process state is used instead of the previous day pickle file"
+    ens_params = {'save_info': str(tmp_path) + '/', 'save_file': 'previous_day.pickle'}
+    session_state = SessionState(str(tmp_path / 'b1r1_previous_day.pickle'))
+    _, iteration, best_results, _ = load_or_initialize_results(ens_params, 'b1r1', session_state)
+    assert (iteration, best_results) == (0, {})
+    session_state.update(previous_day_results(3))
+    _, iteration, best_results, _ = load_or_initialize_results(ens_params, 'b1r1', session_state)
+    assert (iteration, best_results) == (4, {0.5: 'params'})
+    # the hyperparameters of the next day do not change the state of the previous day
+    best_results[0.1] = 'params'
+    assert session_state.results['wind_power']['best_results'] == {0.5: 'params'}
+    assert not os.path.isfile(session_state.file_info)
+
+def test_session_state_persist(tmp_path):
+    "Test that a persisted state is written to the previous day pickle file and removed on reset"
+    session_state = SessionState(str(tmp_path / 'b1r1_previous_day.pickle'), persist=True)
+    session_state.update(previous_day_results(1))
+    session_state.update(previous_day_results(2))
+    session_state.flush()
+    with open(session_state.file_info, 'rb') as handle:
+        assert pickle.load(handle)['iteration'] == 2
+    session_state.reset()
+    session_state.close()
+    assert session_state.results is None
+    assert not os.path.isfile(session_state.file_info)
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+from source.utils.shared_arrays import share_arrays, attach_arrays, release_arrays
+
+def test_share_and_attach_arrays():
+    "Test that the attached arrays are read-only views of the shared arrays"
+    arrays = {'values': np.arange(12, dtype=np.float64).reshape(4, 3), 'index': np.arange(4, dtype=np.int64), 'empty': np.zeros((0, 3))}
+    blocks, spec = share_arrays(arrays)
+    try:
+        attached_blocks, attached = attach_arrays(spec)
+        for name, array in arrays.items():
+            np.testing.assert_array_equal(attached[name], array)
+            assert attached[name].dtype == array.dtype
+        with pytest.raises(ValueError):
+            attached['values'][0, 0] = -1
+        del attached
+        release_arrays(attached_blocks)
+    finally:
+        release_arrays(blocks, unlink=True)
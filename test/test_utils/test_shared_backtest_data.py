@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from source.utils import shared_backtest_data
+from source.utils.imputation import build_imputation_sums
+from source.utils.time_grid import build_time_grid
+from source.utils.shared_arrays import release_arrays
+from source.utils.shared_backtest_data import share_backtest_data, attach_backtest_data
+
+@pytest.fixture
+def backtest_data():
+    " Return the backtest data of a two-day dataset"
+    index = pd.date_range('2023-01-01', periods=192, freq='15min', tz='UTC', name='datetime')
+    df = pd.DataFrame({'measured': np.arange(192, dtype=float), 'dayaheadforecast': np.arange(192, dtype=float) + 1}, index=index)
+    df.iloc[5, 1] = np.nan
+    return {'df_processed': df, 'grid': build_time_grid(df.index), 'quality_index': None,
+            'imputation_sums': build_imputation_sums(df), 'panel_store': None}
+
+def test_share_and_attach_backtest_data(backtest_data):
+    "Test that the backtest data rebuilt from shared memory equals the original data"
+    blocks, spec = share_backtest_data(backtest_data)
+    try:
+        attached_blocks, data = attach_backtest_data(spec)
+        pd.testing.assert_frame_equal(data['df_processed'], backtest_data['df_processed'], check_freq=False)
+        assert data['grid']['n_slots'] == backtest_data['grid']['n_slots']
+        for name, array in backtest_data['imputation_sums'].items():
+            np.testing.assert_array_equal(data['imputation_sums'][name], array)
+        del data
+        release_arrays(attached_blocks)
+    finally:
+        release_arrays(blocks, unlink=True)
+
+def test_init_worker_attaches_the_shared_data():
+    "Test that the workers read the data prepared by the parent process from shared memory"
+    index = pd.date_range('2023-01-01', periods=96, freq='15min', tz='UTC', name='datetime')
+    df = pd.DataFrame({'measured': np.arange(96.0)}, index=index)
+    data = {'df_processed': df, 'grid': None, 'quality_index': None, 'imputation_sums': None, 'panel_store': None}
+    shared_blocks, spec = share_backtest_data(data)
+    try:
+        shared_backtest_data.init_worker(spec, None)
+        pd.testing.assert_frame_equal(shared_backtest_data.worker_data()['df_processed'], df, check_freq=False)
+    finally:
+        release_arrays(shared_backtest_data._WORKER_BLOCKS)
+        release_arrays(shared_blocks, unlink=True)
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from source.utils.file_read import read_csv_file
+from source.utils.synthetic_data import generate_synthetic_elia, write_synthetic_elia_csv
+
+def test_generate_synthetic_elia_schema():
+    "Test that the synthetic dataset has the ELIA columns of every forecaster on a 15-minute grid"
+    df = generate_synthetic_elia('2023-01-01', '2023-01-03 23:45', n_sellers=3, regions=('Offshore', 'Onshore'))
+    assert len(df) == 2 * 3 * 96
+    assert df.groupby('offshoreonshore')['datetime'].apply(lambda index: (index.diff().dropna() == pd.Timedelta('15min')).all()).all()
+    for name in ['mostrecent', 'dayahead11h', 'dayahead', 'weekahead', 'seller001', 'seller003']:
+        assert {f'{name}forecast', f'{name}confidence10', f'{name}confidence90'} <= set(df.columns)
+        assert (df[f'{name}confidence10'] <= df[f'{name}forecast']).all() and (df[f'{name}forecast'] <= df[f'{name}confidence90']).all()
+    assert df['measured'].between(0, df['monitoredcapacity']).all()
+
+def test_generate_synthetic_elia_does_not_depend_on_chunks():
+    "Test that the values do not depend on the number of days per chunk"
+    kwargs = dict(n_sellers=2, missing_rate=0.05, seed=3)
+    df = generate_synthetic_elia('2023-01-01', '2023-01-10', chunk_days=2, **kwargs)
+    pd.testing.assert_frame_equal(df, generate_synthetic_elia('2023-01-01', '2023-01-10', chunk_days=30, **kwargs))
+    assert 0 < df['seller002forecast'].isna().mean() < 0.2
+    assert df['measured'].notna().all()
+
+def test_write_synthetic_elia_csv(tmp_path):
+    "Test that read_csv_file reads the synthetic csv file"
+    csv_filename = str(tmp_path / 'synthetic.csv')
+    columns = write_synthetic_elia_csv(csv_filename, '2023-01-01', '2023-01-04 23:45', n_sellers=1, regions=('Offshore', 'Onshore'), chunk_days=1)
+    df = read_csv_file(csv_filename, columns, '2023-01-02T00:00:00+00:00', '2023-01-02 23:45:00+00:00')
+    assert list(df.columns) == columns and len(columns) == 1 + 5 * 3
+    assert len(df) == 96 and df.index.tz is not None
+    df_offshore = generate_synthetic_elia('2023-01-01', '2023-01-04 23:45', n_sellers=1, regions=('Offshore', 'Onshore'))
+    df_offshore = df_offshore[df_offshore['offshoreonshore'] == 'Offshore'].iloc[96:192]
+    np.testing.assert_allclose(df['measured'].values, df_offshore['measured'].values, atol=1e-3)
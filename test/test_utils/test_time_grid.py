@@ -0,0 +1,45 @@
+import pytest
+import numpy as np
+import pandas as pd
+from source.utils.file_read import filter_data
+from source.utils.time_grid import build_time_grid, grid_slot, grid_missing_timestamps, slots_per_day
+
+@pytest.fixture
+def df_with_gaps():
+    " Return a 15-minute dataframe over three days with missing slots"
+    index = pd.date_range('2023-01-01', '2023-01-03 23:45', freq='15min', tz='UTC', name='datetime')
+    df = pd.DataFrame({'measured': np.arange(len(index), dtype=float)}, index=index)
+    return df.drop(index[[5, 6, 96, 200]])
+
+def test_build_time_grid_flags_gaps(df_with_gaps):
+    "Test that the missing slots are represented explicitly"
+    grid = build_time_grid(df_with_gaps.index)
+    assert grid['n_slots'] == 3 * 96
+    assert grid['present'].sum() == len(df_with_gaps)
+    assert len(grid_missing_timestamps(grid)) == 4
+    assert grid_missing_timestamps(grid)[0] == pd.Timestamp('2023-01-01 01:15', tz='UTC')
+    assert slots_per_day(grid) == 96
+
+def test_grid_slot_arithmetic(df_with_gaps):
+    "Test that timestamps are turned into slots by arithmetic"
+    grid = build_time_grid(df_with_gaps.index)
+    assert grid_slot(grid, '2023-01-02 00:00+00:00') == 96
+    assert grid_slot(grid, '2023-01-02 00:05+00:00', side='left') == 97
+    assert grid_slot(grid, '2023-01-02 00:05+00:00', side='right') == 96
+
+@pytest.mark.parametrize('start, end', [('2023-01-01', '2023-01-02'), ('2023-01-02', '2023-01-03'), 
+                                        ('2023-01-01 01:00', '2023-01-01 01:30'), ('2022-12-30', '2023-01-01 00:10'),
+                                        ('2023-01-03 12:00', '2023-01-05')])
+def test_filter_data_with_grid_matches_scan(df_with_gaps, start, end):
+    "Test that the positional slice matches the boolean scan"
+    grid = build_time_grid(df_with_gaps.index)
+    start, end = pd.Timestamp(start, tz='UTC'), pd.Timestamp(end, tz='UTC')
+    expected = filter_data(df_with_gaps, start, end)
+    result = filter_data(df_with_gaps, start, end, grid=grid)
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_build_time_grid_unaligned_index():
+    "Test that an index off the 15-minute grid is rejected"
+    index = pd.DatetimeIndex(['2023-01-01 00:00', '2023-01-01 00:20'], tz='UTC')
+    with pytest.raises(ValueError, match='not aligned'):
+        build_time_grid(index)